@@ -0,0 +1,96 @@
+#!/usr/bin/env python3
+
+'''
+Memory used per class by the class registry, old dict-of-ClassInfo layout
+versus the columnar ClassTable. Synthetic signatures, no device needed.
+
+  ./class-table-bench.py [class_count]
+'''
+
+import sys
+import random
+import tracemalloc
+
+from thirdparty.debug.dalvik.info.state import ClassInfo, FieldInfo, MethodInfo
+from thirdparty.debug.dalvik.info.classtable import ClassTable
+
+
+WORDS = ['Activity', 'Manager', 'View', 'Cache', 'Request', 'Json', 'Node', 'Helper', 'State', 'Impl']
+PACKAGES = ['java/util', 'android/view', 'androidx/core/app', 'com/example/app/ui', 'okhttp3/internal/http']
+
+
+def make_classes(count):
+    random.seed(0)
+    classes = []
+    for type_id in range(1, count + 1):
+        name = ''.join(random.sample(WORDS, 3))
+        classes.append((type_id, 1, f'L{random.choice(PACKAGES)}/{name}{type_id};', None, 7))
+    # Like the reply strings, signatures arrive as fresh objects.
+    return classes
+
+
+def measure(build, classes):
+    tracemalloc.start()
+    before = tracemalloc.take_snapshot()
+    kept = build(classes)
+    after = tracemalloc.take_snapshot()
+    tracemalloc.stop()
+    used = sum(stat.size_diff for stat in after.compare_to(before, 'filename'))
+    return kept, used
+
+
+def build_dicts(classes):
+    # What DebuggerState did before: a ClassInfo per class in two dicts.
+    by_id = {}
+    by_signature = {}
+    for type_id, tag, signature, generic, status in classes:
+        class_info = ClassInfo(None, type_id)
+        class_info.refTypeTag = tag
+        class_info.signature = ''.join(signature)
+        class_info.generic = generic
+        by_id[type_id] = class_info
+        by_signature[class_info.signature] = class_info
+    return by_id, by_signature
+
+
+def build_table(classes):
+    table = ClassTable()
+    for type_id, tag, signature, generic, status in classes:
+        table.add(type_id, tag, ''.join(signature), generic, status)
+    return table
+
+
+def build_members(count, member_class):
+    members = []
+    for idx in range(count):
+        member = member_class()
+        member.name = f'member{idx}'
+        member.signature = '()V'
+        member.modBits = 1
+        members.append(member)
+    return members
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 60000
+    classes = make_classes(count)
+
+    _, dict_bytes = measure(build_dicts, classes)
+    table, table_bytes = measure(build_table, classes)
+
+    print(f'Classes: {count}')
+    print(f'  dict of ClassInfo: {dict_bytes / count:8.1f} bytes/class ({dict_bytes / 2**20:.1f} MiB)')
+    print(f'  ClassTable:        {table_bytes / count:8.1f} bytes/class ({table_bytes / 2**20:.1f} MiB)')
+
+    # Touching a class only pays for that ClassInfo.
+    for type_id in range(1, 101):
+        table.by_id[type_id]
+    print(f'  {table}')
+
+    # Note: Both layouts store the signature strings, which dominate the table.
+    _, method_bytes = measure(lambda n: build_members(n, MethodInfo), 100000)
+    print(f'MethodInfo (__slots__): {method_bytes / 100000:.1f} bytes/method')
+
+
+if __name__ == '__main__':
+    main()
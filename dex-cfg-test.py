@@ -0,0 +1,74 @@
+#!/usr/bin/env python3
+
+'''
+Known methods through dex.cfg: blocks and edges, dominators and liveness
+(across exception edges in particular). Exits non-zero on the first
+mismatch. No device needed.
+
+  ./dex-cfg-test.py
+'''
+
+import sys
+
+from thirdparty.dalvik.dex.cfg import ControlFlowGraph
+
+# (name, code units, tries, expected blocks, idom, live_in, live_at)
+CASES = [
+    (
+        'if',
+        [
+            0x0012,             # 0000: const/4 v0, #0
+            0x0038, 0x0003,     # 0001: if-eqz v0, +3
+            0x1012,             # 0003: const/4 v0, #1
+            0x000f,             # 0004: return v0
+        ],
+        (),
+        ['B0[0000-0003) -> 2,1', 'B1[0003-0004) -> 2', 'B2[0004-0005) -> exit'],
+        [0, 0, 0],
+        [set(), set(), {0}],
+        {0x0001: {0}, 0x0003: set(), 0x0004: {0}},
+    ),
+    (
+        'try',
+        [
+            0x1012,                 # 0000: const/4 v0, #1
+            0x2012,                 # 0001: const/4 v0, #2      (try)
+            0x1071, 0x0000, 0x0000, # 0002: invoke-static {v0}  (try)
+            0x000e,                 # 0005: return-void
+            0x010d,                 # 0006: move-exception v1   (handler)
+            0x000f,                 # 0007: return v0
+        ],
+        [(0x0001, 4, [0x0006])],
+        ['B0[0000-0001) -> 1', 'B1[0001-0005) -> 2 !3', 'B2[0005-0006) -> exit', 'B3[0006-0008) -> exit'],
+        [0, 0, 1, 1],
+        # v0 from 0000 is what the handler reads if 0001 throws.
+        [set(), {0}, set(), {0}],
+        {0x0001: {0}, 0x0002: {0}, 0x0005: set(), 0x0007: {0}},
+    ),
+]
+
+
+def encode(units):
+    return b''.join(unit.to_bytes(2, 'little') for unit in units)
+
+
+def main():
+    failed = 0
+    for name, units, tries, blocks, idom, live_in, live_at in CASES:
+        cfg = ControlFlowGraph.from_bytecode(encode(units), tries)
+        got = [
+            ('blocks', [repr(block) for block in cfg.blocks], blocks),
+            ('idom', cfg.dominators(), idom),
+            ('live_in', [set(regs) for regs in cfg.liveness()[0]], live_in),
+            ('live_at', {code_index: set(cfg.live_at(code_index)) for code_index in live_at}, live_at),
+        ]
+        for what, value, expected in got:
+            if value != expected:
+                print(f'FAIL {name} {what}: {value} != {expected}')
+                failed += 1
+    print(f'{len(CASES)} methods, {failed} failures')
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,80 @@
+#!/usr/bin/env python3
+
+'''
+Decode throughput of the legacy bytecode.disassemble() loop versus the table
+driven dex.decoder over synthetic methods. No device needed.
+
+  ./dex-decoder-bench.py [method_count] [units_per_method]
+'''
+
+import sys
+import time
+import random
+
+import thirdparty.dalvik.dex.bytecode as bytecode
+from thirdparty.dalvik.dex.decoder import OPCODES, FORMAT_UNITS, decode_all, render
+
+
+def make_method(units):
+    # Random (but well formed) instructions, plus a switch payload now and then.
+    valid = [opcode for opcode, entry in enumerate(OPCODES) if entry and opcode != 0x00]
+    out = bytearray()
+    while len(out) < units * 2:
+        if random.random() < 0.01:
+            size = random.randint(1, 8)
+            out += bytes([0x00, 0x01]) + size.to_bytes(2, 'little') + random.randbytes(4 + size * 4)
+            continue
+        opcode = random.choice(valid)
+        out.append(opcode)
+        out += random.randbytes(FORMAT_UNITS[OPCODES[opcode][1]] * 2 - 1)
+    return bytes(out)
+
+
+def legacy(methods):
+    count = 0
+    for data in methods:
+        offset = 0
+        while offset + 1 < len(data):
+            try:
+                _, offset = bytecode.ops[data[offset]](data, offset)
+            except Exception:
+                offset += 2
+            count += 1
+    return count
+
+
+def records(methods):
+    return sum(len(decode_all(data)) for data in methods)
+
+
+def records_and_text(methods):
+    count = 0
+    for data in methods:
+        for ins in decode_all(data):
+            render(ins)
+            count += 1
+    return count
+
+
+def run(name, func, methods, total_bytes):
+    started = time.perf_counter()
+    count = func(methods)
+    elapsed = time.perf_counter() - started
+    print(f'  {name:<22} {count / elapsed / 1e6:6.2f} M ins/s  {total_bytes / elapsed / 2**20:7.1f} MiB/s  ({elapsed:.2f}s)')
+
+
+def main():
+    method_count = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+    units = int(sys.argv[2]) if len(sys.argv) > 2 else 512
+    random.seed(0)
+    methods = [make_method(units) for _ in range(method_count)]
+    total_bytes = sum(len(data) for data in methods)
+
+    print(f'Methods: {method_count} x ~{units} code units ({total_bytes / 2**20:.1f} MiB)')
+    run('legacy disassemble()', legacy, methods, total_bytes)
+    run('decode_all()', records, methods, total_bytes)
+    run('decode_all() + render', records_and_text, methods, total_bytes)
+
+
+if __name__ == '__main__':
+    main()
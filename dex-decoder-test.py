@@ -0,0 +1,53 @@
+#!/usr/bin/env python3
+
+'''
+Known encodings through dex.decoder (35c, 3rc, 45cc, 4rcc register order
+in particular). Exits non-zero on the first mismatch. No device needed.
+
+  ./dex-decoder-test.py
+'''
+
+import sys
+
+from thirdparty.dalvik.dex.decoder import decode, decode_all, render
+
+# (code units as written in the dex spec, expected operands, expected text)
+CASES = [
+    # invoke-virtual {v1, v2}, meth@5: 6e20 0500 2100
+    ([0x206e, 0x0005, 0x0021], (5, 1, 2), 'invoke-virtual {v1, v2}, meth@0005'),
+    # invoke-virtual {v1, v2, v3, v4, v0}, meth@5: 6e50 0500 4321
+    ([0x506e, 0x0005, 0x4321], (5, 1, 2, 3, 4, 0), 'invoke-virtual {v1, v2, v3, v4, v0}, meth@0005'),
+    # invoke-static {v7}, meth@0x1234
+    ([0x1071, 0x1234, 0x0007], (0x1234, 7), 'invoke-static {v7}, meth@1234'),
+    # filled-new-array {v0, v1, v2}, type@2
+    ([0x3024, 0x0002, 0x0210], (2, 0, 1, 2), 'filled-new-array {v0, v1, v2}, type@0002'),
+    # invoke-custom {v3, v4}, call_site@1
+    ([0x20fc, 0x0001, 0x0043], (1, 3, 4), 'invoke-custom {v3, v4}, call_site@0001'),
+    # invoke-virtual/range {v4 .. v6}, meth@5
+    ([0x0374, 0x0005, 0x0004], (5, 4, 3), 'invoke-virtual/range {v4 .. v6}, meth@0005'),
+    # invoke-polymorphic {v1, v2}, meth@5, proto@7
+    ([0x20fa, 0x0005, 0x0021, 0x0007], (5, 7, 1, 2), 'invoke-polymorphic {v1, v2}, meth@0005, proto@0007'),
+    # invoke-polymorphic/range {v4 .. v6}, meth@5, proto@7
+    ([0x03fb, 0x0005, 0x0004, 0x0007], (5, 7, 4, 3), 'invoke-polymorphic/range {v4 .. v6}, meth@0005, proto@0007'),
+]
+
+
+def encode(units):
+    return b''.join(unit.to_bytes(2, 'little') for unit in units)
+
+
+def main():
+    failed = 0
+    for units, operands, text in CASES:
+        data = encode(units)
+        for ins in (decode(data), decode_all(data)[0]):
+            got = (ins.operands, ins.length, render(ins))
+            if got != (operands, len(units), text):
+                print(f'FAIL {data.hex()}: {got} != {(operands, len(units), text)}')
+                failed += 1
+    print(f'{len(CASES)} encodings, {failed} failures')
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == '__main__':
+    main()
@@ -3,7 +3,6 @@
 '''
 Consider:
 
-pip install pure-python-adb-reborn
 pip install androguard
 pip install frida frida_tools
 pip install pyaxml
@@ -153,20 +152,16 @@ async def main():
     global adb
     global bp
 
-    # Start up the application in debug mode.
-    adb.target('sh.kau.playground')
+    # Start up the application in debug mode. Returns once it answers the
+    # JDWP handshake on localhost:8700.
+    await adb.target('sh.kau.playground')
 
     # Connect to application native access.
-    native.connect(adb)
+    native.connect(adb, epoch=lambda: dbg.suspend_epoch)
 
-    # Settle a bit.
-    settle_timeout = 3
-    print(f"Sleeping {settle_timeout} secs for system to settle.")
-    await asyncio.sleep(settle_timeout)
-
-    # Connect to application with our debugger.
+    # Connect to application with our debugger (reusing the handshaken connection).
     print("Connecting debugger to localhost:8700")
-    await dbg.start('127.0.0.1', 8700)
+    await dbg.start('127.0.0.1', 8700, connection=adb.jdwp_connection)
     jdwp = dbg.jdwp
     dbg.print_summary()
 
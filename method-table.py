@@ -1,41 +1,42 @@
 #!/usr/bin/env python3
 
-import sys
-import logging
-from androguard.core import dex
-from androguard import util
-
-import struct
-
-util.set_log("CRITICAL")
-
-with open(sys.argv[1], "rb") as f:
-    data = f.read()
-
-with open('method-table.txt', 'w') as fobj:
-    print("Parsing dex.")
-    d = dex.DEX(data)
-    print("Dex parsing done.")
+'''
+Dump the method, field, type and string tables of dex files, so `meth@XXXX`,
+`field@XXXX`, `type@XXXX` and `string@XXXX` operands can be looked up by hand.
 
-    # Parse out the type table since its missing from Androguard v4?
-    # EXample: d.get_strings()[type_ids[0x1ede]]
-    type_ids_size = d.header.type_ids_size
-    type_ids_off  = d.header.type_ids_off
-    type_ids = []
-    for i in range(type_ids_size):
-        offset = type_ids_off + i * 4
-        (descriptor_idx,) = struct.unpack_from("<I", data, offset)
-        type_ids.append(descriptor_idx)
-
-    breakpoint()
-
-    # type@XXXX
-    # d.get_strings()[type_ids[0x1ede]]
-
-    # method@XXXX
-    #print(d.get_methods()[0xc802].get_triple())
-    
-    # string@XXXX
-    # d.get_strings()[0xb679]
+  ./method-table.py classes.dex [classes2.dex ...]
 
+Writes method-table.txt. Uses thirdparty.dalvik.dex.dexfile (mmap'd, lazy),
+large multi-dex apps take seconds rather than androguard's minutes.
+'''
 
+import sys
+import time
+
+from thirdparty.dalvik.dex.dexfile import DexFile
+
+
+def main():
+    if len(sys.argv) < 2:
+        print(__doc__)
+        sys.exit(1)
+
+    with open('method-table.txt', 'w') as fobj:
+        for path in sys.argv[1:]:
+            started = time.perf_counter()
+            with DexFile(path) as dex:
+                h = dex.header
+                print(f'# {path}', file=fobj)
+                for idx in range(h.method_ids_size):
+                    print(f'method@{idx:04x}: {dex.symbol("meth", idx)}', file=fobj)
+                for idx in range(h.field_ids_size):
+                    print(f'field@{idx:04x}: {dex.symbol("field", idx)}', file=fobj)
+                for idx in range(h.type_ids_size):
+                    print(f'type@{idx:04x}: {dex.type(idx)}', file=fobj)
+                for idx in range(h.string_ids_size):
+                    print(f'string@{idx:04x}: {dex.symbol("string", idx)}', file=fobj)
+                print(f'{dex} in {time.perf_counter() - started:.2f}s')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,82 @@
+#!/usr/bin/env python3
+
+'''
+Native memory reads through util/memory.py versus one blocking RPC per read,
+over LocalRpc (a local buffer with a fixed per call latency). No device needed.
+
+Each "stop" walks a few struct fields and a 64 vreg shadow frame, the kind of
+reads a breakpoint handler does, then resumes (new epoch).
+
+  ./native-memory-bench.py [stops] [latency_ms]
+'''
+
+import sys
+import time
+import random
+import asyncio
+
+from thirdparty.debug.dalvik.util.memory import NativeMemory, LocalRpc
+
+BASE = 0x7000000000
+
+
+def make_reads():
+    # Scattered pointer sized fields in a few objects plus one shadow frame.
+    objects = [random.randrange(0, 200) * 4096 + random.randrange(0, 3000) for _ in range(4)]
+    reads = [(BASE + obj + field * 8, 8) for obj in objects for field in range(12)]
+    frame = BASE + random.randrange(0, 200) * 4096 + 512
+    reads += [(frame + 0x40 + idx * 4, 4) for idx in range(128)]
+    return reads
+
+
+def blocking(rpc, stops):
+    for reads in stops:
+        for addr, size in reads:
+            rpc.read(addr, size)
+
+
+async def cached(rpc, stops):
+    epoch = [0]
+    memory = NativeMemory(rpc, lambda: epoch[0])
+    for reads in stops:
+        for addr, size in reads:
+            await memory.read(addr, size)
+        epoch[0] += 1
+    memory.close()
+
+
+async def batched(rpc, stops):
+    epoch = [0]
+    memory = NativeMemory(rpc, lambda: epoch[0])
+    for reads in stops:
+        await memory.read_many(reads)
+        epoch[0] += 1
+    memory.close()
+
+
+def run(name, func, stops, latency, data):
+    rpc = LocalRpc(data, BASE, latency)
+    started = time.perf_counter()
+    result = func(rpc, stops)
+    if asyncio.iscoroutine(result):
+        asyncio.run(result)
+    elapsed = time.perf_counter() - started
+    reads = sum(len(reads) for reads in stops)
+    print(f'  {name:<20} {elapsed * 1000 / len(stops):8.2f} ms/stop  {rpc.calls / len(stops):7.1f} rpc/stop  ({reads} reads)')
+
+
+def main():
+    stop_count = int(sys.argv[1]) if len(sys.argv) > 1 else 20
+    latency = float(sys.argv[2]) / 1000 if len(sys.argv) > 2 else 0.0005
+    random.seed(0)
+    data = random.randbytes(256 * 4096)
+    stops = [make_reads() for _ in range(stop_count)]
+
+    print(f'Stops: {stop_count}, {len(stops[0])} reads each, rpc latency {latency * 1000:.2f}ms')
+    run('blocking rpc.read', blocking, stops, latency, data)
+    run('NativeMemory.read', cached, stops, latency, data)
+    run('read_many', batched, stops, latency, data)
+
+
+if __name__ == '__main__':
+    main()
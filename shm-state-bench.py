@@ -0,0 +1,71 @@
+#!/usr/bin/env python3
+
+'''
+Reading the class table from another process: a Manager dict proxy (what
+start_dict_server() serves) versus the shared memory snapshots of
+sandbox/shm.py. Synthetic DebuggerState, no device needed.
+
+  ./shm-state-bench.py [classes]
+'''
+
+import sys
+import time
+import multiprocessing
+
+from thirdparty.debug.dalvik.info.state import DebuggerState
+from thirdparty.sandbox.shm import StatePublisher, StateReader
+
+NAME = 'jdwp-state-bench'
+
+
+def read_proxy(shared, results):
+    started = time.perf_counter()
+    count = 0
+    for type_id in shared.keys():
+        count += len(shared[type_id])
+    results.put(('Manager dict proxy', time.perf_counter() - started, count))
+
+
+def read_shm(results):
+    started = time.perf_counter()
+    with StateReader(NAME) as reader, reader.snapshot() as snap:
+        classes = snap['classes']
+        type_ids = classes['type_id']
+        count = 0
+        for row in range(len(classes)):
+            if type_ids[row]:
+                count += len(classes.string('signature', row))
+    results.put(('shm snapshot', time.perf_counter() - started, count))
+
+
+def main():
+    class_count = int(sys.argv[1]) if len(sys.argv) > 1 else 60000
+    state = DebuggerState()
+    for idx in range(class_count):
+        state.classes.add(0x10000 + idx, 1, f'Lcom/example/pkg{idx % 97}/Class{idx};', status=7)
+
+    print(f'Classes: {class_count}, each reader sums the signature lengths')
+    results = multiprocessing.Queue()
+
+    started = time.perf_counter()
+    publisher = StatePublisher(state, NAME)
+    publisher.publish()
+    print(f'  {"publish":<20} {(time.perf_counter() - started) * 1000:8.2f} ms')
+    proc = multiprocessing.Process(target=read_shm, args=(results,))
+    proc.start()
+    proc.join()
+    name, elapsed, count = results.get()
+    print(f'  {name:<20} {elapsed * 1000:8.2f} ms  ({count} bytes)')
+    publisher.close()
+
+    with multiprocessing.Manager() as manager:
+        shared = manager.dict({type_id: signature for type_id, _, signature, _ in state.classes.rows()})
+        proc = multiprocessing.Process(target=read_proxy, args=(shared, results))
+        proc.start()
+        proc.join()
+        name, elapsed, count = results.get()
+        print(f'  {name:<20} {elapsed * 1000:8.2f} ms  ({count} bytes)')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,416 @@
+'''
+Copyright (c) 2025 Vincent Agriesti
+
+This file is part of the thirdparty JDWP project.
+Licensed under the MIT License. See the LICENSE file in the project root
+for full license text.
+'''
+
+from bisect import bisect_right
+from thirdparty.dalvik.dex.decoder import (
+    decode_all, opcode_info, UNKNOWN,
+    PACKED_SWITCH_PAYLOAD, SPARSE_SWITCH_PAYLOAD, FILL_ARRAY_DATA_PAYLOAD)
+
+'''
+Control flow graph of a method's bytecode.
+
+Built from decoder.Instruction records. Blocks are split at branch targets,
+after branches/returns/throws, and at try range boundaries and handlers so
+every block sits wholly inside or outside of each try range.
+
+Edges:
+  - succs: Normal flow (fall through, goto, if, switch cases).
+  - exc_succs: Catch handlers of the try ranges covering the block. JDWP
+    doesn't expose try/catch tables, so these only exist when `tries` are
+    given (e.g. from the dex code_item).
+
+Payload pseudo-instructions (switch tables, array data) are data, they don't
+end up in any block.
+
+dominators() uses the Cooper/Harvey/Kennedy iterative algorithm and
+liveness() is the usual backward dataflow over per-block use/def register
+sets. Both are computed on first use and kept. Blocks aren't split at each
+throwing instruction, so a handler can be entered before any of the block's
+defs ran: what the handlers read is live through the whole block.
+'''
+
+
+# Opcode ranges by behavior.
+GOTOS = (0x28, 0x29, 0x2a)
+SWITCHES = (0x2b, 0x2c)
+RETURNS = (0x0e, 0x0f, 0x10, 0x11)
+THROW = 0x27
+PAYLOADS = (PACKED_SWITCH_PAYLOAD, SPARSE_SWITCH_PAYLOAD, FILL_ARRAY_DATA_PAYLOAD)
+
+
+def is_conditional(opcode):
+    return 0x32 <= opcode <= 0x3d
+
+
+def ends_block(opcode):
+    return opcode in GOTOS or opcode in SWITCHES or opcode in RETURNS or \
+        opcode == THROW or is_conditional(opcode)
+
+
+def _wide(name):
+    return '-wide' in name or name.endswith('-long') or name.endswith('-double')
+
+
+def _pair(reg, wide):
+    return (reg, reg + 1) if wide else (reg,)
+
+
+def defs_uses(ins):
+    """Registers written and read by an instruction.
+
+      Note: Wide (long/double) values count as a register pair. Invoke
+            arguments are taken as listed, which already covers both halves.
+
+      Returns: (defs tuple, uses tuple)
+    """
+    opcode, ops = ins.opcode, ins.operands
+    if opcode < 0 or opcode > 0xff:
+        return (), ()
+    name, fmt, _ = opcode_info(opcode)
+
+    if opcode in (0x0e, 0x00):
+        return (), ()
+    if 0x01 <= opcode <= 0x09:                      # move*
+        wide = 'wide' in name
+        return _pair(ops[0], wide), _pair(ops[1], wide)
+    if 0x0a <= opcode <= 0x0d:                      # move-result*, move-exception
+        return _pair(ops[0], 'wide' in name), ()
+    if 0x0f <= opcode <= 0x11:                      # return*
+        return (), _pair(ops[0], 'wide' in name)
+    if 0x12 <= opcode <= 0x1c or opcode in (0x22, 0xfe, 0xff):  # const*, new-instance
+        return _pair(ops[0], 'wide' in name), ()
+    if opcode in (0x1d, 0x1e, 0x27, 0x26, 0x2b, 0x2c) or 0x38 <= opcode <= 0x3d:
+        return (), (ops[0],)
+    if opcode == 0x1f:                              # check-cast
+        return (ops[0],), (ops[0],)
+    if opcode in (0x20, 0x21, 0x23):                # instance-of, array-length, new-array
+        return (ops[0],), (ops[1],)
+    if fmt in ('35c', '45cc'):
+        return (), tuple(ops[2 if fmt == '45cc' else 1:])
+    if fmt in ('3rc', '4rcc'):
+        first, count = ops[-2], ops[-1]
+        return (), tuple(range(first, first + count))
+    if 0x2d <= opcode <= 0x31:                      # cmp*
+        wide = opcode >= 0x2f
+        return (ops[0],), _pair(ops[1], wide) + _pair(ops[2], wide)
+    if 0x32 <= opcode <= 0x37:                      # if-*
+        return (), (ops[0], ops[1])
+    if 0x44 <= opcode <= 0x4a:                      # aget*
+        return _pair(ops[0], opcode == 0x45), (ops[1], ops[2])
+    if 0x4b <= opcode <= 0x51:                      # aput*
+        return (), _pair(ops[0], opcode == 0x4c) + (ops[1], ops[2])
+    if 0x52 <= opcode <= 0x58:                      # iget*
+        return _pair(ops[0], opcode == 0x53), (ops[1],)
+    if 0x59 <= opcode <= 0x5f:                      # iput*
+        return (), _pair(ops[0], opcode == 0x5a) + (ops[1],)
+    if 0x60 <= opcode <= 0x66:                      # sget*
+        return _pair(ops[0], opcode == 0x61), ()
+    if 0x67 <= opcode <= 0x6d:                      # sput*
+        return (), _pair(ops[0], opcode == 0x68)
+    if 0x7b <= opcode <= 0x8f:                      # unary ops and conversions
+        src, _, dst = name.partition('-to-')
+        if dst:
+            return _pair(ops[0], dst in ('long', 'double')), _pair(ops[1], src in ('long', 'double'))
+        wide = _wide(name)
+        return _pair(ops[0], wide), _pair(ops[1], wide)
+    if 0x90 <= opcode <= 0xaf:                      # binop vAA, vBB, vCC
+        wide = _wide(name)
+        shift = name.startswith('sh') or name.startswith('ushr')
+        return _pair(ops[0], wide), _pair(ops[1], wide) + _pair(ops[2], wide and not shift)
+    if 0xb0 <= opcode <= 0xcf:                      # binop/2addr
+        base = name[:-len('/2addr')]
+        wide = _wide(base)
+        shift = base.startswith('sh') or base.startswith('ushr')
+        return _pair(ops[0], wide), _pair(ops[0], wide) + _pair(ops[1], wide and not shift)
+    if 0xd0 <= opcode <= 0xe2:                      # binop/lit*
+        return (ops[0],), (ops[1],)
+    return (), ()
+
+
+class BasicBlock():
+
+    __slots__ = ('index', 'start', 'end', 'first', 'last', 'succs', 'preds', 'exc_succs', 'exc_preds')
+
+    def __init__(self, index, start, first):
+        self.index = index
+        # Code unit range [start, end)
+        self.start = start
+        self.end = start
+        # Instruction positions [first, last) in cfg.instructions
+        self.first = first
+        self.last = first
+        self.succs = []
+        self.preds = []
+        self.exc_succs = []
+        self.exc_preds = []
+
+
+    def __repr__(self):
+        succs = ','.join(str(succ) for succ in self.succs)
+        excs = ''.join(f' !{succ}' for succ in self.exc_succs)
+        return f'B{self.index}[{self.start:04x}-{self.end:04x}) -> {succs or "exit"}{excs}'
+
+
+class ControlFlowGraph():
+
+    def __init__(self, instructions, tries=()):
+        """
+          Args:
+            instructions: decoder.Instruction list for the whole method.
+            tries: Iterable of (start_addr, insn_count, [handler_addr]) in
+                   code units, as in the dex code_item try_item list.
+        """
+        self.instructions = [ins for ins in instructions if ins.opcode not in PAYLOADS]
+        self.payloads = {ins.offset: ins for ins in instructions if ins.opcode in PAYLOADS}
+        self.tries = [(start, start + count, tuple(handlers)) for start, count, handlers in tries]
+        self.blocks = []
+        self.block_starts = []
+        self._idom = None
+        self._liveness = None
+        self._build()
+
+
+    @staticmethod
+    def from_bytecode(bytecode, tries=()):
+        return ControlFlowGraph(decode_all(bytecode), tries)
+
+
+    def branch_targets(self, ins):
+        """Code units a block ending in ins can continue at (excluding exceptions)."""
+        opcode = ins.opcode
+        fallthrough = ins.offset + ins.length
+        if opcode in RETURNS or opcode == THROW or opcode == UNKNOWN:
+            return []
+        if opcode in GOTOS:
+            return [ins.offset + ins.operands[0]]
+        if is_conditional(opcode):
+            return [ins.offset + ins.operands[-1], fallthrough]
+        if opcode in SWITCHES:
+            targets = []
+            payload = self.payloads.get(ins.offset + ins.operands[1])
+            if payload is not None:
+                ops = payload.operands
+                cases = ops[1:] if payload.opcode == PACKED_SWITCH_PAYLOAD else ops[len(ops) // 2:]
+                targets = [ins.offset + case for case in cases]
+            return targets + [fallthrough]
+        return [fallthrough]
+
+
+    def _build(self):
+        instructions = self.instructions
+        if not instructions:
+            return
+        offsets = {ins.offset for ins in instructions}
+
+        leaders = {instructions[0].offset}
+        for ins in instructions:
+            if ends_block(ins.opcode) or ins.opcode == UNKNOWN:
+                leaders.update(target for target in self.branch_targets(ins) if target in offsets)
+                leaders.add(ins.offset + ins.length)
+        for start, end, handlers in self.tries:
+            leaders.update((start, end, *handlers))
+        leaders &= offsets
+
+        for pos, ins in enumerate(instructions):
+            if ins.offset in leaders:
+                if self.blocks:
+                    self.blocks[-1].last = pos
+                self.blocks.append(BasicBlock(len(self.blocks), ins.offset, pos))
+                self.block_starts.append(ins.offset)
+            self.blocks[-1].end = ins.offset + ins.length
+        self.blocks[-1].last = len(instructions)
+
+        for block in self.blocks:
+            last = instructions[block.last - 1]
+            for target in self.branch_targets(last):
+                succ = self.block_at(target)
+                if succ is not None and succ.start == target and succ.index not in block.succs:
+                    block.succs.append(succ.index)
+                    succ.preds.append(block.index)
+            for start, end, handlers in self.tries:
+                if start <= block.start < end:
+                    for handler in handlers:
+                        succ = self.block_at(handler)
+                        if succ is not None and succ.index not in block.exc_succs:
+                            block.exc_succs.append(succ.index)
+                            succ.exc_preds.append(block.index)
+
+
+    def block_at(self, code_index):
+        """Block containing a code index, None if it's outside of every block."""
+        idx = bisect_right(self.block_starts, code_index) - 1
+        if idx < 0 or code_index >= self.blocks[idx].end:
+            return None
+        return self.blocks[idx]
+
+
+    def next_locations(self, code_index):
+        """Code indexes execution can reach right after the instruction at code_index.
+
+          Note: This is what a smart step-over needs to put its breakpoints on.
+        """
+        block = self.block_at(code_index)
+        if block is None:
+            return []
+        for pos in range(block.first, block.last):
+            ins = self.instructions[pos]
+            if ins.offset == code_index:
+                if pos + 1 < block.last:
+                    return [ins.offset + ins.length]
+                return [self.blocks[succ].start for succ in block.succs]
+        return []
+
+
+    def reverse_postorder(self):
+        if not self.blocks:
+            return []
+        seen = set()
+        order = []
+        # Iterative DFS, methods can be long enough to hit the recursion limit.
+        stack = [(0, iter(self.blocks[0].succs + self.blocks[0].exc_succs))]
+        seen.add(0)
+        while stack:
+            index, children = stack[-1]
+            for child in children:
+                if child not in seen:
+                    seen.add(child)
+                    block = self.blocks[child]
+                    stack.append((child, iter(block.succs + block.exc_succs)))
+                    break
+            else:
+                stack.pop()
+                order.append(index)
+        order.reverse()
+        return order
+
+
+    def dominators(self):
+        """Immediate dominator per block index (entry -> itself, unreachable -> None)."""
+        if self._idom is not None:
+            return self._idom
+
+        order = self.reverse_postorder()
+        rpo_number = {index: number for number, index in enumerate(order)}
+        idom = [None] * len(self.blocks)
+        if order:
+            idom[order[0]] = order[0]
+
+        def intersect(a, b):
+            while a != b:
+                while rpo_number[a] > rpo_number[b]:
+                    a = idom[a]
+                while rpo_number[b] > rpo_number[a]:
+                    b = idom[b]
+            return a
+
+        changed = True
+        while changed:
+            changed = False
+            for index in order[1:]:
+                block = self.blocks[index]
+                preds = [pred for pred in block.preds + block.exc_preds if idom[pred] is not None]
+                if not preds:
+                    continue
+                new_idom = preds[0]
+                for pred in preds[1:]:
+                    new_idom = intersect(pred, new_idom)
+                if idom[index] != new_idom:
+                    idom[index] = new_idom
+                    changed = True
+
+        self._idom = idom
+        return idom
+
+
+    def dominates(self, a, b):
+        """True if block a dominates block b (block indexes)."""
+        idom = self.dominators()
+        if idom[b] is None:
+            return False
+        while True:
+            if a == b:
+                return True
+            if idom[b] == b:
+                return False
+            b = idom[b]
+
+
+    def liveness(self):
+        """Registers live on block entry/exit.
+
+          Note: live_out includes what the block's exception handlers read.
+
+          Returns: (live_in, live_out), lists of frozensets by block index.
+        """
+        if self._liveness is not None:
+            return self._liveness
+
+        uses = []
+        defs = []
+        for block in self.blocks:
+            block_uses, block_defs = set(), set()
+            for pos in range(block.first, block.last):
+                ins_defs, ins_uses = defs_uses(self.instructions[pos])
+                block_uses.update(reg for reg in ins_uses if reg not in block_defs)
+                block_defs.update(ins_defs)
+            uses.append(block_uses)
+            defs.append(block_defs)
+
+        live_in = [set() for _ in self.blocks]
+        live_out = [set() for _ in self.blocks]
+        order = list(reversed(self.reverse_postorder()))
+        changed = True
+        while changed:
+            changed = False
+            for index in order:
+                block = self.blocks[index]
+                out = set()
+                for succ in block.succs:
+                    out |= live_in[succ]
+                # Note: The block's defs don't kill what a handler reads, the throw may come first.
+                exc_out = set()
+                for succ in block.exc_succs:
+                    exc_out |= live_in[succ]
+                new_in = uses[index] | (out - defs[index]) | exc_out
+                out |= exc_out
+                if out != live_out[index] or new_in != live_in[index]:
+                    live_out[index] = out
+                    live_in[index] = new_in
+                    changed = True
+
+        self._liveness = ([frozenset(regs) for regs in live_in], [frozenset(regs) for regs in live_out])
+        return self._liveness
+
+
+    def live_at(self, code_index):
+        """Registers live right before the instruction at code_index."""
+        block = self.block_at(code_index)
+        if block is None:
+            return frozenset()
+        live_in = self.liveness()[0]
+        live = set()
+        for succ in block.succs:
+            live |= live_in[succ]
+        for pos in range(block.last - 1, block.first - 1, -1):
+            ins = self.instructions[pos]
+            ins_defs, ins_uses = defs_uses(ins)
+            live.difference_update(ins_defs)
+            live.update(ins_uses)
+            if ins.offset == code_index:
+                break
+        for succ in block.exc_succs:
+            live |= live_in[succ]
+        return frozenset(live)
+
+
+    def __repr__(self):
+        try:
+            return '\n'.join([f'ControlFlowGraph({len(self.blocks)} blocks, {len(self.instructions)} instructions)',
+                              *[f'  {block}' for block in self.blocks]])
+        except Exception as e:
+            return f"ControlFlowGraph(ERROR: {e})"
@@ -0,0 +1,394 @@
+'''
+Copyright (c) 2025 Vincent Agriesti
+
+This file is part of the thirdparty JDWP project.
+Licensed under the MIT License. See the LICENSE file in the project root
+for full license text.
+'''
+
+import struct
+from collections import namedtuple
+
+'''
+Table driven Dalvik decoder.
+
+bytecode.disassemble() builds a params dict per instruction and formats its
+text right away. Decoding whole methods (or classes) that way is mostly dict
+and string churn. Here every opcode maps to a precomputed (name, format,
+index kind) entry and every format to one small operand decoder, so decoding
+yields plain Instruction tuples:
+
+    Instruction(offset, opcode, operands, length)
+
+offset and length are in 16 bit code units. operands is a tuple whose layout
+depends on the format (see OPERANDS). Payload pseudo-instructions (switch
+tables, array data) decode to PACKED_SWITCH_PAYLOAD, SPARSE_SWITCH_PAYLOAD
+and FILL_ARRAY_DATA_PAYLOAD pseudo-opcodes. Unused opcodes and truncated
+instructions don't raise, they decode as a one unit UNKNOWN.
+
+Text is only built when asked for, with render() / str(instruction). Given
+the DexFile the bytecode came from (see dexfile.py), render() shows index
+operands as strings, types, fields and methods instead of `kind@idx`.
+'''
+
+
+# Pseudo-opcodes, outside of the 0x00-0xff opcode space.
+PACKED_SWITCH_PAYLOAD = 0x100
+SPARSE_SWITCH_PAYLOAD = 0x200
+FILL_ARRAY_DATA_PAYLOAD = 0x300
+UNKNOWN = -1
+
+
+# Size in code units for each format.
+FORMAT_UNITS = {
+    '10x': 1, '12x': 1, '11n': 1, '11x': 1, '10t': 1,
+    '20t': 2, '22x': 2, '21t': 2, '21s': 2, '21h': 2, '21c': 2,
+    '23x': 2, '22b': 2, '22t': 2, '22s': 2, '22c': 2,
+    '30t': 3, '32x': 3, '31i': 3, '31t': 3, '31c': 3, '35c': 3, '3rc': 3,
+    '45cc': 4, '4rcc': 4, '51l': 5,
+}
+
+# What each format's operands tuple holds.
+OPERANDS = {
+    '10x': (),
+    '12x': ('vA', 'vB'),
+    '11n': ('vA', 'literal'),
+    '11x': ('vAA',),
+    '10t': ('branch',),
+    '20t': ('branch',),
+    '22x': ('vAA', 'vBBBB'),
+    '21t': ('vAA', 'branch'),
+    '21s': ('vAA', 'literal'),
+    '21h': ('vAA', 'literal'),
+    '21c': ('vAA', 'index'),
+    '23x': ('vAA', 'vBB', 'vCC'),
+    '22b': ('vAA', 'vBB', 'literal'),
+    '22t': ('vA', 'vB', 'branch'),
+    '22s': ('vA', 'vB', 'literal'),
+    '22c': ('vA', 'vB', 'index'),
+    '30t': ('branch',),
+    '32x': ('vAAAA', 'vBBBB'),
+    '31i': ('vAA', 'literal'),
+    '31t': ('vAA', 'branch'),
+    '31c': ('vAA', 'index'),
+    '35c': ('index', 'registers...'),
+    '3rc': ('index', 'first register', 'count'),
+    '45cc': ('index', 'proto', 'registers...'),
+    '4rcc': ('index', 'proto', 'first register', 'count'),
+    '51l': ('vAA', 'literal'),
+    'packed-switch-payload': ('first key', 'targets...'),
+    'sparse-switch-payload': ('keys and targets...',),
+    'fill-array-data-payload': ('element width', 'element count'),
+    'unknown': ('opcode',),
+}
+
+
+def _build_opcodes():
+    table = [None] * 256
+    def put(first, fmt, names, kind=None):
+        for idx, name in enumerate(names):
+            table[first + idx] = (name, fmt, kind)
+
+    put(0x00, '10x', ['nop'])
+    put(0x01, '12x', ['move'])
+    put(0x02, '22x', ['move/from16'])
+    put(0x03, '32x', ['move/16'])
+    put(0x04, '12x', ['move-wide'])
+    put(0x05, '22x', ['move-wide/from16'])
+    put(0x06, '32x', ['move-wide/16'])
+    put(0x07, '12x', ['move-object'])
+    put(0x08, '22x', ['move-object/from16'])
+    put(0x09, '32x', ['move-object/16'])
+    put(0x0a, '11x', ['move-result', 'move-result-wide', 'move-result-object', 'move-exception'])
+    put(0x0e, '10x', ['return-void'])
+    put(0x0f, '11x', ['return', 'return-wide', 'return-object'])
+    put(0x12, '11n', ['const/4'])
+    put(0x13, '21s', ['const/16'])
+    put(0x14, '31i', ['const'])
+    put(0x15, '21h', ['const/high16'])
+    put(0x16, '21s', ['const-wide/16'])
+    put(0x17, '31i', ['const-wide/32'])
+    put(0x18, '51l', ['const-wide'])
+    put(0x19, '21h', ['const-wide/high16'])
+    put(0x1a, '21c', ['const-string'], 'string')
+    put(0x1b, '31c', ['const-string/jumbo'], 'string')
+    put(0x1c, '21c', ['const-class'], 'type')
+    put(0x1d, '11x', ['monitor-enter', 'monitor-exit'])
+    put(0x1f, '21c', ['check-cast'], 'type')
+    put(0x20, '22c', ['instance-of'], 'type')
+    put(0x21, '12x', ['array-length'])
+    put(0x22, '21c', ['new-instance'], 'type')
+    put(0x23, '22c', ['new-array'], 'type')
+    put(0x24, '35c', ['filled-new-array'], 'type')
+    put(0x25, '3rc', ['filled-new-array/range'], 'type')
+    put(0x26, '31t', ['fill-array-data'])
+    put(0x27, '11x', ['throw'])
+    put(0x28, '10t', ['goto'])
+    put(0x29, '20t', ['goto/16'])
+    put(0x2a, '30t', ['goto/32'])
+    put(0x2b, '31t', ['packed-switch', 'sparse-switch'])
+    put(0x2d, '23x', ['cmpl-float', 'cmpg-float', 'cmpl-double', 'cmpg-double', 'cmp-long'])
+    put(0x32, '22t', ['if-eq', 'if-ne', 'if-lt', 'if-ge', 'if-gt', 'if-le'])
+    put(0x38, '21t', ['if-eqz', 'if-nez', 'if-ltz', 'if-gez', 'if-gtz', 'if-lez'])
+    kinds = ['', '-wide', '-object', '-boolean', '-byte', '-char', '-short']
+    put(0x44, '23x', [f'aget{kind}' for kind in kinds] + [f'aput{kind}' for kind in kinds])
+    put(0x52, '22c', [f'iget{kind}' for kind in kinds] + [f'iput{kind}' for kind in kinds], 'field')
+    put(0x60, '21c', [f'sget{kind}' for kind in kinds] + [f'sput{kind}' for kind in kinds], 'field')
+    invokes = ['invoke-virtual', 'invoke-super', 'invoke-direct', 'invoke-static', 'invoke-interface']
+    put(0x6e, '35c', invokes, 'meth')
+    put(0x74, '3rc', [f'{name}/range' for name in invokes], 'meth')
+    put(0x7b, '12x', [
+        'neg-int', 'not-int', 'neg-long', 'not-long', 'neg-float', 'neg-double',
+        'int-to-long', 'int-to-float', 'int-to-double', 'long-to-int', 'long-to-float',
+        'long-to-double', 'float-to-int', 'float-to-long', 'float-to-double', 'double-to-int',
+        'double-to-long', 'double-to-float', 'int-to-byte', 'int-to-char', 'int-to-short'])
+    int_ops = ['add', 'sub', 'mul', 'div', 'rem', 'and', 'or', 'xor', 'shl', 'shr', 'ushr']
+    float_ops = ['add', 'sub', 'mul', 'div', 'rem']
+    binops = ([f'{op}-int' for op in int_ops] + [f'{op}-long' for op in int_ops] +
+              [f'{op}-float' for op in float_ops] + [f'{op}-double' for op in float_ops])
+    put(0x90, '23x', binops)
+    put(0xb0, '12x', [f'{name}/2addr' for name in binops])
+    put(0xd0, '22s', ['add-int/lit16', 'rsub-int', 'mul-int/lit16', 'div-int/lit16',
+                      'rem-int/lit16', 'and-int/lit16', 'or-int/lit16', 'xor-int/lit16'])
+    put(0xd8, '22b', ['add-int/lit8', 'rsub-int/lit8', 'mul-int/lit8', 'div-int/lit8', 'rem-int/lit8',
+                      'and-int/lit8', 'or-int/lit8', 'xor-int/lit8', 'shl-int/lit8', 'shr-int/lit8', 'ushr-int/lit8'])
+    put(0xfa, '45cc', ['invoke-polymorphic'], 'meth')
+    put(0xfb, '4rcc', ['invoke-polymorphic/range'], 'meth')
+    put(0xfc, '35c', ['invoke-custom'], 'call_site')
+    put(0xfd, '3rc', ['invoke-custom/range'], 'call_site')
+    put(0xfe, '21c', ['const-method-handle'], 'method_handle')
+    put(0xff, '21c', ['const-method-type'], 'proto')
+    return table
+
+# opcode -> (name, format, index kind) or None if unused.
+OPCODES = _build_opcodes()
+
+PSEUDO_OPCODES = {
+    PACKED_SWITCH_PAYLOAD: ('packed-switch-payload', 'packed-switch-payload', None),
+    SPARSE_SWITCH_PAYLOAD: ('sparse-switch-payload', 'sparse-switch-payload', None),
+    FILL_ARRAY_DATA_PAYLOAD: ('fill-array-data-payload', 'fill-array-data-payload', None),
+    UNKNOWN: ('unknown', 'unknown', None),
+}
+
+
+def opcode_info(opcode):
+    """(name, format, index kind) for an opcode or pseudo-opcode."""
+    if 0 <= opcode < 256 and OPCODES[opcode]:
+        return OPCODES[opcode]
+    return PSEUDO_OPCODES.get(opcode, PSEUDO_OPCODES[UNKNOWN])
+
+
+class Instruction(namedtuple('Instruction', ['offset', 'opcode', 'operands', 'length'])):
+    __slots__ = ()
+
+    @property
+    def name(self):
+        return opcode_info(self.opcode)[0]
+
+    @property
+    def fmt(self):
+        return opcode_info(self.opcode)[1]
+
+    def __str__(self):
+        return render(self)
+
+
+# Per format operand decoders: (data, byte offset) -> operands tuple.
+_u16 = struct.Struct('<xxH').unpack_from
+_s16 = struct.Struct('<xxh').unpack_from
+_s32 = struct.Struct('<xxi').unpack_from
+_aa_u16 = struct.Struct('<xBH').unpack_from
+_aa_s16 = struct.Struct('<xBh').unpack_from
+_aa_s32 = struct.Struct('<xBi').unpack_from
+_aa_u32 = struct.Struct('<xBI').unpack_from
+_aa_s64 = struct.Struct('<xBq').unpack_from
+_aa_bb_cc = struct.Struct('<xBBB').unpack_from
+_aa_bb_s8 = struct.Struct('<xBBb').unpack_from
+_u16_u16 = struct.Struct('<xxHH').unpack_from
+_aa_u16_u16 = struct.Struct('<xBHH').unpack_from
+_aa_u16_u16_u16 = struct.Struct('<xBHHH').unpack_from
+
+
+def _f10x(data, o):
+    return ()
+
+def _f12x(data, o):
+    b = data[o+1]
+    return (b & 0xf, b >> 4)
+
+def _f11n(data, o):
+    b = data[o+1]
+    literal = b >> 4
+    return (b & 0xf, literal - 16 if literal & 0x8 else literal)
+
+def _f11x(data, o):
+    return (data[o+1],)
+
+def _f10t(data, o):
+    aa = data[o+1]
+    return (aa - 256 if aa & 0x80 else aa,)
+
+def _f22t(data, o):
+    b = data[o+1]
+    return (b & 0xf, b >> 4, _s16(data, o)[0])
+
+def _f22c(data, o):
+    b = data[o+1]
+    return (b & 0xf, b >> 4, _u16(data, o)[0])
+
+def _f35c(data, o):
+    b = data[o+1]
+    count, g = b >> 4, b & 0xf
+    index, = _u16(data, o)
+    dc, fe = data[o+4], data[o+5]
+    registers = (dc & 0xf, dc >> 4, fe & 0xf, fe >> 4, g)
+    return (index, *registers[:count])
+
+def _f3rc(data, o):
+    count, index, first = _aa_u16_u16(data, o)
+    return (index, first, count)
+
+def _f45cc(data, o):
+    proto, = struct.unpack_from('<H', data, o + 6)
+    index, *registers = _f35c(data, o)
+    return (index, proto, *registers)
+
+def _f4rcc(data, o):
+    count, index, first, proto = _aa_u16_u16_u16(data, o)
+    return (index, proto, first, count)
+
+FORMAT_DECODERS = {
+    '10x': _f10x, '12x': _f12x, '11n': _f11n, '11x': _f11x, '10t': _f10t,
+    '20t': _s16, '22x': _aa_u16, '21t': _aa_s16, '21s': _aa_s16, '21h': _aa_s16, '21c': _aa_u16,
+    '23x': _aa_bb_cc, '22b': _aa_bb_s8, '22t': _f22t, '22s': _f22t, '22c': _f22c,
+    '30t': _s32, '32x': _u16_u16, '31i': _aa_s32, '31t': _aa_s32, '31c': _aa_u32,
+    '35c': _f35c, '3rc': _f3rc, '45cc': _f45cc, '4rcc': _f4rcc, '51l': _aa_s64,
+}
+
+# opcode -> (format decoder, length in code units, length in bytes), None if unused.
+_DISPATCH = [None if entry is None else (FORMAT_DECODERS[entry[1]], FORMAT_UNITS[entry[1]], FORMAT_UNITS[entry[1]] * 2)
+             for entry in OPCODES]
+
+
+def _decode_payload(data, o, unit, end):
+    ident = data[o+1]
+    if ident == 0x01 and o + 8 <= end:
+        size, first_key = struct.unpack_from('<Hi', data, o + 2)
+        length = 4 + size * 2
+        if o + length * 2 <= end:
+            targets = struct.unpack_from(f'<{size}i', data, o + 8)
+            return Instruction(unit, PACKED_SWITCH_PAYLOAD, (first_key, *targets), length)
+    elif ident == 0x02 and o + 4 <= end:
+        size, = struct.unpack_from('<H', data, o + 2)
+        length = 2 + size * 4
+        if o + length * 2 <= end:
+            return Instruction(unit, SPARSE_SWITCH_PAYLOAD, struct.unpack_from(f'<{size * 2}i', data, o + 4), length)
+    elif ident == 0x03 and o + 8 <= end:
+        width, size = struct.unpack_from('<HI', data, o + 2)
+        length = (size * width + 1) // 2 + 4
+        if o + length * 2 <= end:
+            return Instruction(unit, FILL_ARRAY_DATA_PAYLOAD, (width, size), length)
+    return None
+
+
+def decode(data, offset=0, limit=None):
+    """Decode the instruction at a byte offset. Never raises on bad bytecode.
+
+      Args:
+        limit (int): Byte offset the instruction must end by, default len(data).
+    """
+    limit = len(data) if limit is None else limit
+    opcode = data[offset]
+    unit = offset >> 1
+    if opcode == 0x00 and data[offset+1]:
+        payload = _decode_payload(data, offset, unit, limit)
+        if payload:
+            return payload
+    dispatch = _DISPATCH[opcode]
+    if dispatch is None or offset + dispatch[1] * 2 > limit:
+        return Instruction(unit, UNKNOWN, (opcode,), 1)
+    return Instruction(unit, opcode, dispatch[0](data, offset), dispatch[1])
+
+
+def decode_all(data, start=0, end=None):
+    """Decode every instruction from code unit start up to code unit end.
+
+      Returns: List of Instruction()
+    """
+    data = bytes(data)
+    limit = len(data) if end is None else min(len(data), end * 2)
+    dispatch_table = _DISPATCH
+    new = tuple.__new__
+    out = []
+    append = out.append
+    offset = start * 2
+    while offset + 1 < limit:
+        opcode = data[offset]
+        dispatch = dispatch_table[opcode]
+        # Note: Inlined decode() for the common case, it's the hot loop. The
+        #       tuple.__new__ skips the namedtuple's python level __new__.
+        if opcode and dispatch:
+            operands_of, units, size = dispatch
+            if offset + size <= limit:
+                append(new(Instruction, (offset >> 1, opcode, operands_of(data, offset), units)))
+                offset += size
+                continue
+        ins = decode(data, offset, limit)
+        append(ins)
+        offset += ins.length * 2
+    return out
+
+
+def _ref(kind, idx, dex):
+    if dex is not None:
+        symbol = dex.symbol(kind, idx)
+        if symbol is not None:
+            return symbol
+    return f'{kind}@{idx:04x}'
+
+
+def render(ins, dex=None):
+    """Text for an Instruction, smali-ish.
+
+      Args:
+        dex: Optional dexfile.DexFile the method came from, index operands
+             then render as symbols instead of `kind@idx`.
+    """
+    name, fmt, kind = opcode_info(ins.opcode)
+    ops = ins.operands
+
+    if fmt == 'unknown':
+        return f'.unknown 0x{ops[0]:02x}'
+    if fmt == 'packed-switch-payload':
+        first_key, targets = ops[0], ops[1:]
+        return f'{name} ' + ', '.join(f'{first_key + idx}: {target:+d}' for idx, target in enumerate(targets))
+    if fmt == 'sparse-switch-payload':
+        half = len(ops) // 2
+        return f'{name} ' + ', '.join(f'{key}: {target:+d}' for key, target in zip(ops[:half], ops[half:]))
+    if fmt == 'fill-array-data-payload':
+        return f'{name} width={ops[0]} count={ops[1]}'
+
+    if fmt in ('35c', '45cc'):
+        skip = 2 if fmt == '45cc' else 1
+        registers = ', '.join(f'v{reg}' for reg in ops[skip:])
+        text = f'{name} {{{registers}}}, {_ref(kind, ops[0], dex)}'
+        return text + (f', {_ref("proto", ops[1], dex)}' if fmt == '45cc' else '')
+    if fmt in ('3rc', '4rcc'):
+        first, count = ops[-2], ops[-1]
+        text = f'{name} {{v{first} .. v{first + count - 1}}}, {_ref(kind, ops[0], dex)}'
+        return text + (f', {_ref("proto", ops[1], dex)}' if fmt == '4rcc' else '')
+
+    roles = OPERANDS[fmt]
+    parts = []
+    for role, value in zip(roles, ops):
+        if role.startswith('v'):
+            parts.append(f'v{value}')
+        elif role == 'literal':
+            if fmt == '21h':
+                value <<= 48 if name == 'const-wide/high16' else 16
+            parts.append(f'#{value:+d}')
+        elif role == 'branch':
+            parts.append(f'{value:+d}')
+        else:
+            parts.append(_ref(kind, value, dex))
+    return f'{name} ' + ', '.join(parts) if parts else name
@@ -0,0 +1,302 @@
+'''
+Copyright (c) 2025 Vincent Agriesti
+
+This file is part of the thirdparty JDWP project.
+Licensed under the MIT License. See the LICENSE file in the project root
+for full license text.
+'''
+
+import json
+import mmap
+import struct
+from collections import namedtuple
+from thirdparty.dalvik.dex.header import DexHeader
+
+'''
+Memory mapped DEX file.
+
+Nothing is parsed up front but the header. The id tables (string_ids,
+type_ids, proto_ids, field_ids, method_ids, class_defs) are read in place
+from the mapping, u32 tables through memoryview casts and records with
+struct.unpack_from, so opening a large multi-dex app is instant and only
+touched pages are ever read. Decoded strings, types, protos and class
+lookups are memoized as they're asked for.
+
+symbol(kind, idx) resolves the `kind@idx` operands of decoder.Instruction
+(see decoder.render(ins, dex)), this is what replaces androguard in
+method-table.py.
+
+  dex = DexFile('classes.dex')
+  dex.method(0xc802)      # ('Lcom/Foo;', 'bar', '(I)V')
+  dex.symbol('meth', 0xc802)
+  code = dex.code_item('Lcom/Foo;', 'bar', '(I)V')
+  ControlFlowGraph(decode_all(code.insns), code.try_ranges())
+'''
+
+
+ClassDef = namedtuple('ClassDef', [
+    'class_idx', 'access_flags', 'superclass_idx', 'interfaces_off',
+    'source_file_idx', 'annotations_off', 'class_data_off', 'static_values_off'])
+
+NO_INDEX = 0xffffffff
+
+_proto_id = struct.Struct('<III')
+_member_id = struct.Struct('<HHI')
+_class_def = struct.Struct('<8I')
+_code_item = struct.Struct('<HHHHII')
+_try_item = struct.Struct('<IHH')
+
+
+def read_uleb128(data, offset):
+    """Returns: (value, next offset)"""
+    result = 0
+    shift = 0
+    while True:
+        byte = data[offset]
+        offset += 1
+        result |= (byte & 0x7f) << shift
+        if byte < 0x80:
+            return result, offset
+        shift += 7
+
+
+def read_sleb128(data, offset):
+    """Returns: (value, next offset)"""
+    result, end = read_uleb128(data, offset)
+    bits = 7 * (end - offset)
+    if result & (1 << (bits - 1)):
+        result -= 1 << bits
+    return result, end
+
+
+def decode_mutf8(raw):
+    """Modified UTF-8 (dex string_data) to str."""
+    try:
+        return raw.decode('utf-8')
+    except UnicodeDecodeError:
+        # Embedded NULs are C0 80 and supplementary characters come as
+        # surrogate pairs, 3 bytes per surrogate.
+        text = raw.replace(b'\xc0\x80', b'\x00').decode('utf-8', 'surrogatepass')
+        return text.encode('utf-16-le', 'surrogatepass').decode('utf-16-le', 'replace')
+
+
+class CodeItem(namedtuple('CodeItem', ['registers', 'ins', 'outs', 'insns', 'tries'])):
+    """A method's code_item. insns is a memoryview into the mapping, it
+      keeps the mapping alive past DexFile.close() (bytes() it to let go).
+
+      tries is a list of (start_addr, insn_count, [(type descriptor or None, handler_addr)]),
+      None standing for a catch-all.
+    """
+    __slots__ = ()
+
+    def try_ranges(self):
+        """tries in the (start_addr, insn_count, [handler_addr]) form ControlFlowGraph takes."""
+        return [(start, count, [addr for _, addr in handlers]) for start, count, handlers in self.tries]
+
+
+class DexFile():
+
+    def __init__(self, path=None, data=None):
+        """
+          Args:
+            path (str): DEX file to map read only.
+            data (bytes): Or a DEX already in memory (e.g. read out of an apk).
+        """
+        self.path = path
+        self._file = None
+        if data is None:
+            self._file = open(path, 'rb')
+            data = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        self.data = data
+        self.view = memoryview(data)
+        self.header = DexHeader(self.view[:0x70])
+
+        h = self.header
+        self.string_ids = self._u32_table(h.string_ids_off, h.string_ids_size)
+        self.type_ids = self._u32_table(h.type_ids_off, h.type_ids_size)
+
+        self._strings = {}
+        self._protos = {}
+        self._class_defs_by_descriptor = None
+
+
+    def _u32_table(self, offset, count):
+        # Note: Native byte order, DEX is little endian like every Android ABI.
+        return self.view[offset:offset + count * 4].cast('I')
+
+
+    def close(self):
+        self.string_ids.release()
+        self.type_ids.release()
+        self.view.release()
+        if self._file:
+            try:
+                self.data.close()
+            except BufferError:
+                # Note: CodeItem.insns views are still around, the mapping goes with the last of them.
+                pass
+            self._file.close()
+
+
+    def __enter__(self):
+        return self
+
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+    def string(self, idx):
+        text = self._strings.get(idx)
+        if text is None:
+            offset = self.string_ids[idx]
+            _, start = read_uleb128(self.data, offset)
+            end = self.data.find(b'\x00', start)
+            text = self._strings[idx] = decode_mutf8(bytes(self.view[start:end]))
+        return text
+
+
+    def type(self, idx):
+        """Type descriptor, e.g. 'Ljava/lang/String;'"""
+        return self.string(self.type_ids[idx])
+
+
+    def type_list(self, offset):
+        if offset == 0:
+            return ()
+        size, = struct.unpack_from('<I', self.data, offset)
+        return struct.unpack_from(f'<{size}H', self.data, offset + 4)
+
+
+    def proto(self, idx):
+        """Method signature, e.g. '(ILjava/lang/String;)V'"""
+        signature = self._protos.get(idx)
+        if signature is None:
+            _, return_type_idx, parameters_off = _proto_id.unpack_from(
+                self.data, self.header.proto_ids_off + idx * _proto_id.size)
+            params = ''.join(self.type(type_idx) for type_idx in self.type_list(parameters_off))
+            signature = self._protos[idx] = f'({params}){self.type(return_type_idx)}'
+        return signature
+
+
+    def field(self, idx):
+        """Returns: (class descriptor, name, type descriptor)"""
+        class_idx, type_idx, name_idx = _member_id.unpack_from(
+            self.data, self.header.field_ids_off + idx * _member_id.size)
+        return self.type(class_idx), self.string(name_idx), self.type(type_idx)
+
+
+    def method(self, idx):
+        """Returns: (class descriptor, name, signature)"""
+        class_idx, proto_idx, name_idx = _member_id.unpack_from(
+            self.data, self.header.method_ids_off + idx * _member_id.size)
+        return self.type(class_idx), self.string(name_idx), self.proto(proto_idx)
+
+
+    def class_def(self, idx):
+        return ClassDef._make(_class_def.unpack_from(self.data, self.header.class_defs_off + idx * _class_def.size))
+
+
+    def find_class(self, descriptor):
+        """ClassDef of a class defined in this file, None if it isn't."""
+        if self._class_defs_by_descriptor is None:
+            # Only the class_idx column is read, the first lookup pays for
+            # decoding the class descriptors, not the whole string table.
+            base = self.header.class_defs_off
+            self._class_defs_by_descriptor = {
+                self.type(struct.unpack_from('<I', self.data, base + idx * _class_def.size)[0]): idx
+                for idx in range(self.header.class_defs_size)}
+        idx = self._class_defs_by_descriptor.get(descriptor)
+        return None if idx is None else self.class_def(idx)
+
+
+    def class_methods(self, class_def):
+        """Yield (method_idx, access_flags, code_off) for direct then virtual methods."""
+        if class_def.class_data_off == 0:
+            return
+        data = self.data
+        offset = class_def.class_data_off
+        static_fields, offset = read_uleb128(data, offset)
+        instance_fields, offset = read_uleb128(data, offset)
+        direct_methods, offset = read_uleb128(data, offset)
+        virtual_methods, offset = read_uleb128(data, offset)
+        for _ in range((static_fields + instance_fields) * 2):
+            _, offset = read_uleb128(data, offset)
+        for count in (direct_methods, virtual_methods):
+            method_idx = 0
+            for _ in range(count):
+                diff, offset = read_uleb128(data, offset)
+                access_flags, offset = read_uleb128(data, offset)
+                code_off, offset = read_uleb128(data, offset)
+                method_idx += diff
+                yield method_idx, access_flags, code_off
+
+
+    def code_item(self, descriptor, name, signature):
+        """CodeItem of a method, None if not here or it has no code (abstract/native)."""
+        class_def = self.find_class(descriptor)
+        if class_def is None:
+            return None
+        for method_idx, _, code_off in self.class_methods(class_def):
+            if code_off and self.method(method_idx)[1:] == (name, signature):
+                return self.read_code_item(code_off)
+        return None
+
+
+    def read_code_item(self, offset):
+        registers, ins, outs, tries_size, _, insns_size = _code_item.unpack_from(self.data, offset)
+        insns_off = offset + _code_item.size
+        insns = self.view[insns_off:insns_off + insns_size * 2]
+
+        tries = []
+        if tries_size:
+            tries_off = insns_off + insns_size * 2 + (insns_size & 1) * 2
+            handlers_off = tries_off + tries_size * _try_item.size
+            for idx in range(tries_size):
+                start, count, handler_off = _try_item.unpack_from(self.data, tries_off + idx * _try_item.size)
+                tries.append((start, count, self._catch_handlers(handlers_off + handler_off)))
+        return CodeItem(registers, ins, outs, insns, tries)
+
+
+    def _catch_handlers(self, offset):
+        size, offset = read_sleb128(self.data, offset)
+        handlers = []
+        for _ in range(abs(size)):
+            type_idx, offset = read_uleb128(self.data, offset)
+            addr, offset = read_uleb128(self.data, offset)
+            handlers.append((self.type(type_idx), addr))
+        if size <= 0:
+            addr, offset = read_uleb128(self.data, offset)
+            handlers.append((None, addr))
+        return handlers
+
+
+    def symbol(self, kind, idx):
+        """Text for a `kind@idx` operand (decoder index kinds), None if unresolvable."""
+        h = self.header
+        try:
+            if kind == 'string' and idx < h.string_ids_size:
+                return json.dumps(self.string(idx), ensure_ascii=False)
+            if kind == 'type' and idx < h.type_ids_size:
+                return self.type(idx)
+            if kind == 'field' and idx < h.field_ids_size:
+                cls, name, type_ = self.field(idx)
+                return f'{cls}->{name}:{type_}'
+            if kind == 'meth' and idx < h.method_ids_size:
+                cls, name, signature = self.method(idx)
+                return f'{cls}->{name}{signature}'
+            if kind == 'proto' and idx < h.proto_ids_size:
+                return self.proto(idx)
+        except (IndexError, struct.error, UnicodeError):
+            # Bytecode from another dex file (or garbage) can point anywhere.
+            pass
+        return None
+
+
+    def __repr__(self):
+        try:
+            h = self.header
+            return (f'DexFile({self.path or "<memory>"}, {h.string_ids_size} strings, {h.type_ids_size} types, '
+                    f'{h.method_ids_size} methods, {h.class_defs_size} classes)')
+        except Exception as e:
+            return f"DexFile(ERROR: {e})"
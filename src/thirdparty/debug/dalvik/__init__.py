@@ -9,13 +9,23 @@ for full license text.
 import asyncio
 from thirdparty.jdwp import (
     Jdwp, Byte, Boolean, Int, String, ReferenceTypeID, Location, 
-    Long, ClassID, ObjectID, FrameID, MethodID)
+    Long, ClassID, ObjectID, FrameID, MethodID, ThreadID)
 
 from thirdparty.dalvik.dex import disassemble
 from thirdparty.debug.dalvik.info.state import *
-from thirdparty.debug.dalvik.info.breakpoint import BreakpointInfo
+from thirdparty.debug.dalvik.info.breakpoint import BreakpointInfo, ConditionalBreakpointInfo, LogpointInfo, Capture
 from thirdparty.debug.dalvik.info.thread import ThreadInfo
 from thirdparty.debug.dalvik.info.object import ObjectInfo
+from thirdparty.debug.dalvik.info.snapshot import SnapshotInfo
+from thirdparty.debug.dalvik.info.heap import HeapHistogramInfo
+from thirdparty.debug.dalvik.info.retention import RetentionInfo
+from thirdparty.debug.dalvik.info.handles import ObjectHandles
+from thirdparty.debug.dalvik.info.deferred import DeferredBreakpointRegistry
+from thirdparty.debug.dalvik.info.lines import LineTableInfo
+from thirdparty.debug.dalvik.info.disassembly import DisassemblyInfo
+from thirdparty.debug.dalvik.util.cache import MetadataCache
+from thirdparty.dalvik.dex.cfg import ControlFlowGraph
+from thirdparty.dalvik.dex.dexfile import DexFile
 
 import thirdparty.sandbox as __sandbox__
 import typing
@@ -77,6 +87,21 @@ from pprint import pprint
 '''
 
 
+# Always-on CLASS_PREPARE tracking skips these (JDWP ClassExclude patterns).
+# Excluded classes are looked up with ClassesBySignature/Signature the first
+# time something references them, see Debugger.find_class()/ensure_class().
+# Logged when tracking starts, configure_class_tracking(excludes=[]) to see everything.
+DEFAULT_CLASS_EXCLUDES = [
+    'java.*', 'javax.*', 'sun.*', 'libcore.*', 'dalvik.*', 'android.*',
+    'androidx.*', 'com.android.*', 'kotlin.*', 'kotlinx.*',
+]
+
+# Queued CLASS_PREPARE events are flushed into the class table after this
+# many events or this many seconds, whichever comes first.
+CLASS_PREPARE_BATCH = 512
+CLASS_PREPARE_DELAY = 0.05
+
+
 class Debugger():
 
     def __init__(self, state=None):
@@ -87,22 +112,50 @@ class Debugger():
             self.state = DebuggerState()
 
         self.jdwp = self.state.jdwp
+        self.classes = self.state.classes
+        self.classes.dbg = self
         self.classes_by_id = self.state.classes_by_id
         self.classes_by_signature = self.state.classes_by_signature
+        self.symbols = self.state.symbols
         self.unloaded_classes = self.state.unloaded_classes
         self.threads_by_id = self.state.threads_by_id
         self.dead_threads = self.state.dead_threads
         self.objects_by_id = self.state.objects_by_id
+        self.strings_by_id = self.state.strings_by_id
+
+        # Kept in the state so pins survive a hot reload.
+        if self.state.handles is None:
+            self.state.handles = ObjectHandles(self)
+        self.handles = self.state.handles
+
+        # Kept in the state so pending breakpoints survive a hot reload.
+        if self.state.deferred is None:
+            self.state.deferred = DeferredBreakpointRegistry(self)
+        self.deferred = self.state.deferred
+        self.metadata_cache = self.state.metadata_cache
+        self.dex_files = self.state.dex_files
 
         # TODO: Consider the event handlers. We won't automatically hot reload them.
 
+        # Class tracking filters, set before start() or use configure_class_tracking().
+        self.class_prepare_excludes = list(DEFAULT_CLASS_EXCLUDES)
+        self.class_prepare_matches = []
+        self.class_prepare_reqids = []
+
+        # Micro-batched CLASS_PREPARE events waiting for _flush_class_prepares().
+        self._class_prepare_batch = []
+        self._class_prepare_timer = None
+
 
-    async def start(self, host, port):
+    async def start(self, host, port, connection=None):
         # TODO: unwind this with JdmDebuggerState
         if self.state.jdwp is None:
             self.state.jdwp = Jdwp(host, port)
             self.jdwp = self.state.jdwp
-        await self.jdwp.start()
+        # Note: connection is an already handshaken (reader, writer), see util/asyncadb.py
+        await self.jdwp.start(connection=connection)
+        # Feeds state.recent_events, see sandbox/shm.py
+        self.jdwp.add_event_observer(self.state.record_event)
 
         # Always immediately suspend VM
         await self.jdwp.VirtualMachine.Suspend()
@@ -128,9 +181,32 @@ class Debugger():
 
 
     def object_info(self, object_id):
-        if object_id in self.objects_by_id:
-            return self.objects_by_id[object_id]
-        return ObjectInfo(self, object_id)
+        return self.handles.get(object_id)
+
+
+    async def pin(self, obj):
+        """Disable collection of an object so its ID stays valid.
+
+          Args:
+            obj (int): Object ID.
+            obj (ObjectInfo): ObjectInfo instance.
+
+          Returns: Pinned ObjectInfo()
+        """
+        return await self.handles.pin(obj)
+
+
+    async def unpin(self, obj):
+        """Re-enable collection of a pinned object."""
+        return await self.handles.unpin(obj)
+
+
+    async def sweep(self):
+        """Forget collected objects and strings, and dispose of their IDs.
+
+          Returns: Number of object IDs dropped.
+        """
+        return await self.handles.sweep()
 
 
     async def deref(self, obj):
@@ -148,23 +224,153 @@ class Debugger():
         return await obj.load()
 
 
-    
+    async def snapshot(self, obj, depth=2, budget=1000, concurrency=16):
+        """Capture an object and the objects reachable from it.
+
+          Args:
+            obj (int): Object ID.
+            obj (ObjectInfo): ObjectInfo instance.
+            depth (int): How many field hops to follow from obj.
+            budget (int): Maximum number of objects to capture.
+            concurrency (int): Maximum in-flight object fetches.
+
+          Returns: Captured SnapshotInfo()
+        """
+        if isinstance(obj, ObjectInfo):
+            obj = obj.object_id
+        return await SnapshotInfo(self, obj, depth, budget).capture(concurrency)
+
+
+    def diff(self, before, after):
+        """Compare two snapshots of the same root by object and field.
+
+          Returns: SnapshotDiff() with only the changed values.
+        """
+        return before.diff(after)
+
+
+    async def heap_histogram(self, n=20, batch_size=2000, concurrency=4):
+        """Count instances of every known class.
+
+          Note: The returned HeapHistogramInfo keeps its samples, so call
+                `await hist.sample()` again (or `hist.start(interval)`) and
+                `hist.growth()` to see which classes are growing.
+
+          Args:
+            n (int): Rows shown when the histogram is printed.
+
+          Returns: HeapHistogramInfo() with one sample taken.
+        """
+        histogram = HeapHistogramInfo(self, batch_size, concurrency, n=n)
+        await histogram.sample()
+        return histogram
+
+
+    async def instances(self, clazz, max_instances=100):
+        """List live instances of a class.
+
+          Args:
+            clazz (int): Class ID.
+            clazz (str): Class signature.
+            max_instances (int): Maximum instances to return, 0 for all.
+
+          Returns: List of ObjectInfo()
+        """
+        if isinstance(clazz, str):
+            class_info = await self.find_class(clazz)
+            if class_info is None:
+                print(f"ERROR: Class not found: {clazz}")
+                return None
+            clazz = class_info.typeID
+
+        instances_req = self.jdwp.ReferenceType.InstancesRequest()
+        instances_req.refType = ReferenceTypeID(clazz)
+        instances_req.maxInstances = Int(max_instances)
+        instances_reply, error_code = await self.jdwp.ReferenceType.Instances(instances_req)
+        if error_code != Jdwp.Error.NONE:
+            print(f"ERROR: Failed to get instances: {Jdwp.Error.string[error_code]}")
+            return None
+
+        return [self.object_info(instance.objectID) for instance in instances_reply.instances]
+
+
+    async def retention_paths(self, obj, max_paths=3, concurrency=8, **kwargs):
+        """Find the shortest reference chains keeping an object alive.
+
+          Note: To consume paths as they're found, iterate
+                `RetentionInfo(dbg, object_id).search()` instead.
+
+          Args:
+            obj (int): Object ID.
+            obj (ObjectInfo): ObjectInfo instance.
+            max_paths (int): Stop after this many paths.
+            concurrency (int): Maximum in-flight ReferringObjects requests.
+            kwargs: Other RetentionInfo() budgets (max_depth, max_nodes,
+                    max_referrers, timeout) and anchors.
+
+          Returns: RetentionInfo() holding the paths found.
+        """
+        if isinstance(obj, ObjectInfo):
+            obj = obj.object_id
+        retention = RetentionInfo(self, obj, max_paths=max_paths, **kwargs)
+        await retention.find(concurrency)
+        return retention
 
 
     async def enable_class_prepare_events(self):
         # Watch for new classes.
         #print("EventRequest.Set(CLASS_PREPARE / NO_SUSPEND)")
-        evt_req = self.jdwp.EventRequest.SetRequest()
-        evt_req.eventKind = Byte(Jdwp.EventKind.CLASS_PREPARE)
-        evt_req.suspendPolicy = Byte(Jdwp.SuspendPolicy.NONE)
-        # No modifiers.
-        self.class_prepare_reqid, error_code = await self.jdwp.EventRequest.Set(evt_req)
-        if error_code != Jdwp.Error.NONE:
-            print(f"ERROR: Failed to enable class prepare events: {Jdwp.Error.string[error_code]}")
-            return
-        #print(f"enable_class_prepare_events RequestID = {self.class_prepare_reqid}")
 
-        self.jdwp.register_event_handler(self.class_prepare_reqid, Debugger.handle_class_prepare, self)
+        if self.class_prepare_excludes:
+            print(f"Class tracking excludes {', '.join(self.class_prepare_excludes)} "
+                  "(configure_class_tracking() to change).")
+
+        # Note: JDWP ANDs modifiers together, so each ClassMatch pattern needs
+        #       its own request. Every request carries all of the excludes.
+        for pattern in (self.class_prepare_matches or [None]):
+            evt_req = self.jdwp.EventRequest.SetRequest()
+            evt_req.eventKind = Byte(Jdwp.EventKind.CLASS_PREPARE)
+            evt_req.suspendPolicy = Byte(Jdwp.SuspendPolicy.NONE)
+            if pattern:
+                mod = self.jdwp.EventRequest.SetClassMatchModifier()
+                mod.classPattern = String(pattern)
+                evt_req.modifiers.append(mod)
+            for exclude in self.class_prepare_excludes:
+                mod = self.jdwp.EventRequest.SetClassExcludeModifier()
+                mod.classPattern = String(exclude)
+                evt_req.modifiers.append(mod)
+
+            reqid, error_code = await self.jdwp.EventRequest.Set(evt_req)
+            if error_code != Jdwp.Error.NONE:
+                print(f"ERROR: Failed to enable class prepare events: {Jdwp.Error.string[error_code]}")
+                continue
+            #print(f"enable_class_prepare_events RequestID = {reqid}")
+
+            self.class_prepare_reqids.append(reqid)
+            self.jdwp.register_event_handler(reqid, Debugger.queue_class_prepare, self)
+
+        self.class_prepare_reqid = self.class_prepare_reqids[0] if self.class_prepare_reqids else None
+
+
+    async def configure_class_tracking(self, excludes=None, matches=None):
+        """Change which classes the always-on CLASS_PREPARE tracking reports.
+
+          Args:
+            excludes: List of ClassExclude patterns (e.g. 'android.*'),
+                      None keeps the current list, [] excludes nothing.
+            matches: List of ClassMatch patterns (e.g. 'com.example.*'),
+                     None keeps the current list, [] matches everything.
+        """
+        if excludes is not None:
+            self.class_prepare_excludes = list(excludes)
+        if matches is not None:
+            self.class_prepare_matches = list(matches)
+
+        for reqid in self.class_prepare_reqids:
+            await self.disable_class_prepare_event(reqid)
+            self.jdwp.unregister_event_handler(reqid)
+        self.class_prepare_reqids = []
+        await self.enable_class_prepare_events()
 
 
     async def enable_class_unload_events(self):
@@ -182,12 +388,14 @@ class Debugger():
 
         async def handle_class_unload(event, composite, wp):
             # TODO: Do we check if it already existed?
-            
+            self._flush_class_prepares()
+
             if event.signature in self.classes_by_signature:
                 classInfo = self.classes_by_signature[event.signature]
                 self.classes_by_signature.pop(event.signature, None)
                 self.classes_by_id.pop(classInfo.typeID, None)
                 self.unloaded_classes.append(classInfo)
+                self.symbols.remove_class(classInfo)
                 # TODO: Implement way to show first A chars and last B chars in X width.
                 print(f"CLASS_UNLOAD: {classInfo.signature[:60]}")
 
@@ -243,7 +451,7 @@ class Debugger():
     async def disable_class_prepare_event(self, request_id):
         evt_req = self.jdwp.EventRequest.ClearRequest()
         evt_req.eventKind = Byte(Jdwp.EventKind.CLASS_PREPARE)
-        evt_req.requestID = request_id
+        evt_req.requestID = Int(request_id)
         await self.jdwp.EventRequest.Clear(evt_req)
 
     
@@ -251,19 +459,140 @@ class Debugger():
     async def disable_breakpoint_event(self, request_id):
         evt_req = self.jdwp.EventRequest.ClearRequest()
         evt_req.eventKind = Byte(Jdwp.EventKind.BREAKPOINT)
-        evt_req.requestID = request_id
+        evt_req.requestID = Int(request_id)
         await self.jdwp.EventRequest.Clear(evt_req)
 
     async def disable_step_event(self, request_id):
         evt_req = self.jdwp.EventRequest.ClearRequest()
         evt_req.eventKind = Byte(Jdwp.EventKind.SINGLE_STEP)
-        evt_req.requestID = request_id
+        evt_req.requestID = Int(request_id)
         await self.jdwp.EventRequest.Clear(evt_req)
 
 
     
 
 
+    def use_metadata_cache(self, path, identity):
+        """Persist class metadata (e.g. line tables) in a sqlite file.
+
+          Args:
+            path (str): sqlite database path.
+            identity (str): Names the app build, e.g. `await adb.package_identity()`.
+                            Rows from other builds are ignored. Required, with
+                            one key space for every build stale rows get served
+                            after an update.
+        """
+        if not identity:
+            print("ERROR: use_metadata_cache() needs an identity, e.g. await adb.package_identity()")
+            return None
+        self.state.metadata_cache = MetadataCache(path, identity)
+        self.metadata_cache = self.state.metadata_cache
+        return self.metadata_cache
+
+
+    def use_dex_files(self, *paths):
+        """Map the app's dex files (e.g. pulled classes*.dex) for symbolic disassembly.
+
+          Note: Files are mmap'd and indexed lazily, this is cheap even for
+                large multi-dex apps.
+
+          Returns: List of all DexFile() in use.
+        """
+        for path in paths:
+            self.dex_files.append(DexFile(path))
+        return self.dex_files
+
+
+    def dex_for(self, signature):
+        """DexFile() defining a class signature, None if no mapped file does."""
+        for dex in self.dex_files:
+            if dex.find_class(signature) is not None:
+                return dex
+        return None
+
+
+    async def line_table(self, class_info, method_info, commit=True):
+        """Get (and cache) a method's LineTableInfo.
+
+          Note: Methods without line info (native, abstract, stripped dex)
+                get an empty table, not an error.
+        """
+        if method_info.line_table is not None:
+            return method_info.line_table
+
+        cache = self.metadata_cache
+        if cache:
+            method_info.line_table = cache.get_line_table(class_info.signature, method_info.name, method_info.signature)
+            if method_info.line_table is not None:
+                return method_info.line_table
+
+        req = self.jdwp.Method.LineTableRequest()
+        req.refType = ReferenceTypeID(class_info.typeID)
+        req.methodID = MethodID(method_info.methodID)
+        reply, error_code = await self.jdwp.Method.LineTable(req)
+        if error_code == Jdwp.Error.ABSENT_INFORMATION:
+            line_table = LineTableInfo()
+        elif error_code != Jdwp.Error.NONE:
+            print(f"ERROR: Failed to get line table: {Jdwp.Error.string[error_code]}")
+            return None
+        else:
+            line_table = LineTableInfo.from_reply(reply)
+
+        method_info.line_table = line_table
+        if cache:
+            cache.put_line_table(class_info.signature, method_info.name, method_info.signature, line_table, commit)
+        return line_table
+
+
+    async def line_tables(self, class_info):
+        """Line tables for every method of a class, fetched concurrently.
+
+          Returns: List of (MethodInfo, LineTableInfo).
+        """
+        class_info = await class_info.load()
+        methods = list(class_info.methods_by_id.values())
+        tables = await asyncio.gather(*[self.line_table(class_info, method, commit=False) for method in methods])
+        if self.metadata_cache:
+            self.metadata_cache.commit()
+        return [(method, table) for method, table in zip(methods, tables) if table is not None]
+
+
+    async def line_of(self, class_id, method_id, code_index):
+        """Source line of a location, None if unknown."""
+        class_info = await self.class_info(class_id)
+        method_info = class_info.methods_by_id.get(method_id)
+        if method_info is None:
+            return None
+        line_table = await self.line_table(class_info, method_info)
+        return line_table.line_of(code_index) if line_table else None
+
+
+    async def find_line(self, class_info, line, method_key=None, exact=False):
+        """Resolve a source line to a location in a class.
+
+          Args:
+            line (int): Source line.
+            method_key: Optional (name, signature) to only look in one method.
+            exact (bool): Don't move to the next line with code.
+
+          Returns: (MethodInfo, code_index, line) or None.
+        """
+        best = None
+        for method, line_table in await self.line_tables(class_info):
+            if method_key and (method.name, method.signature) != method_key:
+                continue
+            line_range = line_table.line_range()
+            if not line_range or not line_range[0] <= line <= line_range[1]:
+                continue
+            found = line_table.code_index_of(line, exact)
+            if found is None:
+                continue
+            # Closest line wins (e.g. a lambda body nested in the line range of its outer method).
+            if best is None or found[0] < best[2]:
+                best = (method, found[1], found[0])
+        return best
+
+
     async def load_method_bytecode(self, classID, methodID):
 
         if classID in self.classes_by_id:
@@ -271,22 +600,105 @@ class Debugger():
             if methodID in classInfo.methods_by_id:
                 methodInfo = classInfo.methods_by_id[methodID]
 
+                cache = self.metadata_cache
+                if not methodInfo.bytecode and cache:
+                    cached = cache.get_bytecode(classInfo.signature, methodInfo.name, methodInfo.signature)
+                    if cached:
+                        bytecode, offsets, text = cached
+                        methodInfo.bytecode = bytecode
+                        if offsets is not None:
+                            methodInfo.disassembly = DisassemblyInfo.from_bytes(bytecode, offsets, text)
+
                 if not methodInfo.bytecode:
                     req = self.jdwp.Method.BytecodesRequest()
                     req.refType = ReferenceTypeID(classID)
-                    req.methodID = methodID
+                    req.methodID = MethodID(methodID)
                     reply, error_code = await self.jdwp.Method.Bytecodes(req)
                     if error_code != Jdwp.Error.NONE:
                         print(f"ERROR: Failed to fetch bytecode: {Jdwp.Error.string[error_code]}")
                         return
-                    methodInfo.bytecode = reply.bytecodes
+                    methodInfo.bytecode = bytes(reply.bytecodes)
+                    if cache:
+                        cache.put_bytecode(classInfo.signature, methodInfo.name, methodInfo.signature, methodInfo.bytecode)
         
                 return methodInfo.bytecode
 
         return None
 
 
-    
+    async def disassembly(self, classID, methodID):
+        """Get (and cache) the whole method disassembled.
+
+          Note: With use_metadata_cache() this survives the session too,
+                revisiting a method costs no JDWP traffic. Text is rendered
+                per instruction on demand either way.
+
+          Returns: DisassemblyInfo() or None.
+        """
+        bytecode = await self.load_method_bytecode(classID, methodID)
+        if bytecode is None:
+            return None
+
+        classInfo = self.classes_by_id[classID]
+        methodInfo = classInfo.methods_by_id[methodID]
+        if methodInfo.disassembly is None:
+            methodInfo.disassembly = DisassemblyInfo(bytecode, dex=self.dex_for(classInfo.signature))
+            if self.metadata_cache:
+                offsets, text = methodInfo.disassembly.to_bytes()
+                self.metadata_cache.put_bytecode(
+                    classInfo.signature, methodInfo.name, methodInfo.signature, bytecode, offsets, text)
+        elif methodInfo.disassembly.dex is None and self.dex_files:
+            dex = self.dex_for(classInfo.signature)
+            if dex:
+                methodInfo.disassembly.symbolize(dex)
+        return methodInfo.disassembly
+
+
+    async def cfg(self, classID, methodID, tries=()):
+        """Get (and cache) the control flow graph of a method.
+
+          Args:
+            tries: Optional (start_addr, insn_count, [handler_addr]) try ranges.
+                   JDWP has no try/catch info, without these (or the method's
+                   dex file, see use_dex_files()) there are no exception edges.
+
+          Returns: ControlFlowGraph() or None.
+        """
+        disassembly = await self.disassembly(classID, methodID)
+        if disassembly is None:
+            return None
+
+        classInfo = self.classes_by_id[classID]
+        methodInfo = classInfo.methods_by_id[methodID]
+        if methodInfo.cfg is None and not tries and disassembly.dex:
+            code = disassembly.dex.code_item(classInfo.signature, methodInfo.name, methodInfo.signature)
+            tries = code.try_ranges() if code else ()
+        if methodInfo.cfg is None or tries:
+            methodInfo.cfg = ControlFlowGraph(disassembly.instructions, tries)
+        return methodInfo.cfg
+
+
+    async def class_cfgs(self, class_info):
+        """Control flow graphs for every method of a class.
+
+          Note: Bytecode is fetched concurrently, then each method is decoded
+                and built in turn (that part is all CPU anyway). Abstract and
+                native methods have no bytecode and are left out.
+
+          Returns: List of (MethodInfo, ControlFlowGraph).
+        """
+        class_info = await class_info.load()
+        # Skip abstract (0x400) and native (0x100) methods up front, Bytecodes would only fail.
+        methods = [method for method in class_info.methods_by_id.values() if not (method.modBits or 0) & 0x500]
+        await asyncio.gather(*[self.load_method_bytecode(class_info.typeID, method.methodID) for method in methods])
+        graphs = []
+        for method in methods:
+            if not method.bytecode:
+                continue
+            graphs.append((method, await self.cfg(class_info.typeID, method.methodID)))
+        return graphs
+
+
 
 
     def create_breakpoint(self, **kwargs):
@@ -299,35 +711,110 @@ class Debugger():
             callback: Awaited async callback on breakpoint event.
                       `async def callback(event, composite, args) -> None`
             bytecode_index (int): 16bit aligned offset into method to break at.
+            line (int): Source line to break at instead of method/bytecode_index.
+                        method_name/method_signature then only narrow the search.
             count (int): Number of times to pass breakpoint without breaking.
 
         Returns:
             BreakpointInfo: Breakpoint Object. Run `await obj.set_breakpoint()` to activate!
         """
 
+        Debugger._check_breakpoint_kwargs(kwargs)
+        return BreakpointInfo(self, **kwargs)
+
+
+    @staticmethod
+    def _check_breakpoint_kwargs(kwargs):
+        if kwargs.get('class_signature') and kwargs.get('line') is not None:
+            return
         if 'class_signature' not in kwargs or \
            'method_name' not in kwargs or \
            'method_signature' not in kwargs or \
            not kwargs['class_signature'] or \
            not kwargs['method_name'] or \
            not kwargs['method_signature']:
-            raise RuntimeError("Must have class_signature, method_name, and method_signature set for breakpoint.")
+            raise RuntimeError("Must have class_signature and line, or class_signature, method_name, and method_signature set for breakpoint.")
 
-        return BreakpointInfo(self, **kwargs)
+
+    def create_conditional_breakpoint(self, condition, slots=None, fields=None, this=False, **kwargs):
+        """Create a breakpoint that only stops when condition is true.
+
+        The values named in slots/fields/this are read in one burst on every
+        hit and the thread is resumed right away if condition is false.
+
+        Args:
+            condition: `(values) -> bool`, may be async. values is a dict
+                       of the captured names to python values.
+            slots (dict): {name: (slot, sigbyte)}, e.g. {'x': (2, 'I')}
+            fields: Instance field names of this to capture.
+            this (bool): Capture the this object ID as values['this'].
+            **kwargs: Same as create_breakpoint(), minus count.
+
+        Returns:
+            ConditionalBreakpointInfo: Run `await obj.set_breakpoint()` to activate!
+              Check `obj.stats()` for hit rate and stall times.
+        """
+        Debugger._check_breakpoint_kwargs(kwargs)
+        capture = Capture(slots=slots, fields=fields, this=this)
+        return ConditionalBreakpointInfo(self, condition=condition, capture=capture, **kwargs)
+
+
+    def create_logpoint(self, slots=None, fields=None, this=False, sink=None, fmt=None, **kwargs):
+        """Create a logpoint, a breakpoint that logs values without stopping the app.
+
+        Only the hitting thread is held, just long enough to read the values.
+
+        Args:
+            slots (dict): {name: (slot, sigbyte)}, e.g. {'x': (2, 'I')}
+            fields: Instance field names of this to log.
+            this (bool): Log the this object ID.
+            sink: util.sink.Sink (FileSink, QueueSink, CallbackSink), defaults to print.
+            fmt (str): str.format() template over the captured names.
+            **kwargs: Same as create_breakpoint(), minus callback and count.
+
+        Returns:
+            LogpointInfo: Run `await obj.set_breakpoint()` to activate!
+        """
+        Debugger._check_breakpoint_kwargs(kwargs)
+        capture = Capture(slots=slots, fields=fields, this=this)
+        return LogpointInfo(self, capture=capture, sink=sink, fmt=fmt, **kwargs)
+
+
+    @staticmethod
+    async def queue_class_prepare(event, composite, dbg):
+        """Callback for Debugger.enable_class_prepare_events()
+
+          Startup floods us with these, so they're only queued here and
+          registered in bulk by _flush_class_prepares().
+        """
+        dbg._class_prepare_batch.append((event.typeID, event.refTypeTag, event.signature, event.status))
+        if len(dbg._class_prepare_batch) >= CLASS_PREPARE_BATCH:
+            dbg._flush_class_prepares()
+        elif dbg._class_prepare_timer is None:
+            dbg._class_prepare_timer = asyncio.get_running_loop().call_later(
+                CLASS_PREPARE_DELAY, dbg._flush_class_prepares)
+
+
+    def _flush_class_prepares(self):
+        if self._class_prepare_timer is not None:
+            self._class_prepare_timer.cancel()
+            self._class_prepare_timer = None
+
+        batch, self._class_prepare_batch = self._class_prepare_batch, []
+        for type_id, tag, signature, status in batch:
+            if type_id not in self.classes_by_id:
+                self.classes.add(type_id, tag, signature, status=status)
+                self.symbols.add_class_entry(type_id, signature)
 
 
     @staticmethod
     async def handle_class_prepare(event, composite, dbg):
-        """Callback for Debugger.enable_class_prepare_events()"""
+        """Register a prepared class immediately (e.g. for deferred breakpoints)."""
         if event.typeID not in dbg.classes_by_id:
 
-            # Unloaded until we think we'll deref.
+            # Only a table row until someone asks for the ClassInfo.
             # TODO: Consider registering for generic event too.
-            classInfo = dbg.create_class_info(\
-                event.typeID,
-                typeTag=event.refTypeTag,
-                signature=event.signature)
-            dbg.classes_by_id[event.typeID] = classInfo
+            dbg.classes.add(event.typeID, event.refTypeTag, event.signature, status=event.status)
 
             # classInfo = ClassInfo()
             # classInfo.refTypeTag = event.refTypeTag
@@ -336,7 +823,7 @@ class Debugger():
             # #classInfo.generic = # TODO: Is there an event with class prepare with generic?
             # # TODO: Do we see if it already exists first?
             # dbg.classes_by_id[classInfo.typeID] = classInfo
-            dbg.classes_by_signature[classInfo.signature] = classInfo
+            dbg.symbols.add_class_entry(event.typeID, event.signature)
             # # TODO: Implement way to show first A chars and last B chars in X width.
             # #print(f"CLASS_PREPARE: {classInfo.signature[:60]}")
 
@@ -352,14 +839,8 @@ class Debugger():
         #i = 0
         for clazz in all_classes_reply.classes:
 
-            # Unloaded until we think we'll deref.
-            classInfo = self.create_class_info(\
-                clazz.typeID,
-                typeTag=clazz.refTypeTag,
-                signature=clazz.signature,
-                generic=clazz.genericString)
-
-            self.classes_by_id[clazz.typeID] = classInfo
+            # Only a table row until someone asks for the ClassInfo.
+            self.classes.add(clazz.typeID, clazz.refTypeTag, clazz.signature, clazz.genericString, clazz.status)
 
             # classInfo = ClassInfo()
             # classInfo.refTypeTag = clazz.refTypeTag
@@ -368,8 +849,73 @@ class Debugger():
             # classInfo.generic = clazz.genericString
             # # TODO: Do we see if it already exists first?
             # self.classes_by_id[classInfo.typeID] = classInfo
-            self.classes_by_signature[classInfo.signature] = classInfo        
-        
+
+        self.symbols.add_classes((type_id, signature) for type_id, _, signature, _ in self.classes.rows())
+
+
+    async def find_class(self, signature):
+        """Get the ClassInfo for a JVM signature, asking the VM if needed.
+
+          Note: Classes excluded from CLASS_PREPARE tracking are only in
+                the registry once something has looked them up.
+
+          Returns: ClassInfo() or None if the VM doesn't know the class.
+        """
+        self._flush_class_prepares()
+        if signature in self.classes_by_signature:
+            return self.classes_by_signature[signature]
+
+        classes_reply, error_code = await self.jdwp.VirtualMachine.ClassesBySignature(String(signature))
+        if error_code != Jdwp.Error.NONE:
+            print(f"ERROR: Failed to find class: {Jdwp.Error.string[error_code]}")
+            return None
+
+        for entry in classes_reply.classes:
+            self.classes.add(entry.typeID, entry.refTypeTag, signature, status=entry.status)
+            self.symbols.add_class_entry(entry.typeID, signature)
+
+        return self.classes_by_signature.get(signature)
+
+
+    async def ensure_class(self, type_id):
+        """Make sure a typeID seen on the wire is in the class registry.
+
+          Returns: True if the class is (now) registered.
+        """
+        if type_id in self.classes_by_id:
+            return True
+        self._flush_class_prepares()
+        if type_id in self.classes_by_id:
+            return True
+
+        signature, error_code = await self.jdwp.ReferenceType.Signature(ReferenceTypeID(type_id))
+        if error_code != Jdwp.Error.NONE:
+            print(f"ERROR: Failed to get class signature: {Jdwp.Error.string[error_code]}")
+            return False
+
+        tag = Jdwp.TypeTag.ARRAY if signature.startswith('[') else Jdwp.TypeTag.CLASS
+        self.classes.add(type_id, tag, signature)
+        self.symbols.add_class_entry(type_id, signature)
+        return True
+
+
+    def find(self, query, limit=20, kinds=None):
+        """Search class, method and field names.
+
+          Note: Methods and fields are only indexed once their class has
+                been loaded (e.g. by class_info()). Use
+                `dbg.symbols.prefer('com.example')` to rank a package first.
+
+          Args:
+            query (str): Dotted name, JVM signature, simple name or fragment.
+            limit (int): Maximum results.
+            kinds: Optional iterable of 'class', 'method', 'field'.
+
+          Returns: List of Symbol(), best match first.
+        """
+        self._flush_class_prepares()
+        return self.symbols.search(query, limit, kinds)
+
 
     async def get_class_id(self, object_id):
         # Get the object type
@@ -378,6 +924,8 @@ class Debugger():
             print(f"ERROR: Failed to get object type: {Jdwp.Error.string[error_code]}")
             return None
 
+        if reftype_reply.typeID not in self.classes_by_id:
+            await self.ensure_class(reftype_reply.typeID)
         return reftype_reply.typeID
 
 
@@ -387,6 +935,9 @@ class Debugger():
         if error_code != Jdwp.Error.NONE:
             print(f"ERROR: Failed to get superclass: {Jdwp.Error.string[error_code]}")
             return None
+
+        if super_class_id and super_class_id not in self.classes_by_id:
+            await self.ensure_class(super_class_id)
         return super_class_id
 
 
@@ -412,18 +963,62 @@ class Debugger():
     async def class_info(self, clazz):
         clazz_orig = clazz
         if isinstance(clazz, int):
+            if clazz not in self.classes_by_id:
+                await self.ensure_class(clazz)
             clazz = self.classes_by_id[clazz]
         return await clazz.load()
 
     
-    async def string(self, object_id):
-        value, error_code = await self.jdwp.StringReference.IsCollected(ObjectID(object_id))
+    async def _fetch_string(self, object_id):
+        value, error_code = await self.jdwp.StringReference.Value(ObjectID(object_id))
         if error_code != Jdwp.Error.NONE:
             print(f"ERROR: Failed to get string value: {Jdwp.Error.string[error_code]}")
             return None
+        self.strings_by_id[object_id] = value
         return value
 
 
+    async def strings(self, object_ids):
+        """Fetch the values of many string objects at once.
+
+          Note: Uncached strings are requested concurrently so the
+                StringReference.Value round trips overlap on the connection.
+
+          Args:
+            object_ids: Iterable of string object IDs.
+
+          Returns: Dict of {object_id: str} (None for failed fetches).
+        """
+        object_ids = [object_id for object_id in object_ids if object_id]
+        missing = {object_id for object_id in object_ids if object_id not in self.strings_by_id}
+        if missing:
+            await asyncio.gather(*[self._fetch_string(object_id) for object_id in missing])
+        return {object_id: self.strings_by_id.get(object_id) for object_id in object_ids}
+
+
+    async def string(self, object_id):
+        if object_id in self.strings_by_id:
+            return self.strings_by_id[object_id]
+        return await self._fetch_string(object_id)
+
+
+    async def prefetch_strings(self, tagged_values):
+        """Fetch every string referenced by a list of tagged values in one batch."""
+        await self.strings([tagged.value for tagged in tagged_values
+                            if tagged is not None and tagged.tag == Jdwp.Tag.STRING])
+
+
+    def value_str(self, tagged_value):
+        """Render a tagged value, inlining string contents when cached."""
+        tag, value = tagged_value.tag, tagged_value.value
+        if tag == Jdwp.Tag.STRING and value in self.strings_by_id:
+            text = self.strings_by_id[value]
+            if len(text) > 80:
+                text = text[:77] + '...'
+            return f'String({value} {text!r})'
+        return f'{Jdwp.Tag.type_str(tag)}({value})'
+
+
     async def request_all_threads(self):
         thread_reply, error_code = await self.jdwp.VirtualMachine.AllThreads()
         if error_code != Jdwp.Error.NONE:
@@ -435,11 +1030,28 @@ class Debugger():
             ThreadInfo(self, thread_id)
 
 
+    @property
+    def suspend_epoch(self):
+        return self.state.suspend_epoch
+
+
     async def resume_vm(self):
         """Resume VM"""
+        self.state.suspend_epoch += 1
+        self.state.vm_epoch += 1
         await self.jdwp.VirtualMachine.Resume()
 
 
+    async def resume_thread(self, thread_id):
+        """Resume one thread (e.g. from a SUSPEND_EVENT_THREAD event)."""
+        self.state.suspend_epoch += 1
+        # Note: Only this thread's frames go stale, the others are still suspended.
+        thread = self.threads_by_id.get(thread_id)
+        if thread is not None:
+            thread.loaded_epoch = None
+        await self.jdwp.ThreadReference.Resume(ThreadID(thread_id))
+
+
     def print_summary(self):
         print("")
         print("-- VM Info --")  
@@ -482,7 +1094,7 @@ class Debugger():
             return
 
         # Get the class_info
-        if reftype_reply.typeID not in self.classes_by_id:
+        if not await self.ensure_class(reftype_reply.typeID):
             print(f"ERROR: Class id not found: {reftype_reply.typeID}")
             return
 
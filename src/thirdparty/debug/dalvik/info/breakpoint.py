@@ -7,9 +7,11 @@ for full license text.
 '''
 
 import asyncio
+import inspect
+import time
 from thirdparty.jdwp import (
     Jdwp, Byte, Boolean, Int, String, ReferenceTypeID, Location, 
-    Long, ClassID, ObjectID, FrameID, MethodID)
+    Long, ClassID, ObjectID, FrameID, MethodID, FieldID, ThreadID, StackFrameSet)
 
 import thirdparty.dalvik.dex
 from thirdparty.debug.dalvik.info.state import *
@@ -44,18 +46,15 @@ async def noop_break_event(event, composite, args):
 
 
 async def instruction_str(dbg, event):
-    bytecode = await dbg.load_method_bytecode(
+    # Note: Decoded once per method, see Debugger.disassembly()
+    disassembly = await dbg.disassembly(
         event.location.classID, event.location.methodID)
 
-    try:
-        offset = event.location.index * 2
-        prev_offset = offset
-        ins, offset = thirdparty.dalvik.dex.disassemble(bytecode, offset)
-        ins_bytecode = bytes(bytecode[prev_offset:offset]).hex()
-        ins_bytecode_idx = f'{int(prev_offset/2):04x}'
-        return f'\n{ins_bytecode_idx}: {ins} [bytecode: {ins_bytecode}]'
-    except TypeError:
+    found = disassembly.at(event.location.index) if disassembly else None
+    if not found:
         return f'\nERROR: Bytecode Instruction Not Available'
+    code_index, ins, ins_bytecode = found
+    return f'\n{code_index:04x}: {ins} [bytecode: {ins_bytecode.hex()}]'
 
 
 async def std_break_event(event, composite, args):
@@ -77,6 +76,17 @@ async def std_break_event(event, composite, args):
     # #pdb.set_trace()
 
 
+async def std_stop_event(event, composite, args):
+    """Like std_break_event, but leaves the request set (e.g. ConditionalBreakpointInfo)."""
+    bp_info, = args
+
+    thread = await bp_info.dbg.thread(event.thread)
+    thread.event_args(event, composite, args)
+
+    print(f"Bkpt@ {await bp_info.location_str(event)}")
+    print(await instruction_str(bp_info.dbg, event))
+
+
     
 async def std_step_event(event, composite, args):
     bp, = args
@@ -102,8 +112,11 @@ async def break_location_str(dbg, event):
     class_pkg = '.'.join(class_name.split('.')[:-1])
     class_short_name = class_name.split('.')[-1]
 
+    line = await dbg.line_of(event.location.classID, event.location.methodID, event.location.index)
+    line_str = f"  line {line}" if line is not None else ""
+
     thread_and_pkg = f"Thread-{event.thread}:  {class_pkg}\n"
-    call_str = f"  {class_short_name}.{method_name}(\n"
+    call_str = f"  {class_short_name}.{method_name}({line_str}\n"
     param_str = f"  {method_sig}"
 
     #call_str = f"{jvm_to_java(class_name)}.{method_name}{method_sig}"
@@ -112,7 +125,7 @@ async def break_location_str(dbg, event):
 
 class BreakpointInfo():
 
-    def __init__(self, dbg, class_signature=None, method_name=None, method_signature=None, callback=None, bytecode_index=0, skip_count=0, userdata=None):
+    def __init__(self, dbg, class_signature=None, method_name=None, method_signature=None, callback=None, bytecode_index=0, skip_count=0, userdata=None, line=None):
         self.dbg = dbg
 
         self.callback = callback
@@ -129,10 +142,17 @@ class BreakpointInfo():
         self.method_info = None
         self.bytecode_index = bytecode_index
 
+        # Source line, resolved to method/bytecode_index when armed.
+        self.line = line
+
         # How many times to skip the breakpoint.
         self.skip_count = skip_count + 1
 
         self.userdata = userdata
+        self.reqid = None
+
+        # Subclasses that resume on their own use SuspendPolicy.EVENT_THREAD.
+        self.suspend_policy = Jdwp.SuspendPolicy.ALL
 
         ##### Experimental Things #####
 
@@ -171,25 +191,52 @@ class BreakpointInfo():
 
     async def set_breakpoint(self):
 
-        if self.class_signature not in self.dbg.classes_by_signature:
+        # Note: Framework classes aren't tracked until asked for, find_class() asks the VM.
+        class_info = await self.dbg.find_class(self.class_signature)
+        if class_info is None:
             # This is a deferred breakpoint.
             await self._defer_breakpoint()
         else:
             # Class loaded, lets do it now.
             #await self.dbg.update_class_methods(self.class_info.typeID)
-            self.class_info = await self.dbg.classes_by_signature[self.class_signature].load()
-            if self.method_signature in self.class_info.methods_by_signature:
-                self.method_info = self.class_info.methods_by_signature[self.method_signature]
-                await self._enable_breakpoint()
+            await self._arm(await class_info.load())
         
         return None
 
 
+    async def _arm(self, class_info):
+        """Resolve the method in a loaded class and set the BREAKPOINT request."""
+        self.class_info = class_info
+        if self.line is not None:
+            await self._resolve_line()
+            if self.method_info:
+                await self._enable_breakpoint()
+            return
+
+        if self.method_key not in self.class_info.methods_by_signature:
+            print(f"ERROR: Method not found: {jvm_to_java(self.class_signature)}.{self.method_name}{self.method_signature}")
+            return
+        self.method_info = self.class_info.methods_by_signature[self.method_key]
+        await self._enable_breakpoint()
+
+
+    async def _resolve_line(self):
+        method_key = self.method_key if self.method_name and self.method_signature else None
+        found = await self.dbg.find_line(self.class_info, self.line, method_key)
+        if found is None:
+            print(f"ERROR: No code at line {self.line} in {jvm_to_java(self.class_signature)}")
+            return
+        self.method_info, self.bytecode_index, self.line = found
+        self.method_name = self.method_info.name
+        self.method_signature = self.method_info.signature
+        self.method_key = (self.method_name, self.method_signature)
+
+
     # callback = Debugger.handle_breakpoint_event
     async def _enable_breakpoint(self):
         evt_req = self.dbg.jdwp.EventRequest.SetRequest()
         evt_req.eventKind = Byte(Jdwp.EventKind.BREAKPOINT)
-        evt_req.suspendPolicy = Byte(Jdwp.SuspendPolicy.ALL)
+        evt_req.suspendPolicy = Byte(self.suspend_policy)
 
         loc = Location()
         loc.tag = Byte(Jdwp.TypeTag.CLASS)
@@ -210,58 +257,20 @@ class BreakpointInfo():
             print(f"ERROR: Breakpoint not registered: {Jdwp.Error.string[error_code]}")
             return
         
-        print(f"Setting breakpoint for: {jvm_to_java(self.class_signature)}.{self.method_name}{self.method_signature} (reqid {reqid}).")
-        self.dbg.jdwp.register_event_handler(reqid, self.callback, (self,))
-
-
-    @staticmethod
-    async def _handle_class_prepare(event, composite, args):
-        from thirdparty.debug.dalvik import Debugger
-
-        # Fetch arguments
-        self, = args
+        at_line = f" line {self.line}" if self.line is not None else ""
+        print(f"Setting breakpoint for: {jvm_to_java(self.class_signature)}.{self.method_name}{self.method_signature}{at_line} (reqid {reqid}).")
+        self.reqid = reqid
+        self.dbg.jdwp.register_event_handler(reqid, self._event_handler(), (self,))
 
-        # Make sure the class is registered (in case this beats the general CLASS_PREPARE).
-        await Debugger.handle_class_prepare(event, composite, self.dbg)
 
-        # Stop class prepare events.
-        #print(f"Disable class prepare reqid {event.requestID}")
-        await self.dbg.disable_class_prepare_event(event.requestID)
-
-        # Get the methods for the target class.
-        self.class_info = await self.dbg.class_info(event.typeID)
-        #await self.dbg.update_class_methods(event.typeID)
-
-        #if self.class_signature in self.dbg.classes_by_signature:
-        #    self.class_info = self.dbg.classes_by_signature[self.class_signature]
-        if (self.method_name, self.method_signature) in self.class_info.methods_by_signature:
-            self.method_info = self.class_info.methods_by_signature[(self.method_name, self.method_signature)]
-            await self._enable_breakpoint()
-
-        # Resume from suspend in _defer_breakpoint
-        await self.dbg.resume_vm()
+    def _event_handler(self):
+        # What gets registered for the BREAKPOINT request.
+        return self.callback
 
 
     async def _defer_breakpoint(self):
-        evt_req = self.dbg.jdwp.EventRequest.SetRequest()
-        evt_req.eventKind = Byte(Jdwp.EventKind.CLASS_PREPARE)
-        # We must suspend to give _handle_class_prepare time to add breakpoint event.
-        evt_req.suspendPolicy = Byte(Jdwp.SuspendPolicy.ALL)
-
-        mod = self.dbg.jdwp.EventRequest.SetClassMatchModifier()
-        mod.classPattern = String(jvm_to_java(self.class_signature))
-        evt_req.modifiers.append(mod)
-        mod = self.dbg.jdwp.EventRequest.SetCountModifier()
-        mod.count = Int(1)
-        evt_req.modifiers.append(mod)
-
-        reqid, error_code = await self.dbg.jdwp.EventRequest.Set(evt_req)
-        if error_code != Jdwp.Error.NONE:
-            print(f"ERROR: Deferred breakpoint not registered: {Jdwp.Error.string[error_code]}")
-            return
-
-        print(f"Deferring breakpoint for: {jvm_to_java(self.class_signature)}.{self.method_name}{self.method_signature} (reqid {reqid}).")
-        self.dbg.jdwp.register_event_handler(reqid, BreakpointInfo._handle_class_prepare, (self, ))
+        # Armed by the registry once the class prepares. See info/deferred.py
+        await self.dbg.deferred.add(self)
 
 
     async def location_str(self, event):
@@ -320,4 +329,364 @@ class BreakpointInfo():
 
     async def step_out(self, thread, step_handler=None):
         await self.single_step(thread, Jdwp.StepDepth.OUT, step_handler)
-        await self.dbg.resume_vm()
\ No newline at end of file
+        await self.dbg.resume_vm()
+
+class Capture():
+    """Values a breakpoint reads on every hit, declared up front.
+
+    Everything is fetched with at most three round trips: the top frame,
+    then slots and `this` together, then `this` fields in one GetValues.
+
+    Args:
+        slots: {name: (slot, sigbyte)} frame slots, e.g. {'x': (2, 'I')}.
+        fields: Instance field names of `this`, or {name: field_name}.
+        this (bool): Include the `this` object ID as values['this'].
+    """
+
+    def __init__(self, slots=None, fields=None, this=False):
+        self.slots = dict(slots or {})
+        if isinstance(fields, dict):
+            self.fields = dict(fields)
+        else:
+            self.fields = {name: name for name in (fields or [])}
+        self.this = this
+
+        # [(name, FieldInfo)] once resolve()d against the breakpoint class.
+        self._fields = []
+
+        self._slot_entries = []
+        for slot, sigbyte in self.slots.values():
+            entry = StackFrameSet.GetValuesSlotEntry()
+            entry.slot = Int(slot)
+            entry.sigbyte = Byte(ord(sigbyte[0]))
+            self._slot_entries.append(entry)
+
+
+    def __bool__(self):
+        return bool(self.slots or self.fields or self.this)
+
+
+    def resolve(self, class_info):
+        """Look up the declared field names in a loaded ClassInfo."""
+        by_name = {field.name: field for field in class_info.instance_fields()}
+        self._fields = []
+        for name, field_name in self.fields.items():
+            if field_name not in by_name:
+                print(f"ERROR: Field not found: {class_info.signature}.{field_name}")
+                continue
+            self._fields.append((name, by_name[field_name]))
+
+
+    async def read(self, dbg, thread_id):
+        """Read the declared values in the top frame of a suspended thread.
+
+          Returns: {name: Value} (this is a TaggedObjectID), None on error.
+        """
+        values = {}
+        if not self:
+            return values
+
+        frames_req = dbg.jdwp.ThreadReference.FramesRequest()
+        frames_req.thread = ThreadID(thread_id)
+        frames_req.startFrame = Int(0)
+        frames_req.length = Int(1)
+        frames_reply, error_code = await dbg.jdwp.ThreadReference.Frames(frames_req)
+        if error_code != Jdwp.Error.NONE or not frames_reply.frames:
+            print(f"ERROR: Failed to get top frame: {Jdwp.Error.string[error_code]}")
+            return None
+        frame_id = frames_reply.frames[0].frameID
+
+        # Slots and this go out back to back.
+        pending = []
+        if self.slots:
+            getvalues_req = dbg.jdwp.StackFrame.GetValuesRequest()
+            getvalues_req.thread = ThreadID(thread_id)
+            getvalues_req.frame = FrameID(frame_id)
+            getvalues_req.slots = self._slot_entries
+            pending.append(dbg.jdwp.StackFrame.GetValues(getvalues_req))
+        if self.this or self._fields:
+            this_req = dbg.jdwp.StackFrame.ThisObjectRequest()
+            this_req.thread = ThreadID(thread_id)
+            this_req.frame = FrameID(frame_id)
+            pending.append(dbg.jdwp.StackFrame.ThisObject(this_req))
+        results = await asyncio.gather(*pending)
+
+        if self.slots:
+            getvalues_reply, error_code = results.pop(0)
+            if error_code != Jdwp.Error.NONE:
+                print(f"ERROR: Failed to get values in frame: {Jdwp.Error.string[error_code]}")
+                return None
+            values.update(zip(self.slots, getvalues_reply.values))
+
+        if self.this or self._fields:
+            this_reply, error_code = results.pop(0)
+            if error_code != Jdwp.Error.NONE:
+                print(f"ERROR: Failed to get this information: {Jdwp.Error.string[error_code]}")
+                return None
+            if self.this:
+                values['this'] = this_reply
+
+            # Note: Static methods have no this, the fields are left out.
+            if self._fields and this_reply.objectID:
+                getvalues_req = dbg.jdwp.ObjectReference.GetValuesRequest()
+                getvalues_req.objectid = ObjectID(this_reply.objectID)
+                getvalues_req.fields = [FieldID(field.fieldID) for _, field in self._fields]
+                getvalues_reply, error_code = await dbg.jdwp.ObjectReference.GetValues(getvalues_req)
+                if error_code != Jdwp.Error.NONE:
+                    print(f"ERROR: Failed to get field values: {Jdwp.Error.string[error_code]}")
+                    return None
+                values.update(zip([name for name, _ in self._fields], getvalues_reply.values))
+
+        return values
+
+
+    @staticmethod
+    def plain(values):
+        """{name: Value} -> {name: python value}, objects become their IDs."""
+        return {name: value.objectID if name == 'this' else value.value for name, value in values.items()}
+
+
+class ConditionalBreakpointInfo(BreakpointInfo):
+    """Breakpoint that only stops when condition(values) is true.
+
+    The request suspends just the hitting thread. The declared Capture is
+    read, the condition is evaluated client side, and the thread is resumed
+    right away when it's false. When it's true the whole VM is suspended and
+    the callback runs like a normal breakpoint.
+
+    Note: The request stays set across hits, so skip_count isn't
+          supported (a JDWP Count modifier would make it one-shot). The
+          default callback is std_stop_event, which doesn't disable it
+          either. A callback that calls disable_breakpoint_event() (like
+          std_break_event) makes it one-shot.
+    """
+
+    def __init__(self, dbg, condition=None, capture=None, **kwargs):
+        """
+          Args:
+            condition: `(values) -> bool`, may be async. values is
+                       {name: python value} for everything in capture.
+            capture (Capture): What the condition needs from the frame.
+        """
+        kwargs.pop('skip_count', None)
+        kwargs['callback'] = kwargs.get('callback') or std_stop_event
+        super().__init__(dbg, **kwargs)
+        self.condition = condition
+        self.capture = capture or Capture()
+        self.suspend_policy = Jdwp.SuspendPolicy.EVENT_THREAD
+        self.skip_count = 0
+
+        # {name: Value} from the latest hit, for the callback.
+        self.last_values = None
+
+        self.hits = 0
+        self.stops = 0
+        self.errors = 0
+        self.stall_total = 0.0
+        self.stall_max = 0.0
+        self.armed_at = None
+
+
+    async def _arm(self, class_info):
+        self.capture.resolve(class_info)
+        self.armed_at = time.monotonic()
+        await super()._arm(class_info)
+
+
+    def _event_handler(self):
+        return ConditionalBreakpointInfo._handle_hit
+
+
+    async def _evaluate(self, values):
+        result = self.condition(Capture.plain(values)) if self.condition else True
+        if inspect.isawaitable(result):
+            result = await result
+        return bool(result)
+
+
+    @staticmethod
+    async def _handle_hit(event, composite, args):
+        self, = args
+        started = time.perf_counter()
+        self.hits += 1
+
+        stop = True
+        values = await self.capture.read(self.dbg, event.thread)
+        if values is None:
+            self.errors += 1
+        else:
+            self.last_values = values
+            try:
+                stop = await self._evaluate(values)
+            except Exception as e:
+                # Better to stop than silently run past a broken condition.
+                print(f"ERROR: Breakpoint condition failed: {e}")
+                self.errors += 1
+
+        if not stop:
+            await self.dbg.resume_thread(event.thread)
+            self._record_stall(started)
+            return
+
+        # Stop the world like a SUSPEND_ALL breakpoint would have. The thread
+        # resume just drops the extra suspend count from the event.
+        self.stops += 1
+        await self.dbg.jdwp.VirtualMachine.Suspend()
+        await self.dbg.resume_thread(event.thread)
+        self._record_stall(started)
+        await self.callback(event, composite, (self,))
+
+
+    def _record_stall(self, started):
+        stall = time.perf_counter() - started
+        self.stall_total += stall
+        self.stall_max = max(self.stall_max, stall)
+
+
+    def stats(self):
+        """Hit counters and how long the hitting thread was held per hit.
+
+          Returns: dict with hits, stops, errors, stop_rate, hits_per_sec,
+                   stall_avg_ms and stall_max_ms.
+        """
+        elapsed = time.monotonic() - self.armed_at if self.armed_at else 0
+        return {
+            'hits': self.hits,
+            'stops': self.stops,
+            'errors': self.errors,
+            'stop_rate': self.stops / self.hits if self.hits else 0.0,
+            'hits_per_sec': self.hits / elapsed if elapsed else 0.0,
+            'stall_avg_ms': 1000 * self.stall_total / self.hits if self.hits else 0.0,
+            'stall_max_ms': 1000 * self.stall_max,
+        }
+
+
+    def __repr__(self):
+        try:
+            stats = self.stats()
+            return (f'ConditionalBreakpointInfo({self.class_signature}->{self.method_name}{self.method_signature}@{self.bytecode_index}: '
+                    f'{stats["hits"]} hits, {stats["stops"]} stops ({100 * stats["stop_rate"]:.1f}%), '
+                    f'{stats["hits_per_sec"]:.1f} hits/s, stall avg {stats["stall_avg_ms"]:.2f}ms max {stats["stall_max_ms"]:.2f}ms)')
+        except Exception as e:
+            return f"ConditionalBreakpointInfo(ERROR: {e})"
+
+
+class LogRecord():
+    """One logpoint hit. Formatting (and string lookups) happen in the sink."""
+
+    __slots__ = ('logpoint', 'time', 'thread', 'values')
+
+    def __init__(self, logpoint, thread, values):
+        self.logpoint = logpoint
+        self.time = time.time()
+        self.thread = thread
+        self.values = values
+
+
+    def _render(self, dbg, tagged):
+        if tagged.tag == Jdwp.Tag.STRING and tagged.value in dbg.strings_by_id:
+            return dbg.strings_by_id[tagged.value]
+        if tagged.tag in Jdwp.Tag.objs:
+            return dbg.value_str(tagged)
+        return tagged.value
+
+
+    async def format(self):
+        dbg = self.logpoint.dbg
+        # Note: The thread is already running, a string can be collected before
+        #       we get to it. It's then shown by ID.
+        await dbg.prefetch_strings([value for name, value in self.values.items() if name != 'this'])
+
+        rendered = {name: self._render(dbg, value) for name, value in self.values.items() if name != 'this'}
+        if 'this' in self.values:
+            rendered['this'] = self.values['this'].objectID
+
+        stamp = time.strftime('%H:%M:%S', time.localtime(self.time)) + f'.{int(self.time * 1000) % 1000:03d}'
+        if self.logpoint.fmt:
+            return f'{stamp} {self.logpoint.fmt.format(**rendered)}'
+        pairs = ' '.join(f'{name}={value}' for name, value in rendered.items())
+        return f'{stamp} Thread-{self.thread} {self.logpoint.label()} {pairs}'
+
+
+class LogpointInfo(BreakpointInfo):
+    """Non-suspending breakpoint that logs captured values.
+
+    The request suspends just the hitting thread. The declared Capture is
+    read, the thread is resumed and a LogRecord goes to the sink. Nothing
+    is formatted until the sink gets to it, so a hit costs the capture round
+    trips plus the ThreadReference.Resume round trip (the thread runs again
+    as soon as the VM sees the command, the reply only holds up this
+    handler, and is counted in stall_*).
+    """
+
+    def __init__(self, dbg, capture=None, sink=None, fmt=None, **kwargs):
+        """
+          Args:
+            capture (Capture): Values to log.
+            sink: util.sink.Sink, defaults to printing.
+            fmt (str): str.format() template over the captured names,
+                       e.g. 'x={x} name={name}'. Default logs name=value pairs.
+        """
+        from thirdparty.debug.dalvik.util.sink import CallbackSink
+
+        kwargs.pop('skip_count', None)
+        super().__init__(dbg, **kwargs)
+        self.capture = capture or Capture()
+        self.sink = sink or CallbackSink(print)
+        self.fmt = fmt
+        self.suspend_policy = Jdwp.SuspendPolicy.EVENT_THREAD
+        self.skip_count = 0
+
+        self.hits = 0
+        self.errors = 0
+        self.stall_total = 0.0
+        self.stall_max = 0.0
+
+
+    def label(self):
+        return f'{jvm_to_java(self.class_signature)}.{self.method_name}@{self.bytecode_index}'
+
+
+    async def _arm(self, class_info):
+        self.capture.resolve(class_info)
+        await super()._arm(class_info)
+
+
+    def _event_handler(self):
+        return LogpointInfo._handle_hit
+
+
+    @staticmethod
+    async def _handle_hit(event, composite, args):
+        self, = args
+        started = time.perf_counter()
+        self.hits += 1
+
+        values = await self.capture.read(self.dbg, event.thread)
+        await self.dbg.resume_thread(event.thread)
+
+        stall = time.perf_counter() - started
+        self.stall_total += stall
+        self.stall_max = max(self.stall_max, stall)
+
+        if values is None:
+            self.errors += 1
+            return
+        self.sink.emit(LogRecord(self, event.thread, values))
+
+
+    async def clear(self):
+        """Remove the BREAKPOINT request and flush the sink."""
+        if self.reqid is not None:
+            await self.dbg.disable_breakpoint_event(self.reqid)
+            self.reqid = None
+        await self.sink.flush()
+
+
+    def __repr__(self):
+        try:
+            stall_avg = 1000 * self.stall_total / self.hits if self.hits else 0.0
+            return (f'LogpointInfo({self.label()}: {self.hits} hits, {self.errors} errors, '
+                    f'stall avg {stall_avg:.2f}ms max {1000 * self.stall_max:.2f}ms, {self.sink})')
+        except Exception as e:
+            return f"LogpointInfo(ERROR: {e})"
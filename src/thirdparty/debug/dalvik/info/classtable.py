@@ -0,0 +1,209 @@
+'''
+Copyright (c) 2025 Vincent Agriesti
+
+This file is part of the thirdparty JDWP project.
+Licensed under the MIT License. See the LICENSE file in the project root
+for full license text.
+'''
+
+import sys
+from array import array
+from collections.abc import MutableMapping
+
+'''
+Columnar class registry.
+
+A big app (framework + app + libraries) has 60k+ classes and we learn about
+all of them at attach time, but only ever look inside a few hundred. Keeping
+a full ClassInfo (a dozen attributes and six dicts) for each one costs well
+over a kilobyte per class before anything is inspected.
+
+ClassTable keeps one row per class spread over flat columns:
+
+    type_ids    array('Q')   typeID
+    tags        bytearray    refTypeTag
+    status      bytearray    class status bits
+    signatures  list         interned signature (None once removed)
+    generics    dict         row -> generic signature, only when non-empty
+
+plus typeID -> row and signature -> row hash indexes. A ClassInfo is only
+built (and then kept) the first time something asks for it, so loaded
+methods/fields stick around exactly as before.
+
+classes_by_id and classes_by_signature are mapping views over the table, so
+existing `x in dbg.classes_by_id` / `dbg.classes_by_signature[sig]` code keeps
+working. Iterating their values() materializes every ClassInfo though, use
+rows() or signature_of() in bulk paths.
+'''
+
+
+class ClassTable():
+
+    def __init__(self):
+        # Set by the Debugger, needed to materialize ClassInfo objects.
+        self.dbg = None
+
+        self.type_ids = array('Q')
+        self.tags = bytearray()
+        self.status = bytearray()
+        self.signatures = []
+        self.generics = {}
+
+        self.row_by_id = {}
+        self.row_by_signature = {}
+
+        # row -> ClassInfo, only for classes that have been accessed.
+        self._infos = {}
+
+        self.by_id = ClassesByIdView(self)
+        self.by_signature = ClassesBySignatureView(self)
+
+
+    def __len__(self):
+        return len(self.row_by_id)
+
+
+    def add(self, type_id, tag=0, signature=None, generic=None, status=0):
+        """Add (or update) a class row. Returns the row."""
+        type_id = int(type_id)
+        if signature is not None:
+            signature = sys.intern(str(signature))
+
+        row = self.row_by_id.get(type_id)
+        if row is None:
+            row = len(self.type_ids)
+            self.type_ids.append(type_id)
+            self.tags.append(tag or 0)
+            self.status.append((status or 0) & 0xff)
+            self.signatures.append(signature)
+            self.row_by_id[type_id] = row
+        else:
+            if tag:
+                self.tags[row] = tag
+            if status:
+                self.status[row] = status & 0xff
+            if signature is not None:
+                self.signatures[row] = signature
+
+        if generic:
+            self.generics[row] = str(generic)
+        if signature is not None:
+            self.row_by_signature[signature] = row
+        return row
+
+
+    def attach(self, class_info):
+        """Register an already built ClassInfo, adding its row if needed."""
+        row = self.add(class_info.typeID, class_info.refTypeTag, class_info.signature, class_info.generic)
+        self._infos[row] = class_info
+        return row
+
+
+    def remove(self, type_id):
+        """Remove a class. Returns its ClassInfo (materialized), or None."""
+        row = self.row_by_id.get(int(type_id))
+        if row is None:
+            return None
+        class_info = self.info(row)
+
+        del self.row_by_id[int(type_id)]
+        signature = self.signatures[row]
+        # Note: Another loader may have registered the same signature since.
+        if self.row_by_signature.get(signature) == row:
+            del self.row_by_signature[signature]
+        self.signatures[row] = None
+        self.generics.pop(row, None)
+        self._infos.pop(row, None)
+        return class_info
+
+
+    def info(self, row):
+        class_info = self._infos.get(row)
+        if class_info is None:
+            # Avoid a circular import, state.py imports this module.
+            from thirdparty.debug.dalvik.info.state import ClassInfo
+            class_info = ClassInfo(self.dbg, self.type_ids[row])
+            class_info.refTypeTag = self.tags[row]
+            class_info.signature = self.signatures[row]
+            class_info.generic = self.generics.get(row)
+            self._infos[row] = class_info
+        return class_info
+
+
+    def signature_of(self, type_id):
+        """Signature for a typeID without materializing a ClassInfo."""
+        row = self.row_by_id.get(type_id)
+        return None if row is None else self.signatures[row]
+
+
+    def rows(self):
+        """Yield (type_id, tag, signature, status) for every live class."""
+        type_ids, tags, signatures, status = self.type_ids, self.tags, self.signatures, self.status
+        for row in self.row_by_id.values():
+            yield type_ids[row], tags[row], signatures[row], status[row]
+
+
+    def materialized(self):
+        return len(self._infos)
+
+
+    def __repr__(self):
+        return f'ClassTable({len(self)} classes, {len(self._infos)} materialized)'
+
+
+class ClassesByIdView(MutableMapping):
+    """typeID -> ClassInfo view of a ClassTable."""
+
+    def __init__(self, table):
+        self.table = table
+
+    def __getitem__(self, type_id):
+        return self.table.info(self.table.row_by_id[type_id])
+
+    def __setitem__(self, type_id, class_info):
+        self.table.attach(class_info)
+
+    def __delitem__(self, type_id):
+        if self.table.remove(type_id) is None:
+            raise KeyError(type_id)
+
+    def __contains__(self, type_id):
+        return type_id in self.table.row_by_id
+
+    def __iter__(self):
+        return iter(list(self.table.row_by_id))
+
+    def __len__(self):
+        return len(self.table.row_by_id)
+
+    def __repr__(self):
+        return f'ClassesByIdView({len(self)} classes)'
+
+
+class ClassesBySignatureView(MutableMapping):
+    """signature -> ClassInfo view of a ClassTable."""
+
+    def __init__(self, table):
+        self.table = table
+
+    def __getitem__(self, signature):
+        return self.table.info(self.table.row_by_signature[signature])
+
+    def __setitem__(self, signature, class_info):
+        self.table.attach(class_info)
+
+    def __delitem__(self, signature):
+        row = self.table.row_by_signature[signature]
+        self.table.remove(self.table.type_ids[row])
+
+    def __contains__(self, signature):
+        return signature in self.table.row_by_signature
+
+    def __iter__(self):
+        return iter(list(self.table.row_by_signature))
+
+    def __len__(self):
+        return len(self.table.row_by_signature)
+
+    def __repr__(self):
+        return f'ClassesBySignatureView({len(self)} classes)'
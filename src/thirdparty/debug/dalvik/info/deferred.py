@@ -0,0 +1,178 @@
+'''
+Copyright (c) 2025 Vincent Agriesti
+
+This file is part of the thirdparty JDWP project.
+Licensed under the MIT License. See the LICENSE file in the project root
+for full license text.
+'''
+
+import asyncio
+from thirdparty.jdwp import Jdwp, Byte, String
+
+'''
+Deferred breakpoints, i.e. breakpoints on classes that aren't loaded yet.
+
+Each deferred breakpoint used to set its own CLASS_PREPARE request with a
+SUSPEND_ALL policy. The VM checks every CLASS_PREPARE request on every class
+load, so a few hundred deferred breakpoints made every class load slow and
+each hit stopped the whole app.
+
+DeferredBreakpointRegistry merges pending breakpoints by class pattern:
+
+  - One CLASS_PREPARE request per class, no matter how many breakpoints are
+    waiting on it.
+  - Once a package has more than `merge_threshold` pending classes, they're
+    watched with a single 'pkg.*' request instead. That fires for every class
+    in the package, but those events are cheap compared to the requests.
+  - The requests use SUSPEND_EVENT_THREAD. The class can't run any code before
+    the preparing thread gets past the prepare, so stopping just that thread
+    is enough to arm the breakpoints in time.
+
+When a class prepares, its methods are fetched once and every breakpoint
+waiting on it is armed in one pipelined burst, then the thread is resumed.
+A request is cleared as soon as nothing is waiting on it anymore.
+'''
+
+
+def class_pattern(class_signature):
+    """Lcom/example/Foo; -> com.example.Foo (JDWP ClassMatch syntax)"""
+    return class_signature[1:-1].replace('/', '.')
+
+
+def package_pattern(class_signature):
+    """Lcom/example/Foo; -> com.example.* (None for the default package)"""
+    name = class_pattern(class_signature)
+    if '.' not in name:
+        return None
+    return name.rsplit('.', 1)[0] + '.*'
+
+
+class DeferredBreakpointRegistry():
+
+    def __init__(self, dbg, merge_threshold: int = 8):
+        self.dbg = dbg
+        self.merge_threshold = merge_threshold
+
+        # class signature -> [BreakpointInfo]
+        self.pending = {}
+
+        # pattern -> CLASS_PREPARE request id
+        self.reqid_by_pattern = {}
+
+        # Serializes request changes against the prepare handler.
+        self._lock = asyncio.Lock()
+
+
+    def __len__(self):
+        return sum(len(bps) for bps in self.pending.values())
+
+
+    def _patterns_for(self, class_signature):
+        # The package pattern wins once it exists.
+        package = package_pattern(class_signature)
+        if package in self.reqid_by_pattern:
+            return package
+        return class_pattern(class_signature)
+
+
+    def _waiting_on(self, pattern):
+        if pattern.endswith('.*'):
+            return any(package_pattern(signature) == pattern for signature in self.pending)
+        return any(class_pattern(signature) == pattern for signature in self.pending)
+
+
+    async def add(self, bp):
+        """Wait for bp.class_signature to prepare, then arm bp."""
+        async with self._lock:
+            signature = bp.class_signature
+            self.pending.setdefault(signature, []).append(bp)
+
+            package = package_pattern(signature)
+            if package and package not in self.reqid_by_pattern:
+                in_package = [sig for sig in self.pending if package_pattern(sig) == package]
+                if len(in_package) > self.merge_threshold:
+                    if await self._watch(package):
+                        # Note: The per class requests are redundant now.
+                        for sig in in_package:
+                            await self._unwatch(class_pattern(sig))
+                        return
+
+            await self._watch(self._patterns_for(signature))
+
+
+    async def remove(self, bp):
+        """Forget a breakpoint that hasn't been armed yet."""
+        async with self._lock:
+            bps = self.pending.get(bp.class_signature, [])
+            if bp in bps:
+                bps.remove(bp)
+            if not bps:
+                self.pending.pop(bp.class_signature, None)
+            await self._unwatch_idle()
+
+
+    async def _watch(self, pattern):
+        if pattern in self.reqid_by_pattern:
+            return self.reqid_by_pattern[pattern]
+
+        evt_req = self.dbg.jdwp.EventRequest.SetRequest()
+        evt_req.eventKind = Byte(Jdwp.EventKind.CLASS_PREPARE)
+        evt_req.suspendPolicy = Byte(Jdwp.SuspendPolicy.EVENT_THREAD)
+        mod = self.dbg.jdwp.EventRequest.SetClassMatchModifier()
+        mod.classPattern = String(pattern)
+        evt_req.modifiers.append(mod)
+
+        reqid, error_code = await self.dbg.jdwp.EventRequest.Set(evt_req)
+        if error_code != Jdwp.Error.NONE:
+            print(f"ERROR: Deferred breakpoint not registered: {Jdwp.Error.string[error_code]}")
+            return None
+
+        print(f"Deferring breakpoints for: {pattern} (reqid {reqid}).")
+        self.reqid_by_pattern[pattern] = reqid
+        self.dbg.jdwp.register_event_handler(reqid, DeferredBreakpointRegistry._handle_class_prepare, (self,))
+        return reqid
+
+
+    async def _unwatch(self, pattern):
+        reqid = self.reqid_by_pattern.pop(pattern, None)
+        if reqid is not None:
+            await self.dbg.disable_class_prepare_event(reqid)
+
+
+    async def _unwatch_idle(self):
+        for pattern in [pattern for pattern in self.reqid_by_pattern if not self._waiting_on(pattern)]:
+            await self._unwatch(pattern)
+
+
+    @staticmethod
+    async def _handle_class_prepare(event, composite, args):
+        from thirdparty.debug.dalvik import Debugger
+
+        self, = args
+        try:
+            async with self._lock:
+                bps = self.pending.pop(event.signature, None)
+                if not bps:
+                    # Another class in a watched package.
+                    return
+
+                # Make sure the class is registered (in case this beats the general CLASS_PREPARE).
+                await Debugger.handle_class_prepare(event, composite, self.dbg)
+                class_info = await self.dbg.class_info(event.typeID)
+
+                # One burst of pipelined EventRequest.Set for everything waiting on this class.
+                await asyncio.gather(*[bp._arm(class_info) for bp in bps])
+                await self._unwatch_idle()
+        finally:
+            # Resume from the SUSPEND_EVENT_THREAD in _watch.
+            await self.dbg.resume_thread(event.thread)
+
+
+    def __repr__(self):
+        try:
+            summary = [f'DeferredBreakpointRegistry({len(self)} breakpoints, {len(self.reqid_by_pattern)} requests)']
+            for pattern, reqid in self.reqid_by_pattern.items():
+                summary.append(f'  reqid {reqid}: {pattern}')
+            return '\n'.join(summary)
+        except Exception as e:
+            return f"DeferredBreakpointRegistry(ERROR: {e})"
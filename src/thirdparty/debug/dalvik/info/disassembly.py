@@ -0,0 +1,114 @@
+'''
+Copyright (c) 2025 Vincent Agriesti
+
+This file is part of the thirdparty JDWP project.
+Licensed under the MIT License. See the LICENSE file in the project root
+for full license text.
+'''
+
+from array import array
+from bisect import bisect_right
+from thirdparty.dalvik.dex.decoder import decode_all, render
+
+'''
+A whole method disassembled once.
+
+instruction_str() used to disassemble the current instruction on every break
+and step. A DisassemblyInfo decodes the method once (see dex/decoder.py) and
+keeps an offset index (code unit offsets, ascending) next to the decoded
+instructions, so the instruction at any code index is a bisect away. Text is
+rendered per instruction the first time it's shown, with symbolic operands
+once the method's dex file is known (see Debugger.use_dex_files()).
+
+The bytecode, the offsets and whatever text has been rendered pack into the
+metadata cache (see util/cache.py), so a method seen in an earlier session
+needs no Method.Bytecodes. Packing never renders, the rest of the text is
+rendered on demand like for a fresh method.
+'''
+
+
+class DisassemblyInfo():
+
+    __slots__ = ('bytecode', 'offsets', 'dex', '_instructions', '_texts')
+
+    def __init__(self, bytecode, offsets=None, texts=None, dex=None):
+        self.bytecode = bytes(bytecode)
+        # dexfile.DexFile for symbolic operands, see symbolize().
+        self.dex = dex
+        self._instructions = None
+        if offsets is None:
+            self._instructions = decode_all(self.bytecode)
+            offsets = array('I', [ins.offset for ins in self._instructions])
+        self.offsets = offsets
+        self._texts = texts if texts is not None else [None] * len(offsets)
+
+
+    @property
+    def instructions(self):
+        """List of decoder.Instruction()"""
+        if self._instructions is None:
+            self._instructions = decode_all(self.bytecode)
+        return self._instructions
+
+
+    def text(self, idx):
+        """Rendered text of the instruction at position idx."""
+        text = self._texts[idx]
+        if text is None:
+            text = self._texts[idx] = render(self.instructions[idx], self.dex)
+        return text
+
+
+    def symbolize(self, dex):
+        """Render operands against the method's dex file from now on."""
+        self.dex = dex
+        self._texts = [None] * len(self.offsets)
+
+
+    def __len__(self):
+        return len(self.offsets)
+
+
+    def index_of(self, code_index):
+        """Position of the instruction covering a code index, -1 if none."""
+        return bisect_right(self.offsets, code_index) - 1
+
+
+    def at(self, code_index):
+        """Returns: (code_index, text, raw bytes) of the covering instruction, or None."""
+        idx = self.index_of(code_index)
+        if idx < 0:
+            return None
+        start = self.offsets[idx]
+        end = self.offsets[idx + 1] if idx + 1 < len(self.offsets) else len(self.bytecode) // 2
+        return start, self.text(idx), self.bytecode[start * 2:end * 2]
+
+
+    def listing(self, first=0, count=None):
+        """Yield (code_index, text) from instruction position first on."""
+        last = len(self.offsets) if count is None else min(len(self.offsets), first + count)
+        for idx in range(first, last):
+            yield self.offsets[idx], self.text(idx)
+
+
+    def to_bytes(self):
+        """(offsets blob, text) for the metadata cache.
+
+          Note: Instructions not rendered yet are packed as empty lines.
+        """
+        return self.offsets.tobytes(), '\n'.join(text or '' for text in self._texts)
+
+
+    @staticmethod
+    def from_bytes(bytecode, offsets_blob, text):
+        offsets = array('I')
+        offsets.frombytes(offsets_blob)
+        texts = [line or None for line in text.split('\n')] if text else None
+        return DisassemblyInfo(bytecode, offsets, texts)
+
+
+    def __repr__(self):
+        try:
+            return '\n'.join(f'{code_index:04x}: {text}' for code_index, text in self.listing())
+        except Exception as e:
+            return f"DisassemblyInfo(ERROR: {e})"
@@ -0,0 +1,229 @@
+'''
+Copyright (c) 2025 Vincent Agriesti
+
+This file is part of the thirdparty JDWP project.
+Licensed under the MIT License. See the LICENSE file in the project root
+for full license text.
+'''
+
+import asyncio
+import weakref
+from collections import OrderedDict
+from thirdparty.jdwp import Jdwp, Int, ObjectID
+from thirdparty.debug.dalvik.info.object import ObjectInfo
+
+'''
+Object ID lifecycle.
+
+Every object ID the VM hands us stays in its ID table until we dispose of it,
+and the object behind an ID can be collected at any time unless collection is
+disabled for it. Over a long session that means objects_by_id (and the VM side
+table) only ever grows, while the IDs in it quietly go stale.
+
+ObjectHandles keeps three tiers:
+
+  - pinned: Objects the user is actively holding. DisableCollection keeps
+    them (and their IDs) alive until unpin().
+  - recent: A bounded LRU of strong references to unpinned ObjectInfos so
+    that recently used objects don't get rebuilt on every access.
+  - objects_by_id: A WeakValueDictionary. Once an ObjectInfo falls out of
+    the LRU and nothing else holds it, it's forgotten and its ID is queued
+    for disposal.
+
+Disposals are sent as one VirtualMachine.DisposeObjects request per batch,
+with a refCnt of 1. We don't see every reply the VM counts an ID in, and
+get() is also called for plain lookups (object_info(), pin()), so there's no
+count of ours that matches the VM's. An undercount only means the VM keeps
+the entry a little longer, an overcount would pull the ID out from under us,
+so we err low.
+
+sweep() checks every known ID with pipelined ObjectReference.IsCollected
+requests and drops collected objects (and their cached strings) in bulk.
+
+Only ObjectInfos hold on to an ID. Raw IDs kept elsewhere (SlotInfo values,
+SnapshotInfo.objects, ...) aren't tracked, the ID can be disposed of once
+its ObjectInfo is released or sweep() finds it collected. Treat raw IDs as
+valid until the next sweep() (or flush()), and pin() what has to outlive it.
+'''
+
+
+class ObjectHandles():
+
+    def __init__(self, dbg, capacity: int = 1024, dispose_batch: int = 256):
+        self.dbg = dbg
+        self.capacity = capacity
+        self.dispose_batch = dispose_batch
+
+        # object_id -> ObjectInfo, strong.
+        self.pinned = {}
+
+        # object_id -> ObjectInfo, strong, most recently used last.
+        self.recent = OrderedDict()
+
+        # IDs we've been handed and haven't disposed of yet.
+        self.known = set()
+
+        # object_id -> refCnt, waiting for flush().
+        self.pending_dispose = {}
+
+        self._flush_task = None
+        self._sweep_task = None
+
+
+    def get(self, object_id):
+        """Get (or create) the ObjectInfo for an ID and mark it recently used."""
+        self.known.add(object_id)
+        # Seen again before the dispose went out, keep it.
+        self.pending_dispose.pop(object_id, None)
+
+        obj = self.dbg.objects_by_id.get(object_id)
+        if obj is None:
+            obj = ObjectInfo(self.dbg, object_id)
+            weakref.finalize(obj, self._released, object_id)
+
+        if object_id not in self.pinned:
+            self._touch(object_id, obj)
+        return obj
+
+
+    def _touch(self, object_id, obj):
+        self.recent[object_id] = obj
+        self.recent.move_to_end(object_id)
+        while len(self.recent) > self.capacity:
+            # Dropping the strong reference, the finalizer queues the
+            # dispose once nothing else is holding the ObjectInfo.
+            self.recent.popitem(last=False)
+
+
+    def _released(self, object_id):
+        # Called by weakref.finalize, so this can't await anything.
+        if object_id in self.pinned or object_id in self.dbg.objects_by_id:
+            return
+        self._queue_dispose(object_id)
+
+
+    def _queue_dispose(self, object_id):
+        if object_id not in self.known:
+            return
+        self.known.discard(object_id)
+        # Note: Always 1, see the module docstring.
+        self.pending_dispose[object_id] = 1
+        self.dbg.strings_by_id.pop(object_id, None)
+
+        if len(self.pending_dispose) >= self.dispose_batch and not self._flush_task:
+            try:
+                self._flush_task = asyncio.get_running_loop().create_task(self.flush())
+            except RuntimeError:
+                # No loop (e.g. finalized at exit), next flush() picks it up.
+                pass
+
+
+    async def flush(self):
+        """Send every queued dispose in one DisposeObjects request."""
+        try:
+            if not self.pending_dispose:
+                return 0
+
+            pending, self.pending_dispose = self.pending_dispose, {}
+            dispose_req = self.dbg.jdwp.VirtualMachine.DisposeObjectsRequest()
+            entries = []
+            for object_id, refcnt in pending.items():
+                entry = self.dbg.jdwp.VirtualMachine.DisposeObjectsEntry()
+                entry.objectID = ObjectID(object_id)
+                entry.refCnt = Int(refcnt)
+                entries.append(entry)
+            dispose_req.requests = entries
+            await self.dbg.jdwp.VirtualMachine.DisposeObjects(dispose_req)
+            return len(entries)
+        finally:
+            self._flush_task = None
+
+
+    async def pin(self, obj):
+        """Keep an object alive (DisableCollection) until unpin()."""
+        if isinstance(obj, ObjectInfo):
+            obj = self.get(obj.object_id)
+        else:
+            obj = self.get(obj)
+
+        if obj.object_id not in self.pinned:
+            await self.dbg.jdwp.ObjectReference.DisableCollection(ObjectID(obj.object_id))
+            self.pinned[obj.object_id] = obj
+            self.recent.pop(obj.object_id, None)
+        return obj
+
+
+    async def unpin(self, obj):
+        """Let an object be collected again. It goes back to the LRU."""
+        object_id = obj.object_id if isinstance(obj, ObjectInfo) else obj
+        obj = self.pinned.pop(object_id, None)
+        if obj is None:
+            return None
+
+        await self.dbg.jdwp.ObjectReference.EnableCollection(ObjectID(object_id))
+        self._touch(object_id, obj)
+        return obj
+
+
+    def _forget(self, object_id):
+        self.pinned.pop(object_id, None)
+        self.recent.pop(object_id, None)
+        self.dbg.objects_by_id.pop(object_id, None)
+        self.dbg.strings_by_id.pop(object_id, None)
+
+
+    async def _is_collected(self, object_id, semaphore):
+        async with semaphore:
+            collected, error_code = await self.dbg.jdwp.ObjectReference.IsCollected(ObjectID(object_id))
+        # Note: INVALID_OBJECT means the ID is already gone as well.
+        return error_code != Jdwp.Error.NONE or bool(collected)
+
+
+    async def sweep(self, concurrency: int = 64):
+        """Drop every known object (and cached string) that has been collected.
+
+          Returns: Number of object IDs dropped.
+        """
+        object_ids = list({*self.dbg.objects_by_id.keys(), *self.pinned.keys(), *self.dbg.strings_by_id.keys()})
+
+        semaphore = asyncio.Semaphore(concurrency)
+        results = await asyncio.gather(*[self._is_collected(object_id, semaphore) for object_id in object_ids])
+
+        dropped = 0
+        for object_id, collected in zip(object_ids, results):
+            if not collected:
+                continue
+            self._forget(object_id)
+            # The VM keeps the ID table entry of a collected object until disposed.
+            self._queue_dispose(object_id)
+            dropped += 1
+
+        await self.flush()
+        return dropped
+
+
+    async def _sweep_forever(self, interval):
+        try:
+            while True:
+                await asyncio.sleep(interval)
+                await self.sweep()
+        except asyncio.CancelledError:
+            pass
+
+
+    def start(self, interval: float = 30.0):
+        """Run sweep() every interval seconds in the background."""
+        self.stop()
+        self._sweep_task = asyncio.create_task(self._sweep_forever(interval))
+        return self
+
+
+    def stop(self):
+        if self._sweep_task:
+            self._sweep_task.cancel()
+            self._sweep_task = None
+
+
+    def __repr__(self):
+        return (f'ObjectHandles({len(self.pinned)} pinned, {len(self.recent)}/{self.capacity} recent, '
+                f'{len(self.dbg.objects_by_id)} live, {len(self.pending_dispose)} pending dispose)')
@@ -0,0 +1,215 @@
+'''
+Copyright (c) 2025 Vincent Agriesti
+
+This file is part of the thirdparty JDWP project.
+Licensed under the MIT License. See the LICENSE file in the project root
+for full license text.
+'''
+
+import asyncio
+import time
+from thirdparty.jdwp import Jdwp, ReferenceTypeID
+from thirdparty.debug.dalvik.info.state import *
+
+'''
+Class histogram of the heap built from VirtualMachine.InstanceCounts.
+
+InstanceCounts takes a list of reference types, so rather than one request
+per class we split every known class into large batches and keep a few of
+those batches in flight at once. Each sample() is kept so that consecutive
+samples can be compared to find the classes whose instance count keeps going
+up (i.e. leak candidates) without pulling an hprof.
+
+One bad ID (e.g. a class unloaded since we listed it) fails the whole
+request, so a batch failing with INVALID_CLASS/INVALID_OBJECT is split in
+half and retried until the bad IDs are on their own. Those are left out of
+the sample and listed in failed. Any other error (NOT_IMPLEMENTED, VM_DEAD,
+...) isn't about the IDs, so the sample stops there and nothing is kept.
+'''
+
+
+class HeapHistogramInfo():
+
+    def __init__(self, dbg, batch_size: int = 2000, concurrency: int = 4, history: int = 32, n: int = 20):
+        self.dbg = dbg
+        self.batch_size = batch_size
+        self.concurrency = concurrency
+
+        # Rows shown by repr().
+        self.n = n
+
+        # How many samples to keep around.
+        self.history = history
+
+        # List of (timestamp, {class_id: count})
+        self.samples = []
+
+        # class_id -> error name, classes left out of the latest sample.
+        self.failed = {}
+
+        self._track_task = None
+
+
+    # Errors that are about one of the IDs, not the request.
+    PER_CLASS_ERRORS = (Jdwp.Error.INVALID_CLASS, Jdwp.Error.INVALID_OBJECT)
+
+
+    async def _count_batch(self, class_ids, semaphore, failed, fatal):
+        async with semaphore:
+            if fatal:
+                # Another batch already hit a VM wide error.
+                return {}
+            counts_req = self.dbg.jdwp.VirtualMachine.InstanceCountsRequest()
+            counts_req.refTypes = [ReferenceTypeID(class_id) for class_id in class_ids]
+            counts_reply, error_code = await self.dbg.jdwp.VirtualMachine.InstanceCounts(counts_req)
+        if error_code == Jdwp.Error.NONE:
+            return dict(zip(class_ids, counts_reply.instanceCounts))
+
+        if error_code not in HeapHistogramInfo.PER_CLASS_ERRORS:
+            fatal.append(error_code)
+            return {}
+        if len(class_ids) == 1:
+            failed[class_ids[0]] = Jdwp.Error.string.get(error_code, str(error_code))
+            return {}
+        # Note: Outside the semaphore, the halves take their own turns.
+        half = len(class_ids) // 2
+        counts = {}
+        for result in await asyncio.gather(
+                self._count_batch(class_ids[:half], semaphore, failed, fatal),
+                self._count_batch(class_ids[half:], semaphore, failed, fatal)):
+            counts.update(result)
+        return counts
+
+
+    async def sample(self):
+        """Count instances of every known class.
+
+          Returns: {class_id: count} or None if InstanceCounts failed outright.
+        """
+        class_ids = list(self.dbg.classes_by_id.keys())
+        batches = [class_ids[i:i + self.batch_size] for i in range(0, len(class_ids), self.batch_size)]
+
+        semaphore = asyncio.Semaphore(self.concurrency)
+        failed = {}
+        fatal = []
+        results = await asyncio.gather(*[self._count_batch(batch, semaphore, failed, fatal) for batch in batches])
+        if fatal:
+            print(f"ERROR: Failed to get instance counts: {Jdwp.Error.string.get(fatal[0], fatal[0])}")
+            return None
+
+        counts = {}
+        for result in results:
+            counts.update(result)
+        self.failed = failed
+        if failed:
+            print(f"ERROR: Failed to get instance counts of {len(failed)} classes, see .failed")
+
+        self.samples.append((time.time(), counts))
+        if len(self.samples) > self.history:
+            self.samples.pop(0)
+        return counts
+
+
+    def _signature(self, class_id):
+        signature = self.dbg.classes.signature_of(class_id)
+        return signature if signature else f'[unloaded {class_id}]'
+
+
+    def top(self, n: int = 20):
+        """Top n classes by instance count in the latest sample.
+
+        Returns: List of (signature, count, delta) where delta is the
+                 change since the previous sample (0 if there isn't one).
+        """
+        if not self.samples:
+            return []
+        _, latest = self.samples[-1]
+        previous = self.samples[-2][1] if len(self.samples) > 1 else latest
+
+        ranked = sorted((item for item in latest.items() if item[1] > 0),
+            key=lambda item: item[1], reverse=True)[:n]
+        return [(self._signature(class_id), count, count - previous.get(class_id, 0))
+                for class_id, count in ranked]
+
+
+    def growth(self, n: int = 20, since: int = 0):
+        """Top n classes by instance count growth.
+
+        Args:
+            since (int): Index of the sample to compare the latest sample
+                         against. 0 is the oldest kept sample, -2 is the
+                         previous sample.
+
+        Returns: List of (signature, count, delta), largest delta first.
+        """
+        if len(self.samples) < 2:
+            return []
+        _, latest = self.samples[-1]
+        _, baseline = self.samples[since]
+
+        deltas = []
+        for class_id, count in latest.items():
+            delta = count - baseline.get(class_id, 0)
+            if delta > 0:
+                deltas.append((class_id, count, delta))
+        deltas.sort(key=lambda item: item[2], reverse=True)
+        return [(self._signature(class_id), count, delta) for class_id, count, delta in deltas[:n]]
+
+
+    async def track(self, interval: float = 10.0, count: int = None, n: int = 10, callback=None):
+        """Re-sample every interval seconds.
+
+        Args:
+            count (int): Number of samples to take, None for forever.
+            callback: Called with this object after every sample. Defaults
+                      to printing the classes that grew the most.
+        """
+        taken = 0
+        try:
+            while count is None or taken < count:
+                await self.sample()
+                taken += 1
+                if callback:
+                    callback(self)
+                elif len(self.samples) > 1:
+                    print(self.growth_str(n))
+                await asyncio.sleep(interval)
+        except asyncio.CancelledError:
+            pass
+        return self
+
+
+    def start(self, interval: float = 10.0, n: int = 10, callback=None):
+        """Start track() as a background task."""
+        self.stop()
+        self._track_task = asyncio.create_task(self.track(interval, None, n, callback))
+        return self
+
+
+    def stop(self):
+        if self._track_task:
+            self._track_task.cancel()
+            self._track_task = None
+
+
+    @staticmethod
+    def _table_str(title, rows):
+        summary = [title]
+        for signature, count, delta in rows:
+            summary.append(f'  {count:>10} {delta:>+8}  {signature}')
+        return '\n'.join(summary)
+
+
+    def growth_str(self, n: int = 10):
+        return HeapHistogramInfo._table_str(f'Heap Growth (top {n}):', self.growth(n, since=-2))
+
+
+    def __repr__(self):
+        try:
+            if not self.samples:
+                return 'HeapHistogramInfo([no samples])'
+            return HeapHistogramInfo._table_str(
+                f'HeapHistogramInfo({len(self.samples[-1][1])} classes, {len(self.samples)} samples)',
+                self.top(self.n))
+        except Exception as e:
+            return f"HeapHistogramInfo(ERROR: {e})"
@@ -0,0 +1,122 @@
+'''
+Copyright (c) 2025 Vincent Agriesti
+
+This file is part of the thirdparty JDWP project.
+Licensed under the MIT License. See the LICENSE file in the project root
+for full license text.
+'''
+
+from array import array
+from bisect import bisect_left, bisect_right
+
+'''
+Method line tables (Method.LineTable) as sorted arrays.
+
+JDWP gives us (code index, line) pairs in no promised order, possibly with
+several entries per line (loops, inlined finally blocks, etc). We keep two
+sorted views of the same pairs:
+
+    code_indexes/lines     sorted by code index, for code index -> line
+    by_line/by_line_index  sorted by line, for line -> code index(es)
+
+so both directions are a bisect. The arrays also pack into a few bytes per
+entry for the metadata cache (see util/cache.py).
+'''
+
+
+class LineTableInfo():
+
+    __slots__ = ('start', 'end', 'code_indexes', 'lines', 'by_line', 'by_line_index')
+
+    def __init__(self, start=-1, end=-1, pairs=()):
+        """
+          Args:
+            start (int): First code index of the method, -1 if unknown.
+            end (int): Last code index of the method, -1 if unknown.
+            pairs: Iterable of (code_index, line).
+        """
+        self.start = start
+        self.end = end
+
+        pairs = sorted(pairs)
+        self.code_indexes = array('q', [code_index for code_index, _ in pairs])
+        self.lines = array('i', [line for _, line in pairs])
+
+        by_line = sorted((line, code_index) for code_index, line in pairs)
+        self.by_line = array('i', [line for line, _ in by_line])
+        self.by_line_index = array('q', [code_index for _, code_index in by_line])
+
+
+    @staticmethod
+    def from_reply(reply):
+        return LineTableInfo(reply.start, reply.end,
+            [(entry.lineCodeIndex, entry.lineNumber) for entry in reply.lines])
+
+
+    def __len__(self):
+        return len(self.code_indexes)
+
+
+    def line_of(self, code_index):
+        """Source line for a code index, None if unknown."""
+        if not self.code_indexes or code_index < self.code_indexes[0]:
+            return None
+        if self.end >= 0 and code_index > self.end:
+            return None
+        return self.lines[bisect_right(self.code_indexes, code_index) - 1]
+
+
+    def code_indexes_of(self, line):
+        """Every code index a line starts at (empty if it has no code)."""
+        lo = bisect_left(self.by_line, line)
+        hi = bisect_right(self.by_line, line)
+        return list(self.by_line_index[lo:hi])
+
+
+    def code_index_of(self, line, exact=False):
+        """First code index for a line.
+
+          Note: Like most debuggers, a line without code resolves to the
+                next line that has some, unless exact is set.
+
+          Returns: (line, code_index) or None.
+        """
+        idx = bisect_left(self.by_line, line)
+        if idx >= len(self.by_line):
+            return None
+        found = self.by_line[idx]
+        if exact and found != line:
+            return None
+        return found, min(self.code_indexes_of(found))
+
+
+    def line_range(self):
+        """(first, last) line, None if the table is empty."""
+        if not self.by_line:
+            return None
+        return self.by_line[0], self.by_line[-1]
+
+
+    def to_bytes(self):
+        """Pack for the metadata cache. Pair with LineTableInfo.from_bytes()."""
+        return self.code_indexes.tobytes() + self.lines.tobytes()
+
+
+    @staticmethod
+    def from_bytes(start, end, data):
+        count = len(data) // 12
+        code_indexes = array('q')
+        code_indexes.frombytes(data[:count * 8])
+        lines = array('i')
+        lines.frombytes(data[count * 8:])
+        return LineTableInfo(start, end, zip(code_indexes, lines))
+
+
+    def __repr__(self):
+        try:
+            line_range = self.line_range()
+            if not line_range:
+                return 'LineTableInfo([no line info])'
+            return f'LineTableInfo({len(self)} entries, lines {line_range[0]}-{line_range[1]}, code {self.start}-{self.end})'
+        except Exception as e:
+            return f"LineTableInfo(ERROR: {e})"
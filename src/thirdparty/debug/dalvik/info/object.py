@@ -126,7 +126,7 @@ class SubobjectInfo():
 
             for (field_id, field_name), field_value in self.fields.items():
                 field_info = self.class_info.fields_by_id[field_id]
-                summary.append(f'      - {field_info.signature} {field_name} = {Jdwp.Tag.type_str(field_value.tag)}({field_value.value})')
+                summary.append(f'      - {field_info.signature} {field_name} = {self.dbg.value_str(field_value)}')
                 #summary.append(f'      - {field_name} = {field_value}')
 
             return '\n'.join(summary)
@@ -176,6 +176,9 @@ class ObjectInfo():
             class_id = await self.dbg.get_super_id(class_id)
             #print(f"CLASS_ID: {class_id}  .. after get_super_id")
         #print(f"CLASS_ID: {class_id}  .. after loop")
+
+        # One batch for every string field so __repr__ can inline them.
+        await self.dbg.prefetch_strings([value for subobj in self.subobjects for value in subobj.fields.values()])
         return self
 
 
@@ -0,0 +1,335 @@
+'''
+Copyright (c) 2025 Vincent Agriesti
+
+This file is part of the thirdparty JDWP project.
+Licensed under the MIT License. See the LICENSE file in the project root
+for full license text.
+'''
+
+import asyncio
+import time
+from thirdparty.jdwp import (
+    Jdwp, Int, Long, ObjectID, FieldID, ReferenceTypeID, ArrayID, ClassObjectID)
+from thirdparty.debug.dalvik.info.state import *
+
+'''
+Retention paths answer "why is this object still alive?".
+
+JDWP has no GC root query, but ObjectReference.ReferringObjects gives us the
+reverse edges of the heap graph. We walk those edges breadth first from the
+target until we hit an anchor: something we consider a root for practical
+purposes. By default that's a class object (i.e. the object is held by a
+static field, ART keeps statics in the java.lang.Class instance) or a thread.
+An object with no referrers at all is reported too, it's most likely held by
+a stack slot or a JNI reference.
+
+Because the walk is breadth first, paths come out shortest first. Each level
+is expanded with a bounded number of ReferringObjects requests in flight and
+paths are yielded as soon as their anchor is seen, so a search over a large
+heap can be consumed (and abandoned) incrementally. The node, depth, referrer
+and time budgets keep a single search from walking the whole heap.
+
+Referrer lists are memoized on the RetentionInfo, so repeated searches from
+the same instance only cost the new edges. The heap moves once the VM is
+resumed, so create a new RetentionInfo (or clear()) after resuming.
+'''
+
+
+# Default anchors, by referrer tag.
+ANCHOR_TAGS = (Jdwp.Tag.CLASS_OBJECT, Jdwp.Tag.THREAD)
+
+# Largest chunk of an array fetched at once when resolving an element index.
+ARRAY_CHUNK = 1024
+
+
+class RetentionPath():
+    """One chain of references from an anchor down to the target.
+
+    steps: List of (object_id, tag, label) from the anchor to the target.
+           label names the reference from that object to the next one in
+           the chain (None on the target itself).
+    anchor: Why the walk stopped, e.g. 'static', 'thread', 'unreferenced'.
+    """
+
+    def __init__(self, retention, anchor, steps):
+        self.retention = retention
+        self.anchor = anchor
+        self.steps = steps
+
+
+    def __len__(self):
+        return len(self.steps) - 1
+
+
+    def __repr__(self):
+        try:
+            summary = [f'RetentionPath({self.anchor}, {len(self)} hops)']
+            for object_id, tag, label in self.steps:
+                line = f'  {object_id} {self.retention.object_str(object_id, tag)}'
+                if label:
+                    line += f' .{label} ->'
+                summary.append(line)
+            return '\n'.join(summary)
+        except Exception as e:
+            return f"RetentionPath(ERROR: {e})"
+
+
+class RetentionInfo():
+
+    def __init__(self, dbg, target_id: int, max_paths: int = 3, max_depth: int = 16,
+                 max_nodes: int = 20000, max_referrers: int = 256, timeout: float = 30.0,
+                 anchor_tags=ANCHOR_TAGS, is_anchor=None):
+        """
+          Args:
+            max_paths (int): Stop after this many paths.
+            max_depth (int): Maximum number of hops from the target.
+            max_nodes (int): Maximum number of distinct objects visited.
+            max_referrers (int): Referrers fetched per object, 0 for all.
+            timeout (float): Seconds before the search gives up.
+            anchor_tags: Referrer tags that end a path.
+            is_anchor: Optional `(tag, object_id) -> str|None` callback. A
+                       returned string ends the path with that anchor name.
+        """
+        self.dbg = dbg
+        self.target_id = target_id
+        self.max_paths = max_paths
+        self.max_depth = max_depth
+        self.max_nodes = max_nodes
+        self.max_referrers = max_referrers
+        self.timeout = timeout
+        self.anchor_tags = anchor_tags
+        self.is_anchor = is_anchor
+
+        # object_id -> [(tag, referrer_id)], memoized across searches.
+        self.referrers = {}
+
+        # holder object_id -> {held object_id: label}
+        self._labels = {}
+
+        # object_id -> class_id
+        self._class_ids = {}
+
+        self.paths = []
+
+        # Set when a budget stopped the search early.
+        self.truncated = False
+
+
+    def clear(self):
+        """Drop memoized heap state, e.g. after the VM has been resumed."""
+        self.referrers = {}
+        self._labels = {}
+        self._class_ids = {}
+        self.paths = []
+
+
+    async def _fetch_referrers(self, object_id, semaphore):
+        if object_id in self.referrers:
+            return object_id, self.referrers[object_id]
+
+        async with semaphore:
+            referring_req = self.dbg.jdwp.ObjectReference.ReferringObjectsRequest()
+            referring_req.objectid = ObjectID(object_id)
+            referring_req.maxReferrers = Int(self.max_referrers)
+            referring_reply, error_code = await self.dbg.jdwp.ObjectReference.ReferringObjects(referring_req)
+            if error_code != Jdwp.Error.NONE:
+                # Likely collected mid-walk, don't treat it as a root.
+                print(f"ERROR: Failed to get referring objects: {Jdwp.Error.string[error_code]}")
+                return object_id, None
+
+        referrers = [(entry.tag, entry.objectID) for entry in referring_reply.referringObjects]
+        self.referrers[object_id] = referrers
+        return object_id, referrers
+
+
+    def _anchor(self, tag, object_id):
+        if self.is_anchor:
+            anchor = self.is_anchor(tag, object_id)
+            if anchor:
+                return anchor
+        if tag in self.anchor_tags:
+            return 'static' if tag == Jdwp.Tag.CLASS_OBJECT else Jdwp.Tag.type_str(tag).lower()
+        return None
+
+
+    async def search(self, concurrency: int = 8):
+        """Breadth first walk of referrers, yielding RetentionPath()s as found.
+
+          Usage: `async for path in retention.search(): print(path)`
+        """
+        self.paths = []
+        self.truncated = False
+
+        semaphore = asyncio.Semaphore(concurrency)
+        deadline = time.monotonic() + self.timeout
+
+        # referrer -> (object it refers to, referrer tag), points back to the target.
+        parents = {self.target_id: (None, None)}
+        frontier = [self.target_id]
+
+        for _ in range(self.max_depth):
+            next_frontier = []
+            tasks = [asyncio.ensure_future(self._fetch_referrers(object_id, semaphore)) for object_id in frontier]
+            try:
+                for next_done in asyncio.as_completed(tasks, timeout=max(0, deadline - time.monotonic())):
+                    object_id, referrers = await next_done
+                    if referrers is None:
+                        continue
+
+                    if not referrers:
+                        yield await self._add_path('unreferenced', object_id, parents)
+                        if len(self.paths) >= self.max_paths:
+                            return
+                        continue
+
+                    for tag, referrer_id in referrers:
+                        if referrer_id in parents:
+                            continue
+                        if len(parents) >= self.max_nodes:
+                            self.truncated = True
+                            break
+                        parents[referrer_id] = (object_id, tag)
+
+                        anchor = self._anchor(tag, referrer_id)
+                        if anchor:
+                            yield await self._add_path(anchor, referrer_id, parents)
+                            if len(self.paths) >= self.max_paths:
+                                return
+                        else:
+                            next_frontier.append(referrer_id)
+
+            except asyncio.TimeoutError:
+                self.truncated = True
+                return
+            finally:
+                for task in tasks:
+                    task.cancel()
+
+            if not next_frontier:
+                return
+            frontier = next_frontier
+
+        self.truncated = True
+
+
+    async def find(self, concurrency: int = 8):
+        """Run search() to completion. Returns list of RetentionPath()."""
+        async for _ in self.search(concurrency):
+            pass
+        return self.paths
+
+
+    async def _add_path(self, anchor, anchor_id, parents):
+        chain = []
+        object_id = anchor_id
+        while object_id is not None:
+            held_id, tag = parents[object_id]
+            chain.append((object_id, tag))
+            object_id = held_id
+
+        # Only the objects on a reported path get their types and field names resolved.
+        await asyncio.gather(*[self._class_id(object_id, tag) for object_id, tag in chain])
+        labels = await asyncio.gather(*[
+            self._label(holder_id, holder_tag, held_id)
+            for (holder_id, holder_tag), (held_id, _) in zip(chain, chain[1:])])
+
+        steps = [(object_id, tag, label) for (object_id, tag), label in zip(chain, [*labels, None])]
+        path = RetentionPath(self, anchor, steps)
+        self.paths.append(path)
+        return path
+
+
+    async def _class_id(self, object_id, tag):
+        if object_id not in self._class_ids:
+            if tag == Jdwp.Tag.CLASS_OBJECT:
+                reflected_reply, error_code = await self.dbg.jdwp.ClassObjectReference.ReflectedType(ClassObjectID(object_id))
+                if error_code != Jdwp.Error.NONE:
+                    print(f"ERROR: Failed to get reflected type: {Jdwp.Error.string[error_code]}")
+                    return None
+                self._class_ids[object_id] = reflected_reply.typeID
+            else:
+                self._class_ids[object_id] = await self.dbg.get_class_id(object_id)
+        return self._class_ids[object_id]
+
+
+    async def _label(self, holder_id, holder_tag, held_id):
+        labels = self._labels.setdefault(holder_id, {})
+        if held_id not in labels:
+            if holder_tag == Jdwp.Tag.ARRAY:
+                labels[held_id] = await self._array_label(holder_id, held_id)
+            else:
+                labels[held_id] = await self._field_label(holder_id, holder_tag, held_id)
+        return labels[held_id]
+
+
+    async def _field_label(self, holder_id, holder_tag, held_id):
+        class_id = await self._class_id(holder_id, holder_tag)
+        if class_id is None or class_id not in self.dbg.classes_by_id:
+            return '?'
+        class_info = await self.dbg.class_info(class_id)
+
+        # Statics live on the class object, everything else is an instance field.
+        if holder_tag == Jdwp.Tag.CLASS_OBJECT:
+            fields = [field for field in class_info.fields_by_id.values() if field.modBits & ACC_STATIC]
+            getvalues_req = self.dbg.jdwp.ReferenceType.GetValuesRequest(refType=ReferenceTypeID(class_id))
+            getvalues = self.dbg.jdwp.ReferenceType.GetValues
+        else:
+            fields = class_info.instance_fields()
+            getvalues_req = self.dbg.jdwp.ObjectReference.GetValuesRequest()
+            getvalues_req.objectid = ObjectID(holder_id)
+            getvalues = self.dbg.jdwp.ObjectReference.GetValues
+        if not fields:
+            return '?'
+
+        getvalues_req.fields = [FieldID(field.fieldID) for field in fields]
+        getvalues_reply, error_code = await getvalues(getvalues_req)
+        if error_code != Jdwp.Error.NONE:
+            print(f"ERROR: Failed to get field values: {Jdwp.Error.string[error_code]}")
+            return '?'
+
+        # Note: Every matching field is reported, an object can be held twice.
+        names = [field.name for field, value in zip(fields, getvalues_reply.values)
+                 if value.tag in Jdwp.Tag.objs and value.value == held_id]
+        return ','.join(names) if names else '?'
+
+
+    async def _array_label(self, array_id, held_id):
+        length, error_code = await self.dbg.jdwp.ArrayReference.Length(ArrayID(array_id))
+        if error_code != Jdwp.Error.NONE:
+            print(f"ERROR: Failed to get array length: {Jdwp.Error.string[error_code]}")
+            return '[?]'
+
+        for first in range(0, length, ARRAY_CHUNK):
+            getvalues_req = self.dbg.jdwp.ArrayReference.GetValuesRequest()
+            getvalues_req.arrayObject = ArrayID(array_id)
+            getvalues_req.firstIndex = Int(first)
+            getvalues_req.length = Int(min(ARRAY_CHUNK, length - first))
+            region, error_code = await self.dbg.jdwp.ArrayReference.GetValues(getvalues_req)
+            if error_code != Jdwp.Error.NONE:
+                print(f"ERROR: Failed to get array values: {Jdwp.Error.string[error_code]}")
+                return '[?]'
+            for idx, value in enumerate(region.values):
+                if value.value == held_id:
+                    return f'[{first + idx}]'
+        return '[?]'
+
+
+    def object_str(self, object_id, tag):
+        signature = self.dbg.classes.signature_of(self._class_ids.get(object_id))
+        if signature:
+            if tag == Jdwp.Tag.CLASS_OBJECT:
+                return f'class {signature}'
+            return signature
+        return Jdwp.Tag.type_str(tag) if tag else 'target'
+
+
+    def __repr__(self):
+        try:
+            summary = [f'RetentionInfo(target {self.target_id}, {len(self.paths)} paths, {len(self.referrers)} objects walked)']
+            if self.truncated:
+                summary.append('  [truncated by budget]')
+            for path in self.paths:
+                summary.append(f'{path}')
+            return '\n'.join(summary)
+        except Exception as e:
+            return f"RetentionInfo(ERROR: {e})"
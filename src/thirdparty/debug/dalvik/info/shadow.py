@@ -0,0 +1,148 @@
+'''
+Copyright (c) 2025 Vincent Agriesti
+
+This file is part of the thirdparty JDWP project.
+Licensed under the MIT License. See the LICENSE file in the project root
+for full license text.
+'''
+
+import struct
+
+'''
+Whole-stack vreg dumps from ART shadow frames.
+
+The Frida side (NativeObject.RPC_SCRIPT dumpShadowFrames) walks a thread's
+shadow frame chain and packs every frame into one little endian buffer:
+
+    u32 magic ('SHFR'), u32 frame count
+    per frame:
+      u64 frame address, u64 ArtMethod*, u32 dex_pc, u32 vreg count (n)
+      u32 vregs[n]     raw registers
+      u32 refs[n]      reference half, non-zero where vX holds a reference
+
+ShadowStackInfo.from_bytes() decodes it without copying, each frame's
+registers are memoryview casts into the one buffer.
+
+Note: refs are compressed heap references (32 bit), not JDWP ObjectIDs.
+Note: Only interpreted frames have shadow frames. Compiled frames in between
+      don't show up, so frame N here isn't necessarily JDWP frame N.
+'''
+
+
+SHADOW_FRAMES_MAGIC = 0x52464853
+
+_stack_header = struct.Struct('<II')
+_frame_header = struct.Struct('<QQII')
+
+
+class ShadowFrameInfo():
+
+    __slots__ = ('frame', 'method', 'dex_pc', 'vregs', 'refs')
+
+    def __init__(self, frame, method, dex_pc, vregs, refs):
+        self.frame = frame
+        self.method = method
+        self.dex_pc = dex_pc
+        self.vregs = vregs
+        self.refs = refs
+
+
+    def __len__(self):
+        return len(self.vregs)
+
+
+    def is_reference(self, slot):
+        return self.refs[slot] != 0
+
+
+    def value(self, slot, sigbyte):
+        """Decode a register like a JDWP StackFrame.GetValues slot would.
+
+          Args:
+            slot (int): Register number.
+            sigbyte (str): JNI type char, 'I', 'J', 'F', 'D', 'Z', 'B', 'C', 'S', 'L' or '['.
+                           Wide types read the slot+1 pair too.
+
+          Returns: int/float/bool, or the compressed reference for objects.
+        """
+        raw = self.vregs[slot]
+        if sigbyte in 'L[':
+            return self.refs[slot]
+        if sigbyte == 'J':
+            return struct.unpack('<q', struct.pack('<II', raw, self.vregs[slot + 1]))[0]
+        if sigbyte == 'D':
+            return struct.unpack('<d', struct.pack('<II', raw, self.vregs[slot + 1]))[0]
+        if sigbyte == 'F':
+            return struct.unpack('<f', struct.pack('<I', raw))[0]
+        if sigbyte == 'Z':
+            return raw != 0
+        if sigbyte == 'C':
+            return raw & 0xffff
+        if sigbyte == 'B':
+            return struct.unpack('<b', struct.pack('<B', raw & 0xff))[0]
+        if sigbyte == 'S':
+            return struct.unpack('<h', struct.pack('<H', raw & 0xffff))[0]
+        return raw - (1 << 32) if raw & 0x80000000 else raw
+
+
+    def __repr__(self):
+        try:
+            lines = [f'ShadowFrameInfo({self.frame:#x} method {self.method:#x} dex_pc {self.dex_pc:04x})']
+            for slot in range(len(self.vregs)):
+                ref = f'  ref {self.refs[slot]:#x}' if self.refs[slot] else ''
+                lines.append(f'  v{slot}: {self.vregs[slot]:08x} {self.value(slot, "I"):11d}{ref}')
+            return '\n'.join(lines)
+        except Exception as e:
+            return f"ShadowFrameInfo(ERROR: {e})"
+
+
+class ShadowStackInfo():
+
+    def __init__(self, frames):
+        self.frames = frames
+
+
+    @staticmethod
+    def from_bytes(data):
+        """Decode a dumpShadowFrames buffer. Raises ValueError if it's malformed."""
+        view = memoryview(data)
+        if len(view) < _stack_header.size:
+            raise ValueError(f'Truncated shadow frame dump ({len(view)} bytes)')
+        magic, count = _stack_header.unpack_from(view, 0)
+        if magic != SHADOW_FRAMES_MAGIC:
+            raise ValueError(f'Bad shadow frame dump magic {magic:#x}')
+
+        frames = []
+        pos = _stack_header.size
+        for _ in range(count):
+            if pos + _frame_header.size > len(view):
+                raise ValueError(f'Truncated shadow frame dump ({len(view)} bytes)')
+            frame, method, dex_pc, vreg_count = _frame_header.unpack_from(view, pos)
+            pos += _frame_header.size
+            end = pos + vreg_count * 8
+            if end > len(view):
+                raise ValueError(f'Truncated shadow frame dump ({len(view)} bytes)')
+            vregs = view[pos:pos + vreg_count * 4].cast('I')
+            refs = view[pos + vreg_count * 4:end].cast('I')
+            frames.append(ShadowFrameInfo(frame, method, dex_pc, vregs, refs))
+            pos = end
+        return ShadowStackInfo(frames)
+
+
+    def __len__(self):
+        return len(self.frames)
+
+
+    def __getitem__(self, idx):
+        return self.frames[idx]
+
+
+    def __iter__(self):
+        return iter(self.frames)
+
+
+    def __repr__(self):
+        try:
+            return '\n'.join([f'ShadowStackInfo({len(self.frames)} frames)', *[repr(frame) for frame in self.frames]])
+        except Exception as e:
+            return f"ShadowStackInfo(ERROR: {e})"
@@ -0,0 +1,242 @@
+'''
+Copyright (c) 2025 Vincent Agriesti
+
+This file is part of the thirdparty JDWP project.
+Licensed under the MIT License. See the LICENSE file in the project root
+for full license text.
+'''
+
+import asyncio
+from thirdparty.jdwp import Jdwp, Int, ObjectID, FieldID, ArrayID
+from thirdparty.debug.dalvik.info.state import *
+
+'''
+A snapshot is a breadth first capture of an object and the objects reachable
+from its fields, stored in an ID keyed form:
+
+    objects[object_id] = (class_id, {field_id: (tag, value)})
+
+Arrays are stored the same way, keyed by element index instead of field ID
+(see field_name()). Every reference tag (strings, arrays, threads, class
+objects, ...) is followed, not only plain objects.
+
+Unlike ObjectInfo.load(), which issues ReferenceType + Superclass + GetValues
+per class in the hierarchy, a snapshot fetches all instance fields of an
+object (every super class included) with one ObjectReference.GetValues. Each
+BFS level is fetched concurrently, bounded by a semaphore so we don't flood
+the JDWP connection. Array elements are fetched in ARRAY_CHUNK sized
+ArrayReference.GetValues regions, at most budget elements per array.
+
+Two snapshots of the same root can be diffed by object identity and field to
+see what changed between two breakpoint hits. The IDs are raw, nothing keeps
+the objects alive: an ID is only good until the next ObjectHandles.sweep()
+(see info/handles.py), pin() the root to diff across one.
+'''
+
+ARRAY_CHUNK = 1024
+
+
+class SnapshotInfo():
+
+    def __init__(self, dbg, root_id: int, depth: int = 2, budget: int = 1000):
+        self.dbg = dbg
+        self.root_id = root_id
+        self.depth = depth
+        self.budget = budget
+
+        # object_id -> (class_id, {field_id: (tag, value)})
+        self.objects = {}
+
+        # Set when the budget stopped the walk early.
+        self.truncated = False
+
+
+    async def _capture_array(self, object_id, class_id):
+        length, error_code = await self.dbg.jdwp.ArrayReference.Length(ArrayID(object_id))
+        if error_code != Jdwp.Error.NONE:
+            print(f"ERROR: Failed to get array length: {Jdwp.Error.string[error_code]}")
+            return
+
+        if length > self.budget:
+            self.truncated = True
+            length = self.budget
+
+        values = {}
+        for first in range(0, length, ARRAY_CHUNK):
+            getvalues_req = self.dbg.jdwp.ArrayReference.GetValuesRequest()
+            getvalues_req.arrayObject = ArrayID(object_id)
+            getvalues_req.firstIndex = Int(first)
+            getvalues_req.length = Int(min(ARRAY_CHUNK, length - first))
+            region, error_code = await self.dbg.jdwp.ArrayReference.GetValues(getvalues_req)
+            if error_code != Jdwp.Error.NONE:
+                print(f"ERROR: Failed to get array values: {Jdwp.Error.string[error_code]}")
+                return
+            for idx, value in enumerate(region.values):
+                values[first + idx] = (value.tag, value.value)
+
+        self.objects[object_id] = (class_id, values)
+
+
+    async def _capture_object(self, object_id, tag, semaphore):
+        async with semaphore:
+            class_id = await self.dbg.get_class_id(object_id)
+            if class_id is None:
+                return
+
+            # Note: The root's tag isn't known, the class signature tells us.
+            if tag == Jdwp.Tag.ARRAY or (tag is None and self._is_array(class_id)):
+                await self._capture_array(object_id, class_id)
+                return
+
+            if class_id not in self.dbg.classes_by_id:
+                return
+
+            class_info = await self.dbg.class_info(class_id)
+            fields = class_info.instance_fields()
+
+            values = {}
+            if fields:
+                getvalues_req = self.dbg.jdwp.ObjectReference.GetValuesRequest()
+                getvalues_req.objectid = ObjectID(object_id)
+                for field in fields:
+                    getvalues_req.fields.append(FieldID(field.fieldID))
+
+                getvalues_reply, error_code = await self.dbg.jdwp.ObjectReference.GetValues(getvalues_req)
+                if error_code != Jdwp.Error.NONE:
+                    print(f"ERROR: Failed to get object values: {Jdwp.Error.string[error_code]}")
+                    return
+
+                for field, value in zip(fields, getvalues_reply.values):
+                    values[field.fieldID] = (value.tag, value.value)
+
+            self.objects[object_id] = (class_id, values)
+
+
+    async def capture(self, concurrency: int = 16):
+        self.objects = {}
+        self.truncated = False
+
+        semaphore = asyncio.Semaphore(concurrency)
+        visited = {self.root_id}
+        frontier = [(self.root_id, None)]
+
+        for level in range(self.depth + 1):
+            await asyncio.gather(*[self._capture_object(object_id, tag, semaphore) for object_id, tag in frontier])
+            if level == self.depth:
+                break
+
+            # Collect the next level, skipping anything we've already seen (cycles).
+            next_frontier = []
+            for object_id, _ in frontier:
+                if object_id not in self.objects:
+                    continue
+                _, values = self.objects[object_id]
+                for tag, value in values.values():
+                    if tag not in Jdwp.Tag.objs or not value or value in visited:
+                        continue
+                    if len(visited) >= self.budget:
+                        self.truncated = True
+                        break
+                    visited.add(value)
+                    next_frontier.append((value, tag))
+
+            if not next_frontier:
+                break
+            frontier = next_frontier
+
+        return self
+
+
+    def _is_array(self, class_id):
+        signature = self.dbg.classes.signature_of(class_id)
+        return bool(signature) and signature.startswith('[')
+
+
+    def field_name(self, class_id, field_id):
+        # Note: Array values are keyed by element index.
+        if self._is_array(class_id):
+            return f'[{field_id}]'
+        if class_id in self.dbg.classes_by_id:
+            field = self.dbg.classes_by_id[class_id].find_field(field_id)
+            if field:
+                return field.name
+        return f'field@{field_id}'
+
+
+    def diff(self, other):
+        """Compare against a later snapshot. See SnapshotDiff."""
+        return SnapshotDiff(self, other)
+
+
+    def __repr__(self):
+        try:
+            summary = [f'SnapshotInfo(root {self.root_id}, {len(self.objects)} objects, depth {self.depth})']
+            if self.truncated:
+                summary.append(f'  [truncated at budget {self.budget}]')
+
+            for object_id, (class_id, values) in self.objects.items():
+                signature = self.dbg.classes.signature_of(class_id)
+                summary.append(f'  {object_id}: {signature}')
+                for field_id, (tag, value) in values.items():
+                    summary.append(f'    - {self.field_name(class_id, field_id)} = {Jdwp.Tag.type_str(tag)}({value})')
+            return '\n'.join(summary)
+        except Exception as e:
+            return f"SnapshotInfo(ERROR: {e})"
+
+
+class SnapshotDiff():
+    """Changes between two snapshots, by object identity and field.
+
+    changes: List of (object_id, class_id, field_id, before, after) where
+             before/after are (tag, value) tuples (or None if absent).
+    added: Object IDs only reachable in the later snapshot.
+    removed: Object IDs only reachable in the earlier snapshot.
+    """
+
+    def __init__(self, before: SnapshotInfo, after: SnapshotInfo):
+        self.before = before
+        self.after = after
+
+        self.added = [oid for oid in after.objects if oid not in before.objects]
+        self.removed = [oid for oid in before.objects if oid not in after.objects]
+
+        self.changes = []
+        for object_id, (class_id, after_values) in after.objects.items():
+            if object_id not in before.objects:
+                continue
+            _, before_values = before.objects[object_id]
+            if before_values == after_values:
+                continue
+            for field_id in before_values.keys() | after_values.keys():
+                old = before_values.get(field_id)
+                new = after_values.get(field_id)
+                if old != new:
+                    self.changes.append((object_id, class_id, field_id, old, new))
+
+
+    def __bool__(self):
+        return bool(self.changes or self.added or self.removed)
+
+
+    def __repr__(self):
+        try:
+            if not self:
+                return 'SnapshotDiff(no changes)'
+
+            def value_str(tagged):
+                if tagged is None:
+                    return '<absent>'
+                tag, value = tagged
+                return f'{Jdwp.Tag.type_str(tag)}({value})'
+
+            summary = [f'SnapshotDiff({len(self.changes)} changed, {len(self.added)} added, {len(self.removed)} removed)']
+            for object_id, class_id, field_id, old, new in self.changes:
+                name = self.after.field_name(class_id, field_id)
+                summary.append(f'  ~ {object_id}.{name}: {value_str(old)} -> {value_str(new)}')
+            for object_id in self.added:
+                summary.append(f'  + {object_id}')
+            for object_id in self.removed:
+                summary.append(f'  - {object_id}')
+            return '\n'.join(summary)
+        except Exception as e:
+            return f"SnapshotDiff(ERROR: {e})"
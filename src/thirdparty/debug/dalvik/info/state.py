@@ -9,13 +9,24 @@ for full license text.
 from thirdparty.jdwp import Jdwp, Byte, Boolean, Int, String, ReferenceTypeID, ThreadID, MethodID, ClassID, FieldID
 from pydantic import BaseModel
 from typing import Optional, List, Tuple
+import time
+import weakref
+from collections import deque
+from thirdparty.debug.dalvik.info.symbols import SymbolIndex
+from thirdparty.debug.dalvik.info.classtable import ClassTable
 
 
+# Field/method modBits (JVM access flags)
+ACC_STATIC = 0x0008
 
-
+# How many JDWP events DebuggerState.recent_events keeps.
+RECENT_EVENTS = 4096
 
 
 class FieldInfo():
+    # Note: A loaded app has hundreds of thousands of these.
+    __slots__ = ('fieldID', 'name', 'signature', 'modBits')
+
     def __init__(self):
         self.fieldID: Optional[FieldID] = None
         self.name: Optional[String] = None
@@ -23,12 +34,20 @@ class FieldInfo():
         self.modBits: Optional[Int] = None
 
 class MethodInfo():
+    __slots__ = ('methodID', 'name', 'signature', 'modBits', 'bytecode', 'line_table', 'disassembly', 'cfg')
+
     def __init__(self):
         self.methodID: Optional[MethodID] = None
         self.name: Optional[String] = None
         self.signature: Optional[String] = None
         self.modBits: Optional[Int] = None
         self.bytecode = None
+        # LineTableInfo, see Debugger.line_table()
+        self.line_table = None
+        # DisassemblyInfo, see Debugger.disassembly()
+        self.disassembly = None
+        # ControlFlowGraph, see Debugger.cfg()
+        self.cfg = None
 
 
 class ClassInfo():
@@ -37,7 +56,7 @@ class ClassInfo():
         self.dbg = dbg
         self.typeID = class_id
 
-        # Populated by self.dbg.create_class_info()
+        # Populated by ClassTable.info() or self.dbg.create_class_info()
         self.refTypeTag: Optional[Byte] = None
         self.signature: Optional[String] = None
         self.generic: Optional[String] = None
@@ -52,6 +71,9 @@ class ClassInfo():
 
         self.super_class = None
 
+        # Cached by instance_fields()
+        self._instance_fields = None
+
         # Dereference of these will cause crash.
         self.unsafe_fields_by_id = {}
         self.unsafe_fields_by_signature = {}
@@ -86,6 +108,7 @@ class ClassInfo():
                 self.fields_by_signature[(field.name, field.signature)] = field
             
         self.fields_loaded = True
+        self.dbg.symbols.add_fields(self)
 
 
     async def _update_class_methods(self):
@@ -108,6 +131,7 @@ class ClassInfo():
             self.methods_by_signature[method_signature] = method
 
         self.methods_loaded = True
+        self.dbg.symbols.add_methods(self)
 
 
     async def _update_super_class(self):
@@ -128,12 +152,45 @@ class ClassInfo():
         return self
 
 
+    def instance_fields(self):
+        """Non-static fields declared by this class and all of its super classes.
+
+        Lets an object's whole hierarchy be fetched with a single
+        ObjectReference.GetValues. Only meaningful after load().
+        """
+        if self._instance_fields is None:
+            fields = []
+            class_info = self
+            while class_info:
+                for field in class_info.fields_by_id.values():
+                    if not field.modBits & ACC_STATIC:
+                        fields.append(field)
+                class_info = class_info.super_class
+            self._instance_fields = fields
+        return self._instance_fields
+
+
+    def find_field(self, field_id):
+        """Find a FieldInfo by ID in this class or its super classes."""
+        class_info = self
+        while class_info:
+            if field_id in class_info.fields_by_id:
+                return class_info.fields_by_id[field_id]
+            class_info = class_info.super_class
+        return None
+
+
 class DebuggerState():
   def __init__(self):
     self.jdwp = None
 
-    self.classes_by_id = {}
-    self.classes_by_signature = {}
+    # Columnar, ClassInfo objects are only built on access. See info/classtable.py
+    self.classes = ClassTable()
+    self.classes_by_id = self.classes.by_id
+    self.classes_by_signature = self.classes.by_signature
+
+    # Name search over classes and their loaded methods/fields.
+    self.symbols = SymbolIndex()
 
     # TODO: What is the best way to store unloaded classes, consider recycled signatures and ids.
     self.unloaded_classes = []
@@ -142,4 +199,60 @@ class DebuggerState():
     #self.thread_by_name = {}
     self.dead_threads = []
 
-    self.objects_by_id = {}
\ No newline at end of file
+    # Weak, ObjectHandles decides what stays alive. See info/handles.py
+    self.objects_by_id = weakref.WeakValueDictionary()
+    self.handles = None
+
+    # Breakpoints waiting on a class to prepare. See info/deferred.py
+    self.deferred = None
+
+    # Optional on disk metadata. See util/cache.py and Debugger.use_metadata_cache()
+    self.metadata_cache = None
+
+    # Mapped dex files of the app, for symbolic disassembly. See Debugger.use_dex_files()
+    self.dex_files = []
+
+    # Bumped on every resume through the Debugger, anything read from target
+    # memory while stopped is only good for one epoch. See util/memory.py
+    self.suspend_epoch = 0
+
+    # Bumped by resume_vm() only. A thread's frames are current until this
+    # moves on or that thread itself is resumed. See ThreadInfo.stopped
+    self.vm_epoch = 0
+
+    # Strings are immutable, so values stay valid until the object is collected.
+    self.strings_by_id = {}
+
+    # Every JDWP event seen, newest last, see record_event(). Published by sandbox/shm.py
+    self.recent_events = deque(maxlen=RECENT_EVENTS)
+    self.events_seen = 0
+
+    # Bumped whenever cached thread/frame state changes (events, ThreadInfo.load()).
+    # Lets views (e.g. tui/panels.py) skip rebuilding when nothing happened.
+    self.version = 0
+
+
+  def record_event(self, event):
+    """Jdwp event observer, keeps a flat row per event in recent_events.
+
+      Row: (seq, time, eventKind, requestID, thread, classID, methodID, index)
+      with 0 for whatever the event doesn't carry. classID is the location's
+      class, or typeID for class prepare/unload.
+    """
+    location = getattr(event, 'location', None)
+    if location is not None:
+      class_id, method_id, index = location.classID, location.methodID, location.index
+    else:
+      class_id, method_id, index = getattr(event, 'typeID', None), 0, 0
+    self.events_seen += 1
+    self.version += 1
+    self.recent_events.append((
+      self.events_seen,
+      time.time(),
+      int(event.eventKind or 0),
+      int(event.requestID or 0),
+      int(getattr(event, 'thread', None) or 0),
+      int(class_id or 0),
+      int(method_id or 0),
+      int(index or 0),
+    ))
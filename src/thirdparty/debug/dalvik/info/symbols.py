@@ -0,0 +1,374 @@
+'''
+Copyright (c) 2025 Vincent Agriesti
+
+This file is part of the thirdparty JDWP project.
+Licensed under the MIT License. See the LICENSE file in the project root
+for full license text.
+'''
+
+import re
+import bisect
+
+'''
+Symbol index over classes, methods and fields.
+
+fuzzyfinder over classes_by_signature is a linear Python scan per keystroke,
+which is seconds once an app has 50k+ classes and their methods loaded. The
+index keeps three structures, each used when it's cheapest:
+
+  - A sorted list of (key, symbol_id) where key is both the full dotted name
+    and the simple name. Prefix lookups are two bisects.
+  - A trigram -> {symbol_id} map over class names and member simple names.
+    Substring lookups intersect the posting sets of the query trigrams
+    (smallest first) and only verify survivors.
+  - A newline joined blob of every lowered name. Fuzzy (subsequence) lookups
+    run one compiled regex over the blob, so the scan happens in C.
+
+Classes are added as they're prepared (or from AllClasses), methods and
+fields are added when a ClassInfo loads them, and unloads remove everything
+a class contributed. New symbols are merged into the sorted list and the blob
+on the next query: a handful are bisect-inserted, a large burst (AllClasses)
+triggers one full sort. Removed symbols are left as tombstones that lookups
+skip until there are enough of them to be worth a rebuild.
+
+Results are ranked by match quality, then by package: preferred packages
+(e.g. the app under test) first and framework packages last.
+'''
+
+
+# Demoted in results unless preferred.
+FRAMEWORK_PACKAGES = (
+    'java.', 'javax.', 'android.', 'androidx.', 'dalvik.', 'libcore.', 'sun.',
+    'kotlin.', 'kotlinx.', 'com.android.', 'org.apache.', 'org.json.', 'org.xml.',
+    'org.w3c.', 'com.google.android.',
+)
+
+# Match quality, lower is better.
+MATCH_EXACT = 0
+MATCH_NAME_PREFIX = 1
+MATCH_PREFIX = 2
+MATCH_SUBSTRING = 3
+MATCH_FUZZY = 4
+
+
+def signature_to_dotted(signature: str) -> str:
+    """Lcom/foo/Bar; -> com.foo.Bar, anything else (arrays, primitives) as is."""
+    if signature.startswith('L') and signature.endswith(';'):
+        return signature[1:-1].replace('/', '.')
+    return signature
+
+
+class Symbol():
+    __slots__ = ('symbol_id', 'kind', 'text', 'name', 'lower', 'name_lower', 'package', 'class_id', 'member_id', 'signature')
+
+    def __init__(self, symbol_id, kind, text, name, package, class_id, member_id=None, signature=None):
+        self.symbol_id = symbol_id
+        self.kind = kind
+        self.text = text
+        self.name = name
+        self.lower = text.lower()
+        self.name_lower = name.lower()
+        self.package = package
+        self.class_id = class_id
+        self.member_id = member_id
+        self.signature = signature
+
+
+    def __repr__(self):
+        if self.kind == 'class':
+            return f'class {self.text}'
+        if self.kind == 'method':
+            return f'method {self.text}{self.signature}'
+        return f'field {self.text} {self.signature}'
+
+
+class SymbolIndex():
+
+    def __init__(self):
+        # symbol_id -> Symbol
+        self.symbols = {}
+        self._next_id = 0
+
+        # class_id -> [symbol_id, ...] (class symbol first)
+        self._by_class = {}
+        # (class_id, kind) already indexed, so reloads don't duplicate members.
+        self._members_indexed = set()
+
+        # trigram -> {symbol_id}
+        self._trigrams = {}
+
+        # Rebuilt on demand by _refresh().
+        self._sorted_keys = []
+        self._sorted_ids = []
+        self._blob = ''
+        self._blob_starts = []
+        self._blob_ids = []
+
+        # Symbols added/removed since the last _refresh().
+        self._pending = []
+        self._tombstones = 0
+
+        # Packages (dotted prefixes) ranked first.
+        self.preferred_packages = []
+
+
+    def __len__(self):
+        return len(self.symbols)
+
+
+    def prefer(self, *packages):
+        """Rank symbols in these packages (e.g. 'com.example.app') first."""
+        self.preferred_packages = [package.rstrip('.') + '.' for package in packages]
+
+
+    @staticmethod
+    def _trigram_text(symbol):
+        # Note: A member's owner is already covered by its class symbol, so
+        #       members only index their own name. Keeps the postings small.
+        return symbol.lower if symbol.kind == 'class' else symbol.name_lower
+
+
+    def _add(self, kind, text, name, package, class_id, member_id=None, signature=None):
+        symbol = Symbol(self._next_id, kind, text, name, package, class_id, member_id, signature)
+        self._next_id += 1
+        self.symbols[symbol.symbol_id] = symbol
+        self._by_class.setdefault(class_id, []).append(symbol.symbol_id)
+
+        trigram_text = SymbolIndex._trigram_text(symbol)
+        trigrams = self._trigrams
+        symbol_id = symbol.symbol_id
+        for trigram in {trigram_text[idx:idx + 3] for idx in range(len(trigram_text) - 2)}:
+            postings = trigrams.get(trigram)
+            if postings is None:
+                trigrams[trigram] = {symbol_id}
+            else:
+                postings.add(symbol_id)
+
+        self._pending.append(symbol_id)
+        return symbol
+
+
+    def _remove(self, symbol_id):
+        symbol = self.symbols.pop(symbol_id, None)
+        if symbol is None:
+            return
+        trigram_text = SymbolIndex._trigram_text(symbol)
+        for trigram in {trigram_text[idx:idx + 3] for idx in range(len(trigram_text) - 2)}:
+            postings = self._trigrams.get(trigram)
+            if postings is not None:
+                postings.discard(symbol_id)
+                if not postings:
+                    del self._trigrams[trigram]
+        self._tombstones += 1
+
+
+    def add_class(self, class_info):
+        self.add_class_entry(class_info.typeID, class_info.signature)
+
+
+    def add_class_entry(self, type_id, signature):
+        if type_id in self._by_class or not signature:
+            return
+        text = signature_to_dotted(signature)
+        package, _, name = text.rpartition('.')
+        self._add('class', text, name, package, type_id)
+
+
+    def add_classes(self, entries):
+        """Bulk add from (type_id, signature) pairs, e.g. ClassTable rows."""
+        for type_id, signature in entries:
+            self.add_class_entry(type_id, signature)
+
+
+    def remove_class(self, class_info):
+        """Drop a class and every method/field it contributed."""
+        class_id = class_info.typeID if not isinstance(class_info, int) else class_info
+        for symbol_id in self._by_class.pop(class_id, []):
+            self._remove(symbol_id)
+        self._members_indexed.discard((class_id, 'method'))
+        self._members_indexed.discard((class_id, 'field'))
+
+
+    def _add_members(self, class_info, kind, members):
+        key = (class_info.typeID, kind)
+        if key in self._members_indexed:
+            return
+        self._members_indexed.add(key)
+        if class_info.typeID not in self._by_class:
+            self.add_class(class_info)
+
+        owner = signature_to_dotted(class_info.signature)
+        package = owner.rpartition('.')[0]
+        for member_id, member in members.items():
+            self._add(kind, f'{owner}.{member.name}', member.name, package, class_info.typeID, member_id, member.signature)
+
+
+    def add_methods(self, class_info):
+        self._add_members(class_info, 'method', class_info.methods_by_id)
+
+
+    def add_fields(self, class_info):
+        self._add_members(class_info, 'field', class_info.fields_by_id)
+
+
+    def _rebuild(self):
+        # Both the full name and the simple name are prefix searchable.
+        keyed = []
+        for symbol_id, symbol in self.symbols.items():
+            keyed.append((symbol.lower, symbol_id))
+            if symbol.name_lower != symbol.lower:
+                keyed.append((symbol.name_lower, symbol_id))
+        keyed.sort()
+        self._sorted_keys = [key for key, _ in keyed]
+        self._sorted_ids = [symbol_id for _, symbol_id in keyed]
+
+        self._blob_ids = []
+        self._blob_starts = []
+        self._blob = ''
+        self._append_blob(list(self.symbols.keys()))
+
+        self._tombstones = 0
+
+
+    def _append_blob(self, symbol_ids):
+        lines = []
+        offset = len(self._blob) + 1 if self._blob else 0
+        for symbol_id in symbol_ids:
+            line = self.symbols[symbol_id].lower
+            self._blob_starts.append(offset)
+            self._blob_ids.append(symbol_id)
+            lines.append(line)
+            offset += len(line) + 1
+        if lines:
+            joined = '\n'.join(lines)
+            self._blob = f'{self._blob}\n{joined}' if self._blob else joined
+
+
+    def _refresh(self):
+        pending = [symbol_id for symbol_id in self._pending if symbol_id in self.symbols]
+        self._pending = []
+
+        if len(pending) > 4096 or self._tombstones > 4096 + len(self.symbols) // 4:
+            self._rebuild()
+            return
+
+        for symbol_id in pending:
+            symbol = self.symbols[symbol_id]
+            for key in {symbol.lower, symbol.name_lower}:
+                idx = bisect.bisect_left(self._sorted_keys, key)
+                self._sorted_keys.insert(idx, key)
+                self._sorted_ids.insert(idx, symbol_id)
+        self._append_blob(pending)
+
+
+    def _prefix(self, query, limit):
+        start = bisect.bisect_left(self._sorted_keys, query)
+        end = bisect.bisect_left(self._sorted_keys, query + '\uffff', lo=start)
+        return self._sorted_ids[start:min(end, start + limit)]
+
+
+    def _substring(self, query, limit):
+        postings = [self._trigrams.get(query[idx:idx + 3]) for idx in range(len(query) - 2)]
+        if any(p is None for p in postings):
+            return []
+        postings.sort(key=len)
+        candidates = set(postings[0])
+        for p in postings[1:]:
+            candidates &= p
+            if not candidates:
+                return []
+
+        found = []
+        for symbol_id in candidates:
+            if query in SymbolIndex._trigram_text(self.symbols[symbol_id]):
+                found.append(symbol_id)
+                if len(found) >= limit:
+                    break
+        return found
+
+
+    def _fuzzy(self, query, limit):
+        # Each query char in order on one line. Skipping with [^\nc]*c rather
+        # than .*? leaves the regex only one way to match, so no backtracking.
+        pattern = re.compile(re.escape(query[0]) + ''.join(
+            f'[^\n{re.escape(char)}]*{re.escape(char)}' for char in query[1:]))
+        found = {}
+        for match in pattern.finditer(self._blob):
+            line = bisect.bisect_right(self._blob_starts, match.start()) - 1
+            symbol_id = self._blob_ids[line]
+            span = match.end() - match.start()
+            if symbol_id not in found or span < found[symbol_id]:
+                found[symbol_id] = span
+            if len(found) >= limit:
+                break
+        return found
+
+
+    def _package_rank(self, symbol):
+        text = symbol.text
+        for idx, package in enumerate(self.preferred_packages):
+            if text.startswith(package):
+                return idx
+        if text.startswith(FRAMEWORK_PACKAGES):
+            return len(self.preferred_packages) + 1
+        return len(self.preferred_packages)
+
+
+    def search(self, query: str, limit: int = 20, kinds=None, fuzzy: bool = True):
+        """Find symbols matching query.
+
+          Args:
+            query (str): Dotted name, JVM signature, simple name or fragment.
+            limit (int): Maximum results.
+            kinds: Optional iterable of 'class', 'method', 'field'.
+            fuzzy (bool): Fall back to subsequence matching when needed.
+
+          Returns: List of Symbol(), best match first.
+        """
+        query = signature_to_dotted(query.strip()).replace('/', '.').lower()
+        if not query:
+            return []
+        self._refresh()
+
+        # Over fetch so kind filtering and ranking have something to pick from.
+        want = limit * 4
+        scored = {}
+
+        def consider(symbol_id, quality, span=0):
+            symbol = self.symbols.get(symbol_id)
+            if symbol is None or (kinds and symbol.kind not in kinds):
+                return
+            if symbol_id not in scored or (quality, span) < scored[symbol_id][:2]:
+                scored[symbol_id] = (quality, span, symbol)
+
+        # Note: Prefixes like 'get' hit a huge run of keys, take a wider window for ranking.
+        for symbol_id in self._prefix(query, want * 4):
+            symbol = self.symbols.get(symbol_id)
+            if symbol is None:
+                continue
+            if query in (symbol.lower, symbol.name_lower):
+                consider(symbol_id, MATCH_EXACT)
+            elif symbol.name_lower.startswith(query):
+                consider(symbol_id, MATCH_NAME_PREFIX)
+            else:
+                consider(symbol_id, MATCH_PREFIX)
+
+        if len(scored) < want and len(query) >= 3:
+            for symbol_id in self._substring(query, want):
+                consider(symbol_id, MATCH_SUBSTRING)
+
+        # Note: Long queries are nearly always exact-ish names, skip the blob scan.
+        if len(scored) < want and fuzzy and len(query) <= 24:
+            for symbol_id, span in self._fuzzy(query, want).items():
+                consider(symbol_id, MATCH_FUZZY, span)
+
+        ranked = sorted(scored.values(), key=lambda entry: (
+            entry[0], self._package_rank(entry[2]), entry[1], len(entry[2].text), entry[2].text))
+        return [symbol for _, _, symbol in ranked[:limit]]
+
+
+    def __repr__(self):
+        kinds = {}
+        for symbol in self.symbols.values():
+            kinds[symbol.kind] = kinds.get(symbol.kind, 0) + 1
+        return f'SymbolIndex({kinds.get("class", 0)} classes, {kinds.get("method", 0)} methods, {kinds.get("field", 0)} fields)'
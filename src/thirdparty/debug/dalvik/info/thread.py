@@ -34,35 +34,13 @@ class SlotInfo():
             self.length = slot.length
             self.slot = slot.slot
 
+        # Note: Object values are raw IDs, only good until the next
+        #       ObjectHandles.sweep(), see info/handles.py.
         self.tagged_value = None
 
     def __repr__(self):
         try:
-            tag_map = {
-                Jdwp.Tag.ARRAY: 'Array',
-                Jdwp.Tag.BYTE: 'Byte',
-                Jdwp.Tag.CHAR: 'Char',
-                Jdwp.Tag.OBJECT: 'Object',
-                Jdwp.Tag.FLOAT: 'Float',
-                Jdwp.Tag.DOUBLE: 'Double',
-                Jdwp.Tag.INT: 'Int',
-                Jdwp.Tag.LONG: 'Long',
-                Jdwp.Tag.SHORT: 'Short',
-                Jdwp.Tag.VOID: 'Void',
-                Jdwp.Tag.BOOLEAN: 'Boolean',
-                Jdwp.Tag.STRING: 'String',
-                Jdwp.Tag.THREAD: 'Thread',
-                Jdwp.Tag.THREAD_GROUP: 'ThreadGroup',
-                Jdwp.Tag.CLASS_LOADER: 'ClassLoader',
-                Jdwp.Tag.CLASS_OBJECT: 'ClassObject',
-            }
-
-
-            type_str = 'Unknown'
-            if self.tagged_value.tag in tag_map:
-                type_str = tag_map[self.tagged_value.tag]
-            
-            return f"{type_str}({self.tagged_value.value})"
+            return self.dbg.value_str(self.tagged_value)
         except:
             return "SlotInfo(ERROR)"
     
@@ -206,8 +184,8 @@ class FrameInfo():
                 self._slots[slot_idx].sigbyte = sigbyte
                 self._slots[slot_idx].tagged_value = getvalues_reply.values[0]
 
-
-        
+        # One batch for every string local so __repr__ can inline them.
+        await self.dbg.prefetch_strings([slot.tagged_value for slot in self._slots.values()])
         return self
 
 
@@ -260,11 +238,22 @@ class ThreadInfo():
         self._event_composite = None
         self._event_args = None
 
+        # state.vm_epoch of the last load(), frames are stale once it moves on.
+        # None until loaded, and again once this thread is resumed.
+        self.loaded_epoch = None
+
 
     def event_args(self, event, composite, args):
         self._event = event
         self._event_composite = composite
         self._event_args = args
+        self.dbg.state.version += 1
+
+
+    @property
+    def stopped(self):
+        """True while the frames from the last load() are current."""
+        return self.loaded_epoch is not None and self.loaded_epoch == self.dbg.state.vm_epoch
 
 
     # Run this on breakpoint.
@@ -284,6 +273,8 @@ class ThreadInfo():
         for frame in frames_reply.frames:
             self._frames.append(await FrameInfo(frame, self).load())
 
+        self.loaded_epoch = self.dbg.state.vm_epoch
+        self.dbg.state.version += 1
         return self
 
     def frames(self):
@@ -1,59 +1,55 @@
-from ppadb.client import Client as AdbClient
+from thirdparty.debug.dalvik.util.asyncadb import AsyncAdb, AdbError
 
 class AdbObject():
-    
-    def target(self, tgt_pkg, device_name='emulator-5554'):
+
+    def __init__(self, host='127.0.0.1', port=5037):
+        self.client = AsyncAdb(host, port)
+        self.device = None
+        self.tgt_pkg = None
+        self.proc_pid = None
+        self.api = None
+        # Handshaken (reader, writer) for Debugger.start(connection=...).
+        self.jdwp_connection = None
+
+
+    async def target(self, tgt_pkg, device_name=None, port=8700, timeout=30):
+        """Launch tgt_pkg waiting for a debugger and forward its JDWP to tcp:port.
+
+        Returns once the app answers the JDWP handshake on 127.0.0.1:port, see
+        util/asyncadb.py. device_name defaults to the first online device.
+        """
         self.tgt_pkg = tgt_pkg
-        self.client = AdbClient(host="127.0.0.1", port=5037)
         # Connection sanity.
-        print(f'ADB Client Version: {self.client.version()}')
+        print(f'ADB Server Version: {await self.client.version()}')
+        if device_name is None:
+            online = [serial for serial, state in await self.client.devices() if state == 'device']
+            if not online:
+                print("No device found.")
+                exit(1)
+            device_name = online[0]
         self.device = self.client.device(device_name)
+        self.api = await self.device.sdk_level()
 
-        # Configure the tgt_pkg to wait for debugger on start.
-        cmd = f'am set-debug-app -w {self.tgt_pkg}'
-        print(cmd)
-        print(self.device.shell(cmd))
-
-        # Get the main activity name. (Note: This is a bit wonky.)
-        cmd = f'cmd package resolve-activity -c android.intent.category.LAUNCHER {self.tgt_pkg}'
-        print(cmd)
-        pkg_act_info = self.device.shell(cmd)
-
-        import re
-        # Get text following "name=" until end of line.
-        pattern = re.compile(r'(?<=name=)\S+')
-        matches = []
-        for line in pkg_act_info.split('\n'):
-            found = pattern.findall(line)
-            matches.extend(found)
-        #print(matches)
-        
-        pkg_main_act = matches[0].replace(self.tgt_pkg, f'{self.tgt_pkg}/')
-        print(pkg_main_act)
-
-        # Start the tgt_pkg's main activity.
-        cmd = f'am start -n {pkg_main_act}'
-        print(cmd)
-        self.device.shell(cmd)
-
-        import time
-        time.sleep(0.5)
-
-        # Get the process id (PID) of the running tgt_pkg.
-        adb_procs = self.device.shell(f'ps -A')
-        self.proc_pid = None
-        for proc in adb_procs.split('\n'):
-            if proc.find(self.tgt_pkg) < 0:
-                continue
-            self.proc_pid = int(proc.split()[1])
-            break
-        if not self.proc_pid:
+        try:
+            self.proc_pid, self.jdwp_connection = await self.device.attach(tgt_pkg, port=port, timeout=timeout)
+        except AdbError as e:
+            print(f"ERROR: {e}")
             print("Target process not found.")
             exit(1)
-        
-        # Port forward internal JDWP port (same as PID) to localhost:8700
-        cmd = f'adb forward tcp:8700 jdwp:{self.proc_pid}'
-        print(cmd)
-        self.device.forward('tcp:8700', f'jdwp:{self.proc_pid}')
 
-        time.sleep(3)
\ No newline at end of file
+
+    async def package_identity(self, tgt_pkg=None):
+        """Build identity of an installed package, for util.cache.MetadataCache.
+
+        Changes whenever the APK (i.e. its dex files) is reinstalled or updated,
+        or the system image is (framework classes are cached too).
+        """
+        return await self.device.package_identity(tgt_pkg or self.tgt_pkg)
+
+
+    def sdk_level(self):
+        """Android API level of the device (ro.build.version.sdk), e.g. 33.
+
+        Note: Read once by target(), so this can be called from sync code (e.g. NativeObject.connect()).
+        """
+        return self.api
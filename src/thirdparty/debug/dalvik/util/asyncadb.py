@@ -0,0 +1,528 @@
+import asyncio
+import re
+import time
+
+'''
+asyncio ADB client, talking the adb server's smart socket protocol
+(see SERVICES.TXT/protocol.txt in adb's sources) directly.
+
+ppadb is blocking, so AdbObject.target() used to stall the event loop and
+then guess when the app was ready (ps -A after a 0.5s sleep, 3s more before
+attaching). Here:
+
+  - Each request is a socket to the server: a 4 hex digit length and the
+    service name, answered with OKAY or FAIL (FAIL carries a length
+    prefixed message). host:* services talk to the server,
+    host:transport:<serial> switches the socket to a device so the next
+    service (shell:, track-jdwp, jdwp:<pid>) goes to that device's adbd.
+  - track-jdwp streams the debuggable PIDs (length prefixed, one per line)
+    every time the set changes. AdbDevice.attach() opens it *before*
+    am start, so the new PID shows up as soon as the VM registers with adbd.
+  - After forwarding, wait_for_jdwp() probes the local port for the JDWP
+    handshake instead of sleeping. adbd accepts the connection before the
+    VM answers, so a probe that fails just gets retried.
+  - The probe's connection is handed back (already handshaken) so the
+    debugger can carry on with it, see Jdwp.start(connection=...). Closing
+    it would count as the debugger detaching from an app started with -w.
+
+    adb = AsyncAdb()
+    pid, connection = await adb.device('emulator-5554').attach('sh.kau.playground', port=8700)
+    await dbg.start('127.0.0.1', 8700, connection=connection)
+
+Devices are independent sockets, so several attach concurrently, see
+attach_devices(). FakeAdbServer is a stand-in adb server (with fake apps
+that only do the JDWP handshake) for trying this without a device.
+'''
+
+
+JDWP_HANDSHAKE = b'JDWP-Handshake'
+
+
+class AdbError(RuntimeError):
+    pass
+
+
+async def _read_status(reader):
+    status = await reader.readexactly(4)
+    if status == b'OKAY':
+        return
+    if status == b'FAIL':
+        raise AdbError((await _read_block(reader)).decode(errors='replace'))
+    raise AdbError(f"Unexpected adb status: {status!r}")
+
+
+async def _read_block(reader):
+    length = int(await reader.readexactly(4), 16)
+    return await reader.readexactly(length)
+
+
+def _encode(payload):
+    payload = payload.encode() if isinstance(payload, str) else payload
+    return f'{len(payload):04x}'.encode() + payload
+
+
+class AsyncAdb():
+
+    def __init__(self, host='127.0.0.1', port=5037):
+        self.host = host
+        self.port = port
+
+
+    async def open(self, service):
+        """Connect and request service.
+
+          Returns: (reader, writer), positioned after the OKAY.
+        """
+        reader, writer = await asyncio.open_connection(self.host, self.port)
+        try:
+            writer.write(_encode(service))
+            await writer.drain()
+            await _read_status(reader)
+        except BaseException:
+            writer.close()
+            raise
+        return reader, writer
+
+
+    async def query(self, service):
+        """Run a host service that answers with one length prefixed block."""
+        reader, writer = await self.open(service)
+        try:
+            return (await _read_block(reader)).decode()
+        finally:
+            writer.close()
+
+
+    async def version(self):
+        return int(await self.query('host:version'), 16)
+
+
+    async def devices(self):
+        """Returns: [(serial, state), ...], e.g. ('emulator-5554', 'device')"""
+        return _parse_devices(await self.query('host:devices'))
+
+
+    async def track_devices(self):
+        """Yields [(serial, state), ...] now and whenever it changes."""
+        reader, writer = await self.open('host:track-devices')
+        try:
+            while True:
+                yield _parse_devices((await _read_block(reader)).decode())
+        except asyncio.IncompleteReadError:
+            return
+        finally:
+            writer.close()
+
+
+    def device(self, serial):
+        return AdbDevice(self, serial)
+
+
+def _parse_devices(text):
+    return [tuple(line.split('\t', 1)) for line in text.splitlines() if '\t' in line]
+
+
+class AdbDevice():
+
+    def __init__(self, adb, serial):
+        self.adb = adb
+        self.serial = serial
+
+
+    def __repr__(self):
+        return f'AdbDevice({self.serial})'
+
+
+    async def open(self, service):
+        """Open service (e.g. 'shell:ls', 'jdwp:1234') on this device."""
+        reader, writer = await self.adb.open(f'host:transport:{self.serial}')
+        try:
+            writer.write(_encode(service))
+            await writer.drain()
+            await _read_status(reader)
+        except BaseException:
+            writer.close()
+            raise
+        return reader, writer
+
+
+    async def shell(self, cmd):
+        reader, writer = await self.open(f'shell:{cmd}')
+        try:
+            return (await reader.read()).decode(errors='replace')
+        finally:
+            writer.close()
+
+
+    async def sdk_level(self):
+        """Android API level of the device (ro.build.version.sdk), e.g. 33."""
+        return int((await self.shell('getprop ro.build.version.sdk')).strip())
+
+
+    async def package_identity(self, tgt_pkg):
+        """Build identity of an installed package, for util.cache.MetadataCache.
+
+          Note: The cache also holds framework classes, so the system build
+                (ro.build.fingerprint) is part of it, an OTA invalidates too.
+        """
+        info = await self.shell(f'dumpsys package {tgt_pkg}')
+        version = re.search(r'versionCode=(\d+)', info)
+        updated = re.search(r'lastUpdateTime=(.+)', info)
+        fingerprint = (await self.shell('getprop ro.build.fingerprint')).strip()
+        return ':'.join([
+            tgt_pkg,
+            version.group(1) if version else '?',
+            updated.group(1).strip() if updated else '?',
+            fingerprint or '?',
+        ])
+
+
+    async def process_name(self, pid):
+        cmdline = await self.shell(f'cat /proc/{pid}/cmdline')
+        return cmdline.split('\0', 1)[0].strip()
+
+
+    async def track_jdwp(self):
+        """Yields the set of debuggable PIDs now and whenever it changes."""
+        reader, writer = await self.open('track-jdwp')
+        try:
+            while True:
+                yield {int(pid) for pid in (await _read_block(reader)).split()}
+        except asyncio.IncompleteReadError:
+            return
+        finally:
+            writer.close()
+
+
+    async def forward(self, local, remote, norebind=False):
+        """e.g. forward('tcp:8700', 'jdwp:1234')"""
+        options = 'norebind:' if norebind else ''
+        reader, writer = await self.adb.open(f'host-serial:{self.serial}:forward:{options}{local};{remote}')
+        try:
+            # Note: The server answers OKAY once for the transport and once for the forward.
+            rest = await reader.read()
+            if rest.startswith(b'FAIL'):
+                raise AdbError(rest[8:].decode(errors='replace'))
+        finally:
+            writer.close()
+
+
+    async def main_activity(self, tgt_pkg):
+        """Launcher activity as pkg/.Activity, or None."""
+        info = await self.shell(f'cmd package resolve-activity -c android.intent.category.LAUNCHER {tgt_pkg}')
+        for line in info.split('\n'):
+            line = line.strip()
+            if line.startswith('name='):
+                return line.split('=', 1)[1].replace(tgt_pkg, f'{tgt_pkg}/', 1)
+        return None
+
+
+    async def attach(self, tgt_pkg, port=8700, host='127.0.0.1', timeout=30, log=print):
+        """Start tgt_pkg waiting for a debugger and get it ready on host:port.
+
+          Args:
+            tgt_pkg (str): Package to launch.
+            port (int): Local port to forward the app's JDWP to.
+            timeout (float): Seconds to wait for the PID and the handshake (each).
+            log (callable): Progress messages, None for quiet.
+
+          Returns:
+            (pid, (reader, writer)) with the JDWP handshake already done.
+        """
+        log = log or (lambda *args: None)
+        log(f'[{self.serial}] am set-debug-app -w {tgt_pkg}')
+        await self.shell(f'am set-debug-app -w {tgt_pkg}')
+        activity = await self.main_activity(tgt_pkg)
+        if activity is None:
+            raise AdbError(f"No launcher activity for {tgt_pkg}.")
+
+        # Note: Tracking starts before am start, so the first update is what
+        #       was already there and anything after that is new. -S force
+        #       stops an already running tgt_pkg, otherwise am start just
+        #       brings it to the front and no new PID ever shows up.
+        tracker = self.track_jdwp()
+        try:
+            known = await tracker.__anext__()
+            log(f'[{self.serial}] am start -S -n {activity}')
+            await self.shell(f'am start -S -n {activity}')
+            pid = await asyncio.wait_for(self._wait_for_pid(tracker, known, tgt_pkg), timeout)
+        except asyncio.TimeoutError:
+            raise AdbError(f"{tgt_pkg} didn't show up in track-jdwp within {timeout}s.")
+        finally:
+            await tracker.aclose()
+
+        log(f'[{self.serial}] adb forward tcp:{port} jdwp:{pid}')
+        await self.forward(f'tcp:{port}', f'jdwp:{pid}')
+        connection = await wait_for_jdwp(host, port, timeout)
+        log(f'[{self.serial}] JDWP ready on {host}:{port} (pid {pid})')
+        return pid, connection
+
+
+    async def _wait_for_pid(self, tracker, known, tgt_pkg):
+        pending = set()
+        async for pids in tracker:
+            pending |= pids - known
+            known |= pids
+            while pending:
+                for pid in sorted(pending):
+                    name = await self.process_name(pid)
+                    if name == tgt_pkg:
+                        return pid
+                    if name and name != '<pre-initialized>':
+                        # Some other debuggable app.
+                        pending.discard(pid)
+                if pending:
+                    # Note: Freshly forked processes can still have zygote's name, give them a moment.
+                    await asyncio.sleep(0.05)
+        raise AdbError("track-jdwp closed.")
+
+
+async def wait_for_jdwp(host, port, timeout=30, interval=0.05):
+    """Connect to host:port until the JDWP handshake succeeds.
+
+      Returns: (reader, writer) after the handshake.
+    """
+    deadline = time.monotonic() + timeout
+    while True:
+        writer = None
+        try:
+            reader, writer = await asyncio.open_connection(host, port)
+            writer.write(JDWP_HANDSHAKE)
+            await writer.drain()
+            resp = await asyncio.wait_for(reader.readexactly(len(JDWP_HANDSHAKE)), max(deadline - time.monotonic(), interval))
+            if resp == JDWP_HANDSHAKE:
+                return reader, writer
+        except (OSError, asyncio.IncompleteReadError, asyncio.TimeoutError):
+            pass
+        if writer is not None:
+            writer.close()
+        if time.monotonic() >= deadline:
+            raise AdbError(f"No JDWP handshake on {host}:{port} within {timeout}s.")
+        await asyncio.sleep(interval)
+
+
+async def attach_devices(adb, tgt_pkg, serials=None, port=8700, timeout=30, log=print):
+    """attach() tgt_pkg on several devices at once, forwarding to port, port + 1, ...
+
+      Returns: {serial: (pid, connection) or the exception raised}
+    """
+    if serials is None:
+        serials = [serial for serial, state in await adb.devices() if state == 'device']
+    results = await asyncio.gather(*[
+        adb.device(serial).attach(tgt_pkg, port=port + idx, timeout=timeout, log=log)
+        for idx, serial in enumerate(serials)], return_exceptions=True)
+    return dict(zip(serials, results))
+
+
+class FakeDevice():
+    """A device for FakeAdbServer: getprop, am, resolve-activity, dumpsys and /proc/<pid>/cmdline."""
+
+    def __init__(self, serial, sdk=33, packages=None, start_delay=0.1, jdwp_delay=0.2):
+        """
+          Args:
+            packages (dict): package -> launcher activity class name.
+            start_delay (float): am start -> PID shows up in track-jdwp.
+            jdwp_delay (float): PID shows up -> VM answers the handshake.
+        """
+        self.serial = serial
+        self.sdk = sdk
+        self.packages = packages or {}
+        self.start_delay = start_delay
+        self.jdwp_delay = jdwp_delay
+        self.procs = {}
+        self.ready = set()
+        self.next_pid = 4000
+        self.trackers = []
+        self.debug_app = None
+
+
+    def spawn(self, name):
+        pid = self.next_pid
+        self.next_pid += 1
+        self.procs[pid] = name
+        for queue in self.trackers:
+            queue.put_nowait(set(self.procs))
+        asyncio.get_running_loop().call_later(self.jdwp_delay, self.ready.add, pid)
+        return pid
+
+
+    def kill(self, name):
+        for pid in [pid for pid, proc_name in self.procs.items() if proc_name == name]:
+            del self.procs[pid]
+            self.ready.discard(pid)
+        for queue in self.trackers:
+            queue.put_nowait(set(self.procs))
+
+
+    def shell(self, cmd):
+        argv = cmd.split()
+        if argv[:1] == ['getprop'] and argv[1:] == ['ro.build.version.sdk']:
+            return f'{self.sdk}\n'
+        if argv[:1] == ['getprop'] and argv[1:] == ['ro.build.fingerprint']:
+            return f'fake/{self.serial}/fake:{self.sdk}/FAKE/1:userdebug/test-keys\n'
+        if argv[:3] == ['am', 'set-debug-app', '-w']:
+            self.debug_app = argv[3]
+            return ''
+        if argv[:3] == ['cmd', 'package', 'resolve-activity']:
+            pkg = argv[-1]
+            if pkg not in self.packages:
+                return 'No activity found\n'
+            return f'  packageName={pkg}\n  name={pkg}.{self.packages[pkg]}\n'
+        if argv[:2] == ['am', 'start'] and argv[-2] == '-n':
+            pkg = argv[-1].split('/', 1)[0]
+            if '-S' in argv:
+                self.kill(pkg)
+            elif pkg in self.procs.values():
+                # Already running, brought to the front.
+                return f'Warning: Activity not started, its current task has been brought to the front\n'
+            asyncio.get_running_loop().call_later(self.start_delay, self.spawn, pkg)
+            return f'Starting: Intent {{ cmp={argv[-1]} }}\n'
+        if argv[:2] == ['dumpsys', 'package']:
+            return '    versionCode=1 minSdk=24 targetSdk=33\n    lastUpdateTime=2025-01-01 00:00:00\n'
+        match = re.fullmatch(r'cat /proc/(\d+)/cmdline', cmd)
+        if match:
+            name = self.procs.get(int(match.group(1)))
+            return f'{name}\0' if name else ''
+        return ''
+
+
+class FakeAdbServer():
+    """Stand-in adb server for FakeDevices, e.g. for trying AsyncAdb without a device.
+
+        async with FakeAdbServer([FakeDevice('emulator-5554', packages={'com.example': 'MainActivity'})]) as server:
+            adb = AsyncAdb(port=server.port)
+    """
+
+    def __init__(self, devices, host='127.0.0.1', port=0):
+        self.devices = {device.serial: device for device in devices}
+        self.host = host
+        self.port = port
+        self.server = None
+        self.forwards = {}
+        # Open client connections (writer -> handler task), closed by close().
+        self.clients = {}
+
+
+    async def __aenter__(self):
+        return await self.start()
+
+
+    async def __aexit__(self, *exc):
+        await self.close()
+
+
+    async def start(self):
+        self.server = await asyncio.start_server(self._client, self.host, self.port)
+        self.port = self.server.sockets[0].getsockname()[1]
+        return self
+
+
+    async def close(self):
+        for device in self.devices.values():
+            for queue in device.trackers:
+                queue.put_nowait(None)
+        clients = list(self.clients.items())
+        for writer, _ in clients:
+            writer.close()
+        await asyncio.gather(*[task for _, task in clients], return_exceptions=True)
+        servers = [self.server, *self.forwards.values()]
+        self.forwards = {}
+        for server in servers:
+            server.close()
+            await server.wait_closed()
+
+
+    async def _client(self, reader, writer):
+        self.clients[writer] = asyncio.current_task()
+        try:
+            service = (await _read_block(reader)).decode()
+            device = None
+            if service.startswith('host:transport:'):
+                device = self.devices.get(service.split(':', 2)[2])
+                if device is None:
+                    return await self._fail(writer, 'device not found')
+                writer.write(b'OKAY')
+                service = (await _read_block(reader)).decode()
+            await self._service(device, service, reader, writer)
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            self.clients.pop(writer, None)
+            writer.close()
+
+
+    async def _fail(self, writer, message):
+        writer.write(b'FAIL' + _encode(message))
+        await writer.drain()
+
+
+    async def _service(self, device, service, reader, writer):
+        if service == 'host:version':
+            writer.write(b'OKAY' + _encode('0029'))
+        elif service == 'host:devices':
+            writer.write(b'OKAY' + _encode(''.join(f'{serial}\tdevice\n' for serial in self.devices)))
+        elif service.startswith('host-serial:') and ':forward:' in service:
+            serial, spec = service[len('host-serial:'):].split(':forward:', 1)
+            if serial not in self.devices:
+                return await self._fail(writer, 'device not found')
+            local, remote = spec.split('norebind:')[-1].split(';', 1)
+            await self._forward(self.devices[serial], int(local.split(':')[1]), int(remote.split(':')[1]))
+            writer.write(b'OKAYOKAY')
+        elif device is not None and service.startswith('shell:'):
+            writer.write(b'OKAY' + device.shell(service[len('shell:'):]).encode())
+        elif device is not None and service == 'track-jdwp':
+            queue = asyncio.Queue()
+            queue.put_nowait(set(device.procs))
+            device.trackers.append(queue)
+            writer.write(b'OKAY')
+            # Stop once the client hangs up (or close() sends None).
+            eof = asyncio.ensure_future(reader.read())
+            try:
+                while True:
+                    get = asyncio.ensure_future(queue.get())
+                    await asyncio.wait({get, eof}, return_when=asyncio.FIRST_COMPLETED)
+                    if not get.done():
+                        get.cancel()
+                        break
+                    pids = get.result()
+                    if pids is None:
+                        break
+                    writer.write(_encode(''.join(f'{pid}\n' for pid in sorted(pids))))
+                    await writer.drain()
+            finally:
+                eof.cancel()
+                device.trackers.remove(queue)
+        elif device is not None and service.startswith('jdwp:'):
+            writer.write(b'OKAY')
+            await self._jdwp(device, int(service[len('jdwp:'):]), reader, writer)
+        else:
+            await self._fail(writer, f'unknown service {service}')
+        await writer.drain()
+
+
+    async def _forward(self, device, local, pid):
+        if local in self.forwards:
+            self.forwards.pop(local).close()
+
+        async def accept(reader, writer):
+            self.clients[writer] = asyncio.current_task()
+            try:
+                await self._jdwp(device, pid, reader, writer)
+            except (asyncio.IncompleteReadError, ConnectionError):
+                pass
+            finally:
+                self.clients.pop(writer, None)
+                writer.close()
+        self.forwards[local] = await asyncio.start_server(accept, self.host, local)
+
+
+    async def _jdwp(self, device, pid, reader, writer):
+        # Like adbd, drop the connection if the VM isn't there (yet).
+        if pid not in device.ready:
+            return
+        if await reader.readexactly(len(JDWP_HANDSHAKE)) != JDWP_HANDSHAKE:
+            return
+        writer.write(JDWP_HANDSHAKE)
+        await writer.drain()
+        # Note: No actual VM, hold the connection until the other end goes away.
+        await reader.read()
@@ -12,7 +12,7 @@ async def parse_dex_header(dbg, native, event):
     dexFileTValue = dexCache.field_value('Ljava/lang/DexCache;', 'dexFile')
     #print(dexFileTValue)
 
-    headerRes = native.rpc.fetch_dex_header(dexFileTValue.value)
+    headerRes = await native.memory.call('fetch_dex_header', dexFileTValue.value)
     
     #headerRes['addr']
     #headerRes['size']
@@ -29,16 +29,15 @@ async def parse_vregs(dbg, native, thread_info):
     # Get nativePeer pointer.
     nativePeer = nativePeerTValue.value
     
-    # Using nativePeer, get the vregs (for Android 13)
-    return native.rpc.dump_vregs(nativePeer)
+    # Using nativePeer, get the vregs of every shadow frame (ShadowStackInfo).
+    return await native.dump_shadow_frames(nativePeer)
 
 
-def print_vregs(vregs):
+def print_vregs(stack):
     # Dump results.
-    print(f'dex_pc: {vregs['dex_pc']}')
-    for i in range(vregs['vreg_cnt']):
-        reg = f'raw_v{i}'
-        print(f"{reg}: {vregs[reg]:8x}")
-    for i in range(vregs['vreg_cnt']):
-        reg = f'ref_v{i}'
-        print(f"{reg}: {vregs[reg]:8x}")
\ No newline at end of file
+    for idx, frame in enumerate(stack):
+        print(f"frame {idx}: dex_pc: {frame.dex_pc}")
+        for i in range(len(frame)):
+            print(f"raw_v{i}: {frame.vregs[i]:8x}")
+        for i in range(len(frame)):
+            print(f"ref_v{i}: {frame.refs[i]:8x}")
@@ -0,0 +1,105 @@
+import sqlite3
+
+'''
+On disk cache for class metadata that doesn't change while an app build
+doesn't change (line tables, bytecode and its disassembly, ...).
+
+Rows are keyed by class signature, method name and method signature rather
+than JDWP IDs, since IDs are only good for one session. identity names the
+dex files the rows came from (e.g. AdbObject.package_identity()), so a new
+install doesn't read stale rows. Without an identity nothing is read or
+written, since there'd be no telling builds apart.
+'''
+
+
+class MetadataCache():
+
+    def __init__(self, path, identity: str = ''):
+        self.path = path
+        self.identity = identity
+        self.db = sqlite3.connect(path)
+        self.db.execute('''
+            CREATE TABLE IF NOT EXISTS line_tables (
+                identity TEXT NOT NULL,
+                class_signature TEXT NOT NULL,
+                method_name TEXT NOT NULL,
+                method_signature TEXT NOT NULL,
+                start INTEGER NOT NULL,
+                end INTEGER NOT NULL,
+                data BLOB NOT NULL,
+                PRIMARY KEY (identity, class_signature, method_name, method_signature))''')
+        self.db.execute('''
+            CREATE TABLE IF NOT EXISTS bytecode (
+                identity TEXT NOT NULL,
+                class_signature TEXT NOT NULL,
+                method_name TEXT NOT NULL,
+                method_signature TEXT NOT NULL,
+                bytecode BLOB NOT NULL,
+                offsets BLOB,
+                disassembly TEXT,
+                PRIMARY KEY (identity, class_signature, method_name, method_signature))''')
+        self.db.commit()
+
+
+    def get_line_table(self, class_signature, method_name, method_signature):
+        """Returns: LineTableInfo() or None if not cached."""
+        from thirdparty.debug.dalvik.info.lines import LineTableInfo
+
+        if not self.identity:
+            return None
+        row = self.db.execute(
+            'SELECT start, end, data FROM line_tables WHERE identity=? AND class_signature=? '
+            'AND method_name=? AND method_signature=?',
+            (self.identity, class_signature, method_name, method_signature)).fetchone()
+        if row is None:
+            return None
+        return LineTableInfo.from_bytes(row[0], row[1], row[2])
+
+
+    def put_line_table(self, class_signature, method_name, method_signature, line_table, commit=True):
+        if not self.identity:
+            return
+        self.db.execute(
+            'INSERT OR REPLACE INTO line_tables VALUES (?, ?, ?, ?, ?, ?, ?)',
+            (self.identity, class_signature, method_name, method_signature,
+             line_table.start, line_table.end, line_table.to_bytes()))
+        if commit:
+            self.db.commit()
+
+
+    def get_bytecode(self, class_signature, method_name, method_signature):
+        """Returns: (bytecode, offsets blob, disassembly text) or None if not cached.
+                   The last two are None if the method was never disassembled."""
+        if not self.identity:
+            return None
+        return self.db.execute(
+            'SELECT bytecode, offsets, disassembly FROM bytecode WHERE identity=? AND class_signature=? '
+            'AND method_name=? AND method_signature=?',
+            (self.identity, class_signature, method_name, method_signature)).fetchone()
+
+
+    def put_bytecode(self, class_signature, method_name, method_signature, bytecode, offsets=None, disassembly=None):
+        if not self.identity:
+            return
+        self.db.execute(
+            'INSERT OR REPLACE INTO bytecode VALUES (?, ?, ?, ?, ?, ?, ?)',
+            (self.identity, class_signature, method_name, method_signature,
+             bytes(bytecode), offsets, disassembly))
+        self.db.commit()
+
+
+    def commit(self):
+        self.db.commit()
+
+
+    def close(self):
+        self.db.close()
+
+
+    def __repr__(self):
+        try:
+            lines, = self.db.execute('SELECT COUNT(*) FROM line_tables WHERE identity=?', (self.identity,)).fetchone()
+            methods, = self.db.execute('SELECT COUNT(*) FROM bytecode WHERE identity=?', (self.identity,)).fetchone()
+            return f'MetadataCache({self.path}, {self.identity!r}, {lines} line tables, {methods} methods)'
+        except Exception as e:
+            return f"MetadataCache(ERROR: {e})"
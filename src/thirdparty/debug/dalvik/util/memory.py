@@ -0,0 +1,274 @@
+import asyncio
+import struct
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+'''
+Async, paged and cached reads of target memory through the Frida RPC.
+
+NativeObject.rpc (frida exports_sync) blocks, calling it from a breakpoint
+handler stalls the whole event loop for a round trip per read. NativeMemory
+runs RPCs on a small thread pool and caches what it reads in page aligned
+chunks (LRU, max_pages):
+
+  - A read only fetches the pages it's missing. Missing pages are merged
+    into contiguous runs (bridging gaps of up to gap_pages) and each run is
+    one `read` RPC, so walking a struct or a shadow frame field by field
+    costs a round trip or two rather than one per field. read_many() does
+    the same across a batch of reads.
+  - Concurrent reads of the same page share one fetch.
+  - Unreadable pages are remembered (as None) so they aren't retried.
+
+Memory only holds still while the target is stopped. Pages are tagged with
+epoch(), normally Debugger.suspend_epoch which every resume through the
+Debugger bumps, and are dropped as soon as it changes. Reads made while
+threads run (e.g. from a SUSPEND_EVENT_THREAD handler) should pass
+cache=False.
+
+LocalRpc stands in for the Frida RPC over a local buffer with a fixed per
+call latency, for tests and native-memory-bench.py.
+'''
+
+
+class NativeMemory():
+
+    def __init__(self, rpc, epoch=None, page_size=4096, max_pages=2048, gap_pages=1, workers=4):
+        self.rpc = rpc
+        self.epoch = epoch or (lambda: 0)
+        self.page_size = page_size
+        self.max_pages = max_pages
+        self.gap_pages = gap_pages
+        self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='native-rpc')
+
+        # page number -> bytes (None for unreadable), oldest first.
+        self.pages = OrderedDict()
+        # page number -> Future of the run fetching it.
+        self.inflight = {}
+        self.pages_epoch = None
+
+        self.rpc_calls = 0
+        self.hits = 0
+        self.misses = 0
+
+
+    async def call(self, name, *args):
+        """Run any RPC export (e.g. 'dump_shadow_frames') off the event loop."""
+        self.rpc_calls += 1
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self.executor, getattr(self.rpc, name), *args)
+
+
+    def invalidate(self):
+        self.pages.clear()
+        # Note: Fetches still running hand their pages to whoever waits on them,
+        #       but new reads don't join them.
+        self.inflight = {}
+        self.pages_epoch = self.epoch()
+
+
+    def _check_epoch(self):
+        if self.pages_epoch != self.epoch():
+            self.invalidate()
+
+
+    async def read(self, addr, size, cache=True):
+        """Read size bytes at addr.
+
+          Returns: bytes or None if any of it is unreadable.
+        """
+        if size <= 0:
+            return b''
+        if not cache:
+            data = await self._read_rpc(addr, size)
+            if data is None:
+                print(f"ERROR: Failed to read {size} bytes at {addr:#x}")
+            return data
+        self._check_epoch()
+        first, last = self._page_span(addr, size)
+        pages = await self._get_pages(range(first, last + 1))
+        return self._assemble(addr, size, pages)
+
+
+    async def read_many(self, ranges):
+        """Read a batch of (addr, size), fetching all the missing pages in one go.
+
+          Returns: List of bytes (or None per unreadable range).
+        """
+        self._check_epoch()
+        wanted = set()
+        for addr, size in ranges:
+            if size > 0:
+                first, last = self._page_span(addr, size)
+                wanted.update(range(first, last + 1))
+        pages = await self._get_pages(wanted)
+        return [self._assemble(addr, size, pages) if size > 0 else b'' for addr, size in ranges]
+
+
+    async def read_struct(self, fmt, addr, cache=True):
+        """struct.unpack_from(fmt) at addr, None if unreadable."""
+        data = await self.read(addr, struct.calcsize(fmt), cache)
+        return None if data is None else struct.unpack(fmt, data)
+
+
+    async def read_u32(self, addr, cache=True):
+        values = await self.read_struct('<I', addr, cache)
+        return None if values is None else values[0]
+
+
+    async def read_u64(self, addr, cache=True):
+        values = await self.read_struct('<Q', addr, cache)
+        return None if values is None else values[0]
+
+
+    # Note: 64 bit targets only, like the rest of the native code.
+    read_pointer = read_u64
+
+
+    def _page_span(self, addr, size):
+        return addr // self.page_size, (addr + size - 1) // self.page_size
+
+
+    def _assemble(self, addr, size, pages):
+        first, last = self._page_span(addr, size)
+        chunks = []
+        for page in range(first, last + 1):
+            data = pages.get(page)
+            if data is None:
+                print(f"ERROR: Failed to read {size} bytes at {addr:#x}")
+                return None
+            chunks.append(data)
+        start = addr - first * self.page_size
+        if len(chunks) == 1:
+            return chunks[0][start:start + size]
+        return b''.join(chunks)[start:start + size]
+
+
+    async def _read_rpc(self, addr, size):
+        try:
+            data = await self.call('read', addr, size)
+        except Exception:
+            # Frida raises on access violations.
+            return None
+        return bytes(data) if data is not None and len(data) == size else None
+
+
+    async def _get_pages(self, wanted):
+        """Returns: {page: bytes or None} for every wanted page.
+
+        Note: Pages come from the cache or straight from the fetch that read
+              them, so a resume (or eviction) mid-read doesn't lose them.
+        """
+        pages = {}
+        missing = []
+        for page in wanted:
+            if page in self.pages:
+                self.pages.move_to_end(page)
+                pages[page] = self.pages[page]
+            else:
+                missing.append(page)
+        if missing:
+            pages.update(await self._fetch(missing))
+        else:
+            self.hits += 1
+        return pages
+
+
+    async def _fetch(self, pages):
+        """Returns: {page: bytes or None}, at least for pages."""
+        self.misses += 1
+        waiting = {self.inflight[page] for page in pages if page in self.inflight}
+        todo = sorted(page for page in pages if page not in self.inflight)
+        if not todo:
+            return _merge(await asyncio.gather(*waiting))
+
+        runs = []
+        for page in todo:
+            if runs and page - runs[-1][1] <= self.gap_pages + 1 and \
+                    all(gap not in self.inflight for gap in range(runs[-1][1] + 1, page)):
+                runs[-1][1] = page
+            else:
+                runs.append([page, page])
+
+        loop = asyncio.get_running_loop()
+        tasks = []
+        for first, last in runs:
+            future = loop.create_future()
+            for page in range(first, last + 1):
+                self.inflight[page] = future
+            tasks.append(self._fetch_run(first, last - first + 1, future))
+        return _merge(await asyncio.gather(*tasks, *waiting))
+
+
+    async def _fetch_run(self, first, count, future):
+        epoch = self.pages_epoch
+        fetched = {page: None for page in range(first, first + count)}
+        try:
+            data = await self._read_rpc(first * self.page_size, count * self.page_size)
+            if data is not None:
+                pages = [data[idx * self.page_size:(idx + 1) * self.page_size] for idx in range(count)]
+            elif count == 1:
+                pages = [None]
+            else:
+                # Part of the run is unmapped, find out which pages by themselves.
+                pages = await asyncio.gather(*[
+                    self._read_rpc(page * self.page_size, self.page_size) for page in range(first, first + count)])
+
+            fetched = {first + idx: data for idx, data in enumerate(pages)}
+
+            # Don't resurrect pages from before a resume.
+            if epoch == self.pages_epoch:
+                for page, data in fetched.items():
+                    self.pages[page] = data
+                    self.pages.move_to_end(page)
+                while len(self.pages) > self.max_pages:
+                    self.pages.popitem(last=False)
+            return fetched
+        finally:
+            for page in range(first, first + count):
+                if self.inflight.get(page) is future:
+                    del self.inflight[page]
+            future.set_result(fetched)
+
+
+    def close(self):
+        self.executor.shutdown(wait=False)
+
+
+    def __repr__(self):
+        try:
+            return (f'NativeMemory({len(self.pages)}/{self.max_pages} pages of {self.page_size}, '
+                    f'{self.rpc_calls} rpc calls, {self.hits} hits, {self.misses} misses)')
+        except Exception as e:
+            return f"NativeMemory(ERROR: {e})"
+
+
+def _merge(dicts):
+    merged = {}
+    for pages in dicts:
+        merged.update(pages)
+    return merged
+
+
+class LocalRpc():
+    """Stand-in for NativeObject.rpc over a local buffer mapped at base."""
+
+    def __init__(self, data, base=0x7000000000, latency=0.0005):
+        self.data = data
+        self.base = base
+        self.latency = latency
+        self.calls = 0
+
+
+    def ping(self):
+        return "pong"
+
+
+    def read(self, addr, size):
+        # Blocking, like frida's exports_sync.
+        self.calls += 1
+        time.sleep(self.latency)
+        offset = addr - self.base
+        if offset < 0 or offset + size > len(self.data):
+            raise ValueError(f"access violation accessing {addr:#x}")
+        return bytes(self.data[offset:offset + size])
@@ -1,4 +1,20 @@
 import frida
+from collections import namedtuple
+from thirdparty.debug.dalvik.util.memory import NativeMemory
+from thirdparty.debug.dalvik.info.shadow import ShadowStackInfo
+
+
+# Offsets into art::Thread (tlsPtr_.managed_stack.top_shadow_frame_) and
+# art::ShadowFrame, per Android API level. See getting-to-vregs.md for how
+# they were found.
+ShadowFrameLayout = namedtuple('ShadowFrameLayout', [
+    'thread_top_shadow_frame', 'link', 'method', 'vreg_count', 'dex_pc', 'vregs'])
+
+SHADOW_FRAME_LAYOUTS = {
+    # Android 13, arm64/x86_64.
+    33: ShadowFrameLayout(thread_top_shadow_frame=0xB8, link=0x00, method=0x08, vreg_count=0x30, dex_pc=0x34, vregs=0x40),
+}
+
 
 class NativeObject():
 
@@ -10,27 +26,37 @@ class NativeObject():
             read: function(addr, size) {
                 return ptr(addr).readByteArray(size);
             },
-            dumpVregs: function(threadAddr) {
-                var artThreadShadowFrameOffset = 0xB8;
-                var artShadowFrameVregOffset = 0x30;
-
-                var frame = ptr(threadAddr + artThreadShadowFrameOffset).readPointer();
-                var vreg_offset = artShadowFrameVregOffset;
-                var vreg_count = frame.add(0x30).readU32();
-                
-                var result = {vreg_cnt: vreg_count};
-                result.dex_pc = frame.add(vreg_offset + 0x4).readU32();
-
-                for (var i = 0; i < vreg_count; ++i) {
-                    var off = vreg_offset + 0x10 + (i * 4);
-                    result[`raw_v${i}`] = frame.add(off).readU32();
-                }
-                for (var i = 0; i < vreg_count; ++i) {
-                    var off = vreg_offset + 0x10 + (vreg_count * 4) + (i * 4);
-                    result[`ref_v${i}`] = frame.add(off).readU32();
+            dumpShadowFrames: function(threadAddr, layout, maxFrames) {
+                // See info/shadow.py for the buffer format.
+                var frames = [];
+                var total = 8;
+                var frame = ptr(threadAddr).add(layout.thread_top_shadow_frame).readPointer();
+                while (!frame.isNull() && frames.length < maxFrames) {
+                    var count = frame.add(layout.vreg_count).readU32();
+                    frames.push([frame, count]);
+                    total += 24 + count * 8;
+                    frame = frame.add(layout.link).readPointer();
                 }
 
-                return result;
+                var out = new Uint8Array(total);
+                var view = new DataView(out.buffer);
+                view.setUint32(0, 0x52464853, true);
+                view.setUint32(4, frames.length, true);
+                var pos = 8;
+                frames.forEach(function(entry) {
+                    var frame = entry[0], count = entry[1];
+                    view.setUint32(pos, frame.and(0xffffffff).toUInt32(), true);
+                    view.setUint32(pos + 4, frame.shr(32).toUInt32(), true);
+                    out.set(new Uint8Array(frame.add(layout.method).readByteArray(8)), pos + 8);
+                    view.setUint32(pos + 16, frame.add(layout.dex_pc).readU32(), true);
+                    view.setUint32(pos + 20, count, true);
+                    if (count > 0) {
+                        // vregs then refs, back to back in the frame.
+                        out.set(new Uint8Array(frame.add(layout.vregs).readByteArray(count * 8)), pos + 24);
+                    }
+                    pos += 24 + count * 8;
+                });
+                return out.buffer;
             },
             fetchDexHeader: function(addr) {
                 var dataPtr = ptr(addr + 8).readPointer();
@@ -84,7 +110,27 @@ class NativeObject():
         };
     """
 
-    def connect(self, adb):
+    def __init__(self):
+        self.rpc = None
+        # Async, cached reads. See util/memory.py
+        self.memory = None
+        self.layout = None
+
+
+    def connect(self, adb, epoch=None, api=None):
+        """Attach to the app process.
+
+          Args:
+            epoch: Callable returning the suspend epoch memory reads are
+                   cached for, e.g. lambda: dbg.suspend_epoch
+            api (int): Android API level, picks the shadow frame layout.
+                       Asked of the device if not given.
+        """
+        api = api or adb.sdk_level()
+        self.layout = SHADOW_FRAME_LAYOUTS.get(api)
+        if self.layout is None:
+            print(f"WARNING: No shadow frame layout for API {api}, vreg dumps unavailable.")
+
         self.device = frida.get_usb_device()
         self.session = self.device.attach(adb.proc_pid)
         if self.session:
@@ -93,5 +139,25 @@ class NativeObject():
             self.script.on("message", lambda msg, data: print("FRIDA MESSAGE:", msg, data))
             self.script.load()
             self.rpc = self.script.exports_sync
+            self.memory = NativeMemory(self.rpc, epoch)
+
+            #print("ping -> ", self.rpc.ping())
+
+
+    async def dump_shadow_frames(self, thread_addr, max_frames=256):
+        """Every shadow frame of a thread, in one RPC.
+
+          Args:
+            thread_addr (int): art::Thread*, i.e. java.lang.Thread.nativePeer.
 
-            #print("ping -> ", self.rpc.ping())
\ No newline at end of file
+          Returns: ShadowStackInfo() or None.
+        """
+        if self.layout is None:
+            print("ERROR: No shadow frame layout for this Android version.")
+            return None
+        try:
+            data = await self.memory.call('dump_shadow_frames', thread_addr, self.layout._asdict(), max_frames)
+            return ShadowStackInfo.from_bytes(data)
+        except Exception as e:
+            print(f"ERROR: Failed to dump shadow frames: {e}")
+            return None
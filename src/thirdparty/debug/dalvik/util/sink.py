@@ -0,0 +1,145 @@
+import asyncio
+
+'''
+Async sinks for high rate debugger output (e.g. logpoints).
+
+Producers call emit(), which never blocks and never awaits: the record is
+put on a bounded queue and a writer task formats and writes records in
+batches. When the queue is full the record is dropped and counted rather
+than slowing the producer (i.e. the debuggee) down.
+
+Records only need an async format() -> str method.
+'''
+
+
+class Sink():
+
+    def __init__(self, maxsize: int = 10000, batch: int = 256):
+        self.queue = asyncio.Queue(maxsize)
+        self.batch = batch
+        self.emitted = 0
+        self.written = 0
+        self.dropped = 0
+        # Batches lost to write() raising.
+        self.errors = 0
+        self._task = None
+
+
+    def emit(self, record):
+        if self._task is None:
+            self.start()
+        try:
+            self.queue.put_nowait(record)
+            self.emitted += 1
+        except asyncio.QueueFull:
+            self.dropped += 1
+
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.get_running_loop().create_task(self._drain())
+        return self
+
+
+    async def _drain(self):
+        try:
+            while True:
+                records = [await self.queue.get()]
+                while len(records) < self.batch and not self.queue.empty():
+                    records.append(self.queue.get_nowait())
+
+                try:
+                    lines = []
+                    for record in records:
+                        try:
+                            lines.append(await record.format())
+                        except Exception as e:
+                            lines.append(f'ERROR: Failed to format record: {e}')
+                    try:
+                        await self.write(lines)
+                        self.written += len(lines)
+                    except Exception as e:
+                        # Note: Keep draining, flush()/close() wait on every record.
+                        self.errors += 1
+                        self.dropped += len(lines)
+                        print(f'ERROR: {self.__class__.__name__} failed to write {len(lines)} lines: {e}')
+                finally:
+                    for _ in records:
+                        self.queue.task_done()
+        except asyncio.CancelledError:
+            pass
+
+
+    async def write(self, lines):
+        raise NotImplementedError()
+
+
+    async def flush(self):
+        """Wait until everything emitted so far has been written."""
+        if self._task is not None:
+            await self.queue.join()
+
+
+    async def close(self):
+        await self.flush()
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+
+
+    def __repr__(self):
+        return (f'{self.__class__.__name__}({self.emitted} emitted, {self.written} written, '
+                f'{self.dropped} dropped, {self.errors} errors, {self.queue.qsize()} queued)')
+
+
+class CallbackSink(Sink):
+    """Hand each line to a callable, e.g. print or a TUI log widget's write."""
+
+    def __init__(self, callback=print, **kwargs):
+        super().__init__(**kwargs)
+        self.callback = callback
+
+
+    async def write(self, lines):
+        for line in lines:
+            self.callback(line)
+
+
+class FileSink(Sink):
+    """Append lines to a file. The file writes run in the default executor."""
+
+    def __init__(self, path, **kwargs):
+        super().__init__(**kwargs)
+        self.path = path
+        self._file = open(path, 'a', buffering=1 << 16)
+
+
+    def _write(self, text):
+        self._file.write(text)
+        self._file.flush()
+
+
+    async def write(self, lines):
+        text = ''.join(f'{line}\n' for line in lines)
+        await asyncio.get_running_loop().run_in_executor(None, self._write, text)
+
+
+    async def close(self):
+        await super().close()
+        self._file.close()
+
+
+class QueueSink(Sink):
+    """Formatted lines end up on self.lines for another task to consume."""
+
+    def __init__(self, maxsize: int = 10000, **kwargs):
+        super().__init__(maxsize=maxsize, **kwargs)
+        self.lines = asyncio.Queue(maxsize)
+
+
+    async def write(self, lines):
+        for line in lines:
+            try:
+                self.lines.put_nowait(line)
+            except asyncio.QueueFull:
+                self.dropped += 1
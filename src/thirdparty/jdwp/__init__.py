@@ -189,9 +189,12 @@ class Tag():
 
 class Error():
     NONE = 0
+    INVALID_OBJECT = 20
+    INVALID_CLASS = 21
     OPAQUE_FRAME = 32
     INVALID_SLOT = 35
     TYPE_MISMATCH = 34
+    ABSENT_INFORMATION = 101
 
     string = {
         0: "NONE",
@@ -272,13 +275,20 @@ class Jdwp():
         self.started = False
 
 
-    async def start(self):
+    async def start(self, connection=None):
+        """
+          Args:
+            connection (tuple): (reader, writer) that already did the handshake
+              (e.g. from util.asyncadb.wait_for_jdwp()), instead of connecting to host:port.
+        """
         if not self.started:
             self.packet_id = 1
             self.pending_requests = {}
             self.event_loop = asyncio.get_running_loop()
             self.event_queue = asyncio.Queue()
             self.event_handler = {}
+            # Called with every event, handled or not. See add_event_observer().
+            self.event_observers = []
 
             self.VirtualMachine = VirtualMachineSet(self)
             self.ReferenceType = ReferenceTypeSet(self)
@@ -298,12 +308,15 @@ class Jdwp():
             self.ClassObjectReference = ClassObjectReferenceSet(self)
             self.Event = EventSet(self)
 
-            self.reader, self.writer = await asyncio.open_connection(self.host, self.port)
-            self.writer.write(Jdwp.HANDSHAKE)
-            await self.writer.drain()
-            resp = await self.reader.readexactly(len(Jdwp.HANDSHAKE))
-            if resp != Jdwp.HANDSHAKE:
-                raise RuntimeError("Failed to receive JDWP handshake.")
+            if connection is not None:
+                self.reader, self.writer = connection
+            else:
+                self.reader, self.writer = await asyncio.open_connection(self.host, self.port)
+                self.writer.write(Jdwp.HANDSHAKE)
+                await self.writer.drain()
+                resp = await self.reader.readexactly(len(Jdwp.HANDSHAKE))
+                if resp != Jdwp.HANDSHAKE:
+                    raise RuntimeError("Failed to receive JDWP handshake.")
             
             asyncio.create_task(self.reader_loop())
             asyncio.create_task(self.event_queue_consumer())
@@ -343,11 +356,23 @@ class Jdwp():
     def register_event_handler(self, requestID: Int, sync_handler, args=None):
         self.event_handler[requestID] = (sync_handler, args)
 
+
+    def unregister_event_handler(self, requestID: Int):
+        self.event_handler.pop(requestID, None)
+
+
+    def add_event_observer(self, observer):
+        """Call observer(event) (sync, must not block) for every event before its handler."""
+        if observer not in self.event_observers:
+            self.event_observers.append(observer)
+
     
     async def event_queue_consumer(self):
         while True:
             composite = await self.event_queue.get()
             for event in composite.events:
+                for observer in self.event_observers:
+                    observer(event)
                 if event.requestID in self.event_handler:
                     # TODO: How do we handle the async nature of this?
                     # Note: Going to assume sync for now. Callee can convert to async if needed.
@@ -531,33 +556,41 @@ class ArrayRegion(BaseModel):
     def from_bytes(self, data, offset=0) -> Tuple['ArrayRegion', int]:
         self.tag, offset = Jdwp.parse_byte(data, offset, Byte)
         count, offset = Jdwp.parse_int(data, offset)
-        
+        values = []
+
         if self.tag in Tag.u0:
             raise RuntimeError("Void used in ArrayRegion.")
 
+        # Note: Object element regions are tagged values, primitive regions are not.
+        elif self.tag in Tag.objs:
+            for _ in range(count):
+                value, offset = Value().from_bytes(data, offset)
+                values.append(value)
+
         elif self.tag in Tag.u8:
             for _ in range(count):
                 value, offset = Jdwp.parse_byte(data, offset, Long)
-                self.values = [*self.values, value]
+                values.append(Value(tag=self.tag, value=value))
 
         elif self.tag in Tag.u16:
             for _ in range(count):
                 value, offset = Jdwp.parse_short(data, offset, Long)
-                self.values = [*self.values, value]
+                values.append(Value(tag=self.tag, value=value))
 
         elif self.tag in Tag.u32:
             for _ in range(count):
                 value, offset = Jdwp.parse_int(data, offset, Long)
-                self.values = [*self.values, value]
+                values.append(Value(tag=self.tag, value=value))
 
         elif self.tag in Tag.u64:
             for _ in range(count):
                 value, offset = Jdwp.parse_long(data, offset, Long)
-                self.values = [*self.values, value]
+                values.append(Value(tag=self.tag, value=value))
 
         else:
-            raise RuntimeError(f"Value tag not defined. (Tag: {tag})")
+            raise RuntimeError(f"Value tag not defined. (Tag: {self.tag})")
 
+        self.values = values
         return self, offset
 
 
@@ -957,9 +990,12 @@ class VirtualMachineSet():
 
         def from_bytes(self, data, offset=0) -> Tuple['AllClassesWithGenericReply', int]:
             count, offset = Jdwp.parse_int(data, offset)
+            # Note: Tens of thousands of classes, so assign once.
+            classes = []
             for _ in range(count):
                 entry, offset = VirtualMachineSet.AllClassesWithGenericEntry().from_bytes(data, offset)
-                self.classes = [*self.classes, entry]
+                classes.append(entry)
+            self.classes = classes
             return self, offset
 
 
@@ -986,9 +1022,12 @@ class VirtualMachineSet():
 
         def from_bytes(self, data, offset=0) -> Tuple['InstanceCountsReply', int]:
             count, offset = Jdwp.parse_int(data, offset)
+            # Note: Replies can carry thousands of counts, so assign once.
+            instanceCounts = []
             for _ in range(count):
                 value, offset = Jdwp.parse_long(data, offset, Long)
-                self.instanceCounts = [*self.instanceCounts, value]
+                instanceCounts.append(value)
+            self.instanceCounts = instanceCounts
             return self, offset
 
 
@@ -1120,7 +1159,7 @@ class ReferenceTypeSet():
 
 
     async def GetValues(self, request: GetValuesRequest) -> Tuple[GetValuesReply, int]:
-        data, _, _, error_code = await self.conn.send_and_recv(1, 6, data=request.to_bytes())
+        data, _, _, error_code = await self.conn.send_and_recv(2, 6, data=request.to_bytes())
         if error_code != Jdwp.Error.NONE:
             return None, error_code
         return self.GetValuesReply().from_bytes(data)[0], error_code
@@ -1315,7 +1354,7 @@ class ReferenceTypeSet():
 
     
     async def Instances(self, request: InstancesRequest) -> Tuple[InstancesReply, int]:
-        data, _, _, error_code = await self.conn.send_and_recv(1, 16, data=request.to_bytes())
+        data, _, _, error_code = await self.conn.send_and_recv(2, 16, data=request.to_bytes())
         if error_code != Jdwp.Error.NONE:
             return None, error_code
         return self.InstancesReply().from_bytes(data)[0], error_code
@@ -1590,7 +1629,7 @@ class MethodSet():
         lineCodeIndex: Optional[Long] = None
         lineNumber: Optional[Int] = None
         
-        def from_bytes(self, data, offset=0) -> Tuple['LineTableReply', int]:
+        def from_bytes(self, data, offset=0) -> Tuple['LineTableEntry', int]:
             self.lineCodeIndex, offset = Jdwp.parse_long(data, offset, Long)
             self.lineNumber, offset = Jdwp.parse_int(data, offset, Int)
             return self, offset
@@ -1606,15 +1645,16 @@ class MethodSet():
             self.start, offset = Jdwp.parse_long(data, offset, Long)
             self.end, offset = Jdwp.parse_long(data, offset, Long)
             count, offset = Jdwp.parse_int(data, offset)
+            lines = []
             for _ in range(count):
-                value, offset = LineTableEntry().from_bytes(data, offset)
+                value, offset = MethodSet.LineTableEntry().from_bytes(data, offset)
                 lines.append(value)
+            self.lines = lines
             return self, offset
 
 
     async def LineTable(self, request: LineTableRequest) -> Tuple[LineTableReply, int]:
-        out = Jdwp.make_long(refType) + Jdwp.make_long(methodID)
-        data, _, _, error_code = await self.conn.send_and_recv(6, 1, data=out)
+        data, _, _, error_code = await self.conn.send_and_recv(6, 1, data=request.to_bytes())
         if error_code != Jdwp.Error.NONE:
             return None, error_code
         return self.LineTableReply().from_bytes(data)[0], error_code
@@ -1933,10 +1973,10 @@ class ObjectReferenceSet():
     class ReferringObjectsRequest(BaseModel):
         model_config = ConfigDict(validate_assignment=True)
         objectid: Optional[ObjectID] = None
-        maxReferrers: List[Int] = []
+        maxReferrers: Optional[Int] = None
 
         def to_bytes(self) -> bytes:
-            return b''.join([Jdwp.make_long(self.refType), Jdwp.make_int(self.maxReferrers)])
+            return b''.join([Jdwp.make_long(self.objectid), Jdwp.make_int(self.maxReferrers)])
 
 
     class ReferringObjectsReply(BaseModel):
@@ -1945,9 +1985,11 @@ class ObjectReferenceSet():
 
         def from_bytes(self, data, offset=0) -> Tuple['ReferringObjectsReply', int]:
             count, offset = Jdwp.parse_int(data, offset)
+            referring_objects = []
             for _ in range(count):
                 value, offset = TaggedObjectID().from_bytes(data, offset)
-                self.referringObjects = [*self.referringObjects, value]
+                referring_objects.append(value)
+            self.referringObjects = referring_objects
             return self, offset
 
     
@@ -2217,14 +2259,14 @@ class ArrayReferenceSet():
         data, _, _, error_code = await self.conn.send_and_recv(13, 1, data=Jdwp.make_long(arrayObject))
         if error_code != Jdwp.Error.NONE:
             return None, error_code
-        return Jdwp.parse_int(data, offset, Int)[0], error_code
+        return Jdwp.parse_int(data, 0, Int)[0], error_code
 
 
     class GetValuesRequest(BaseModel):
         model_config = ConfigDict(validate_assignment=True)
         arrayObject: Optional[ArrayID] = None
         firstIndex: Optional[Int] = None
-        length: Optional[Int]
+        length: Optional[Int] = None
         
         def to_bytes(self) -> bytes:
             return b''.join([
@@ -2238,7 +2280,7 @@ class ArrayReferenceSet():
         data, _, _, error_code = await self.conn.send_and_recv(13, 2, data=request.to_bytes())
         if error_code != Jdwp.Error.NONE:
             return None, error_code
-        return self.ArrayRegion().from_bytes(data)[0], error_code
+        return ArrayRegion().from_bytes(data)[0], error_code
 
 
     # !! Need To Implement Untagged Values
@@ -2653,7 +2695,7 @@ class ClassObjectReferenceSet():
 
     
     async def ReflectedType(self, classObject: ClassObjectID) -> Tuple[ReflectedTypeReply, int]:
-        data, _, _, error_code = await self.conn.send_and_recv(17, 1, data=request.to_bytes())
+        data, _, _, error_code = await self.conn.send_and_recv(17, 1, data=Jdwp.make_long(classObject))
         if error_code != Jdwp.Error.NONE:
             return None, error_code
         return self.ReflectedTypeReply().from_bytes(data)[0], error_code
@@ -2875,7 +2917,7 @@ class EventSet():
             self.thread, offset = Jdwp.parse_long(data, offset, ThreadID)
             self.refTypeTag, offset = Jdwp.parse_byte(data, offset, Byte)
             self.typeID, offset = Jdwp.parse_long(data, offset, ReferenceTypeID)
-            self.signature, offet = Jdwp.parse_string(data, offset, String)
+            self.signature, offset = Jdwp.parse_string(data, offset, String)
             self.status, offset = Jdwp.parse_int(data, offset, Int)
             return self, offset
         
@@ -2888,7 +2930,7 @@ class EventSet():
 
         def from_bytes(self, data, offset=0) -> Tuple['EventClassUnload', int]:
             self.requestID, offset = Jdwp.parse_int(data, offset, Int)
-            self.signature, offet = Jdwp.parse_string(data, offset, String)
+            self.signature, offset = Jdwp.parse_string(data, offset, String)
             return self, offset
 
 
@@ -2909,7 +2951,7 @@ class EventSet():
             self.location, offset = Location().from_bytes(data, offset)
             self.refTypeTag, offset = Jdwp.parse_byte(data, offset, Byte)
             self.typeID, offset = Jdwp.parse_long(data, offset, ReferenceTypeID)
-            self.fieldID, offet = Jdwp.parse_long(data, offset, FieldID)
+            self.fieldID, offset = Jdwp.parse_long(data, offset, FieldID)
             self.objectID, offset = TaggedObjectID().from_bytes(data, offset)
             return self, offset
     
@@ -2932,7 +2974,7 @@ class EventSet():
             self.location, offset = Location().from_bytes(data, offset)
             self.refTypeTag, offset = Jdwp.parse_byte(data, offset, Byte)
             self.typeID, offset = Jdwp.parse_long(data, offset, ReferenceTypeID)
-            self.fieldID, offet = Jdwp.parse_long(data, offset, FieldID)
+            self.fieldID, offset = Jdwp.parse_long(data, offset, FieldID)
             self.objectID, offset = TaggedObjectID().from_bytes(data, offset)
             self.valueToBe, offset = Value().from_bytes(data, offset)
             return self, offset
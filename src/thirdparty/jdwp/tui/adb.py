@@ -10,7 +10,7 @@ import argparse
 
 import asyncio
 import aiofiles
-from ppadb.client import Client as AdbClient
+from thirdparty.debug.dalvik.util.asyncadb import AsyncAdb, attach_devices
 
 
 class AdbCommand():
@@ -21,13 +21,21 @@ class AdbCommand():
         self.argparser = argparse.ArgumentParser(prog='adb')
         self.argparser.set_defaults(func=lambda *args, **kwargs: 'Nothing to do.')
         subparsers = self.argparser.add_subparsers(help='subcommand help')
+        adb_devices = subparsers.add_parser('devices')
+        adb_devices.set_defaults(func=self.do_devices)
         adb_debug = subparsers.add_parser('debug')
+        adb_debug.add_argument('-s', '--serial', action='append', help='Device(s), all online devices if not given.')
+        adb_debug.add_argument('-p', '--port', type=int, default=8700, help='First local port, one per device.')
+        adb_debug.add_argument('--no-attach', dest='attach', action='store_false',
+            help="Only get the app(s) ready, don't attach the TUI's debugger.")
         adb_debug.add_argument('package_name')
         adb_debug.set_defaults(func=self.do_debug)
 
-        # Hard coding for now.
-        self.client = AdbClient(host="127.0.0.1", port=5037)
-        self.device = self.client.device("emulator-5554")
+        self.client = AsyncAdb(host="127.0.0.1", port=5037)
+        # serial -> (pid, handshaken (reader, writer)) for Debugger.start(connection=...)
+        self.connections = {}
+        # Note: Keep references so running commands don't get garbage collected.
+        self.tasks = set()
 
     def handle(self, argv):
         if '--help' in argv:
@@ -43,33 +51,54 @@ class AdbCommand():
         return args.func(args)
 
 
-    def do_debug(self, args):
-        self.cmd_input.cmd_log(f"Setting up debug session for: {args.package_name}")
-
-        self.cmd_input.cmd_log(f"adb shell am set-debug-app -w {args.package_name}")
-        self.device.shell(f"am set-debug-app -w {args.package_name}")
-
-        self.cmd_input.cmd_log(f"adb shell cmd package resolve-activity -c android.intent.category.LAUNCHER {args.package_name}")
-        main_act = None
-        for raw_line in self.device.shell(f"cmd package resolve-activity -c android.intent.category.LAUNCHER {args.package_name}").split('\n'):
-            line = raw_line.strip()
-            if line.startswith("name="):
-                main_act = line.split('=', 1)[1].replace(args.package_name, '')
-                break
-
-        self.cmd_input.cmd_log(f"adb shell am start -n {args.package_name}/{main_act}")
-        self.device.shell(f"am start -n {args.package_name}/{main_act}")
-
-        results = []
-        proc_list = self.device.shell("ps -A")
-        for line in proc_list.split('\n'):
-            if args.package_name in line:
-                results.append(line)
-        
-        if len(results) == 1:
-            # Lets try to attach to it.
-            pid = results[0].split()[1]
-            self.cmd_input.cmd_log(f"adb forward tcp:8700 jdwp:{pid}")
-            self.device.forward('tcp:8700', f'jdwp:{pid}')
+    def run(self, coro):
+        """adb talks over sockets, so commands run as tasks and log when they're done."""
+        task = asyncio.get_running_loop().create_task(self._run(coro))
+        self.tasks.add(task)
+        task.add_done_callback(self.tasks.discard)
+        return 'Running...'
+
+
+    async def _run(self, coro):
+        try:
+            await coro
+        except Exception as e:
+            self.cmd_input.cmd_log(f"ERROR: {e}")
+
 
+    def do_devices(self, args):
+        return self.run(self.devices())
+
+
+    async def devices(self):
+        for serial, state in await self.client.devices():
+            self.cmd_input.cmd_log(f"{serial}\t{state}")
+
+
+    def do_debug(self, args):
+        return self.run(self.debug(args.package_name, args.serial, args.port, args.attach))
+
+
+    async def debug(self, package_name, serials=None, port=8700, attach=True):
+        self.cmd_input.cmd_log(f"Setting up debug session for: {package_name}")
+        results = await attach_devices(self.client, package_name, serials, port=port, log=self.cmd_input.cmd_log)
+        if not results:
+            self.cmd_input.cmd_log("No device found.")
+        ready = []
+        for idx, (serial, result) in enumerate(results.items()):
+            if isinstance(result, Exception):
+                self.cmd_input.cmd_log(f"ERROR: [{serial}] {result}")
+                continue
+            self.connections[serial] = result
+            ready.append((serial, port + idx))
+            self.cmd_input.cmd_log(f"[{serial}] {package_name} (pid {result[0]}) waiting for debugger on tcp:{port + idx}")
+
+        # Note: The TUI drives one debugger, it takes the first device. The
+        #       other connections stay in self.connections.
+        if attach and ready and hasattr(self.app, 'attach_debugger'):
+            serial, local_port = ready[0]
+            _, connection = self.connections.pop(serial)
+            self.cmd_input.cmd_log(f"[{serial}] Attaching debugger, this may take a moment.")
+            if await self.app.attach_debugger(connection, port=local_port) is not None:
+                self.cmd_input.cmd_log(f"[{serial}] Debugger attached, VM suspended. `resume` to continue.")
         return 'Done.'
@@ -0,0 +1,391 @@
+'''
+Copyright (c) 2025 Vincent Agriesti
+
+This file is part of the thirdparty JDWP project.
+Licensed under the MIT License. See the LICENSE file in the project root
+for full license text.
+'''
+
+import time
+
+from rich.style import Style
+from rich.text import Text
+from textual.events import Click
+from textual.geometry import Region, Size
+from textual.message import Message
+from textual.scroll_view import ScrollView
+from textual.strip import Strip
+
+from thirdparty.jdwp import Jdwp
+
+'''
+Live threads, frame and watch panels for the TUI.
+
+Redrawing everything on every event doesn't keep up with stepping, and
+fetching from the VM for a repaint would make it worse. So:
+
+  - Panels only read what the debugger already cached: threads_by_id, the
+    FrameInfos (and their slots) from the last ThreadInfo.load(), and
+    MethodInfo.disassembly. Nothing here issues a JDWP request.
+  - PanelModel subscribes to every JDWP event (Jdwp.add_event_observer) and
+    holds what's selected (thread, frame) and the watch expressions.
+  - PanelRefresher ticks at a fixed rate (fps). A tick that finds nothing
+    new (no event, same DebuggerState.version and suspend epoch, same
+    selection) does nothing, so a burst of step events costs one rebuild
+    per frame at most.
+  - A rebuild produces each panel's rows as plain strings and PanelView
+    diffs them with what's on screen, repainting only the rows that changed.
+
+    model = PanelModel(dbg)
+    PanelRefresher(model, [threads, frame, watches], code=code_view, fps=20).start(app)
+
+Note: Watches are Python expressions over the cached frame, `this`, `frame`,
+      `thread`, `dbg` and the slots as v0, v1, ... They must not await.
+'''
+
+
+EVENT_NAMES = {value: name for name, value in vars(Jdwp.EventKind).items() if isinstance(value, int)}
+
+
+class PanelModel():
+
+    def __init__(self, dbg=None):
+        self.dbg = None
+        self.thread_id = None
+        self.frame_idx = 0
+        self.watches = []
+        # Bumped by anything that changes what the panels show besides the state.
+        self.selection = 0
+        self.dirty = True
+        self.events = 0
+        if dbg is not None:
+            self.attach(dbg)
+
+
+    def attach(self, dbg):
+        self.dbg = dbg
+        jdwp = dbg.jdwp
+        if jdwp is not None and getattr(jdwp, 'started', False):
+            jdwp.add_event_observer(self.on_event)
+        self.touch()
+
+
+    def on_event(self, event):
+        # Note: Runs on the event loop before the event's handler, keep it cheap.
+        self.events += 1
+        self.dirty = True
+        thread_id = getattr(event, 'thread', None)
+        if thread_id and getattr(event, 'location', None) is not None:
+            # Follow whatever thread last stopped.
+            if self.thread_id != thread_id:
+                self.thread_id = thread_id
+                self.frame_idx = 0
+                self.selection += 1
+
+
+    def touch(self):
+        self.selection += 1
+        self.dirty = True
+
+
+    def select_thread(self, thread_id):
+        self.thread_id = thread_id
+        self.frame_idx = 0
+        self.touch()
+
+
+    def select_frame(self, frame_idx):
+        self.frame_idx = max(frame_idx, 0)
+        self.touch()
+
+
+    def add_watch(self, expr):
+        if expr not in self.watches:
+            self.watches.append(expr)
+            self.touch()
+
+
+    def remove_watch(self, expr):
+        if expr in self.watches:
+            self.watches.remove(expr)
+            self.touch()
+
+
+    def token(self):
+        """Changes whenever a rebuild could show something different."""
+        if self.dbg is None:
+            return (None, self.selection)
+        state = self.dbg.state
+        return (state.version, state.suspend_epoch, self.selection)
+
+
+    def thread(self):
+        if self.dbg is None or self.thread_id is None:
+            return None
+        return self.dbg.threads_by_id.get(self.thread_id)
+
+
+    def frame(self):
+        """Selected FrameInfo, only if its thread is stopped and loaded."""
+        thread = self.thread()
+        if thread is None or not thread.stopped:
+            return None
+        frames = thread.frames()
+        if self.frame_idx >= len(frames):
+            return None
+        return frames[self.frame_idx]
+
+
+class PanelView(ScrollView):
+    """Rows of text, repainted row by row as they change. Subclasses implement build()."""
+
+    DEFAULT_CSS = """
+    PanelView {
+        width: 1fr;
+        height: 1fr;
+    }
+    """
+
+    class RowClicked(Message):
+
+        def __init__(self, panel, row):
+            super().__init__()
+            self.panel = panel
+            self.row = row
+
+
+    def __init__(self, name=None, id=None, classes=None):
+        super().__init__(name=name, id=id, classes=classes)
+        self.rows = []
+        self.highlight_row = None
+        self.max_width = 0
+        # Rows repainted since mount, see update_rows().
+        self.repaints = 0
+
+
+    def build(self, model):
+        """Returns: (rows as str, highlighted row index or None)"""
+        raise NotImplementedError("build() not implemented in base class.")
+
+
+    def update_rows(self, rows, highlight_row=None):
+        """Swap in new rows, repainting only the ones that differ.
+
+          Returns: Number of rows repainted.
+        """
+        old = self.rows
+        changed = [idx for idx in range(max(len(old), len(rows)))
+            if idx >= len(old) or idx >= len(rows) or old[idx] != rows[idx]]
+        if highlight_row != self.highlight_row:
+            changed.extend(row for row in (self.highlight_row, highlight_row) if row is not None)
+        self.rows = rows
+        self.highlight_row = highlight_row
+
+        if len(old) != len(rows) or any(len(row) > self.max_width for row in rows):
+            self.max_width = max((len(row) for row in rows), default=0)
+            self.virtual_size = Size(self.max_width, len(rows))
+
+        scroll_y = self.scroll_offset.y
+        height = self.size.height
+        width = self.size.width
+        repainted = 0
+        for idx in set(changed):
+            y = idx - scroll_y
+            if 0 <= y < height:
+                self.refresh(Region(0, y, width, 1))
+                repainted += 1
+        self.repaints += repainted
+        return repainted
+
+
+    def render_line(self, y):
+        scroll_x, scroll_y = self.scroll_offset
+        idx = scroll_y + y
+        width = self.size.width
+        style = self.rich_style
+        if idx >= len(self.rows):
+            return Strip.blank(width, style)
+        text = Text(self.rows[idx], no_wrap=True, end='')
+        text.stylize_before(style)
+        if idx == self.highlight_row:
+            text.stylize(Style(reverse=True))
+        return Strip(text.render(self.app.console), text.cell_len).crop_extend(scroll_x, scroll_x + width, style)
+
+
+    def on_click(self, event: Click) -> None:
+        offset = event.get_content_offset(self)
+        if offset is None:
+            return
+        row = offset.y + self.scroll_offset.y
+        if row < len(self.rows):
+            event.stop()
+            self.post_message(PanelView.RowClicked(self, row))
+
+
+def _short_location(frame):
+    if frame.loc_class == '[unloaded]':
+        return '[unloaded]'
+    cls = frame.loc_class.rstrip(';').rsplit('/', 1)[-1]
+    method = frame.loc_method.split('(', 1)[0]
+    return f'{cls}.{method}@{frame.location.index:04x}'
+
+
+class ThreadsPanel(PanelView):
+
+    def __init__(self, name=None, id=None, classes=None):
+        super().__init__(name=name, id=id, classes=classes)
+        # Row -> thread ID, for clicks.
+        self.thread_ids = []
+
+
+    def build(self, model):
+        if model.dbg is None:
+            self.thread_ids = []
+            return ['No debugger attached.'], None
+
+        rows = []
+        self.thread_ids = []
+        highlight = None
+        for thread_id, thread in list(model.dbg.threads_by_id.items()):
+            if thread.stopped:
+                event = thread._event
+                kind = EVENT_NAMES.get(int(event.eventKind), '?') if event is not None else 'SUSPENDED'
+                frames = thread.frames()
+                where = _short_location(frames[0]) if frames else ''
+                status = f'{kind:<11} {where}'
+            else:
+                status = 'running'
+            if thread_id == model.thread_id:
+                highlight = len(rows)
+            self.thread_ids.append(thread_id)
+            rows.append(f'{int(thread_id):#x}  {status}')
+        return rows, highlight
+
+
+class FramePanel(PanelView):
+
+    def build(self, model):
+        thread = model.thread()
+        if thread is None:
+            return ['No thread selected.'], None
+        if not thread.stopped:
+            return [f'Thread {int(thread.threadID):#x} is running.'], None
+
+        rows = []
+        highlight = None
+        for idx, frame in enumerate(thread.frames()):
+            if idx == model.frame_idx:
+                highlight = len(rows)
+            rows.append(f'#{idx:<2} {_short_location(frame)}')
+
+        frame = model.frame()
+        if frame is not None:
+            rows.append('')
+            rows.append(f'this: {frame.this_obj}'.split('\n', 1)[0])
+            for slot_idx, slot in sorted((frame.slots() or {}).items()):
+                rows.append(f'v{slot_idx}: {slot!r}'.split('\n', 1)[0])
+        return rows, highlight
+
+
+class WatchPanel(PanelView):
+
+    def build(self, model):
+        if not model.watches:
+            return ['No watches. Add with: watch <expr>'], None
+
+        frame = model.frame()
+        scope = {
+            'dbg': model.dbg,
+            'thread': model.thread(),
+            'frame': frame,
+            'this': getattr(frame, 'this_obj', None),
+        }
+        if frame is not None:
+            for slot_idx, slot in (frame.slots() or {}).items():
+                scope[f'v{slot_idx}'] = slot
+
+        rows = []
+        for expr in model.watches:
+            try:
+                value = eval(expr, {}, scope)
+                if hasattr(value, '__await__'):
+                    # Note: A repaint never talks to the VM.
+                    getattr(value, 'close', lambda: None)()
+                    value = '<awaitable, evaluate it in the REPL>'
+                rows.append(f'{expr} = {value!r}'.split('\n', 1)[0])
+            except Exception as e:
+                rows.append(f'{expr} = ERROR: {e}')
+        return rows, None
+
+
+class PanelRefresher():
+
+    def __init__(self, model, panels, code=None, fps=20):
+        """
+          Args:
+            model (PanelModel): Shared selection/watches.
+            panels (list): PanelViews to rebuild.
+            code (VirtualCode): Shows the selected frame's method, if given.
+            fps (int): Most rebuilds per second.
+        """
+        self.model = model
+        self.panels = panels
+        self.code = code
+        self.fps = fps
+        self.timer = None
+        self._token = None
+        self._code_method = None
+        self.rebuilds = 0
+        self.rebuild_time = 0.0
+
+
+    def start(self, widget):
+        """Tick on widget's (e.g. the App's) timer."""
+        self.timer = widget.set_interval(1 / self.fps, self.tick)
+        return self
+
+
+    def tick(self):
+        token = self.model.token()
+        if not self.model.dirty and token == self._token:
+            return False
+        self.model.dirty = False
+        self._token = token
+
+        started = time.perf_counter()
+        for panel in self.panels:
+            rows, highlight = panel.build(self.model)
+            panel.update_rows(rows, highlight)
+        if self.code is not None:
+            self._update_code()
+        self.rebuilds += 1
+        self.rebuild_time += time.perf_counter() - started
+        return True
+
+
+    def _update_code(self):
+        frame = self.model.frame()
+        if frame is None:
+            return
+        location = frame.location
+        class_info = self.model.dbg.classes_by_id.get(location.classID)
+        method_info = class_info.methods_by_id.get(location.methodID) if class_info else None
+        disassembly = method_info.disassembly if method_info else None
+        if disassembly is None:
+            # Note: Only what's already decoded, see Debugger.disassembly().
+            return
+
+        key = (location.classID, location.methodID)
+        if key != self._code_method:
+            self._code_method = key
+            self.code.load_lines([f'{code_index:04x}: {text}' for code_index, text in disassembly.listing()])
+        row = disassembly.index_of(location.index)
+        row = row if row >= 0 else None
+        if row != self.code.current_line:
+            self.code.set_current(row)
+
+
+    def stop(self):
+        if self.timer is not None:
+            self.timer.stop()
+            self.timer = None
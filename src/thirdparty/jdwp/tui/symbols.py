@@ -0,0 +1,45 @@
+'''
+Copyright (c) 2025 Vincent Agriesti
+
+This file is part of the thirdparty JDWP project.
+Licensed under the MIT License. See the LICENSE file in the project root
+for full license text.
+'''
+
+import argparse
+
+
+class SymbolCommand():
+
+    def __init__(self, cmd_input):
+        self.cmd_input = cmd_input
+        self.app = cmd_input.app
+        self.argparser = argparse.ArgumentParser(prog='find')
+        self.argparser.add_argument('query')
+        self.argparser.add_argument('-k', '--kind', action='append', choices=['class', 'method', 'field'])
+        self.argparser.add_argument('-n', '--limit', type=int, default=20)
+        self.argparser.add_argument('-p', '--prefer', action='append', help='rank package first')
+
+
+    def handle(self, argv):
+        if '--help' in argv:
+            return self.argparser.format_help()
+
+        try:
+            args = self.argparser.parse_args(argv[1:])
+        except SystemExit:
+            return self.argparser.format_help()
+
+        # Note: The app only has a debugger once one has been attached.
+        dbg = getattr(self.app, 'dbg', None)
+        if dbg is None:
+            return 'No debugger attached.'
+
+        if args.prefer:
+            dbg.symbols.prefer(*args.prefer)
+
+        # Note: dbg.find() flushes batched CLASS_PREPAREs, symbols.search() alone would miss them.
+        results = dbg.find(args.query, args.limit, args.kind)
+        if not results:
+            return f'No symbols matching {args.query!r}.'
+        return '\n'.join(f'{symbol}' for symbol in results)
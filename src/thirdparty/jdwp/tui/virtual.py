@@ -0,0 +1,272 @@
+'''
+Copyright (c) 2025 Vincent Agriesti
+
+This file is part of the thirdparty JDWP project.
+Licensed under the MIT License. See the LICENSE file in the project root
+for full license text.
+'''
+
+from collections import OrderedDict
+
+from rich.cells import cell_len
+from rich.style import Style
+from rich.text import Text
+from textual.events import Click
+from textual.geometry import Region, Size
+from textual.message import Message
+from textual.scroll_view import ScrollView
+from textual.strip import Strip
+
+'''
+Line API log and code views for the TUI.
+
+Mounting a Static per log line (or a CodeLine per source line) makes every
+line a widget the compositor has to lay out, so the TUI gets slower with
+every line of output and a 5k instruction method takes seconds to show.
+
+These are ScrollViews that only render the rows on screen:
+
+  - VirtualLog keeps the last max_lines lines in a LineBuffer (a ring, None
+    keeps everything). write() is cheap, the virtual size update and
+    scroll to end are coalesced into one per batch of writes, so a burst
+    of 100k lines costs one layout. Rendered rows are cached (LRU) by
+    absolute line number.
+  - VirtualCode holds a flat list of lines (plus a meta object per line),
+    with a line number gutter and a current line (e.g. the pc). Moving the
+    current line only repaints the two rows involved. Clicking a line posts
+    VirtualCode.LineClicked.
+'''
+
+
+class LineBuffer():
+    """The last max_lines lines (None for no limit), oldest first."""
+
+    def __init__(self, max_lines=10000):
+        self.max_lines = max_lines
+        self.lines = []
+        self.head = 0
+        # Absolute line number of the oldest line kept.
+        self.first = 0
+
+
+    def append(self, line):
+        if self.max_lines and len(self.lines) >= self.max_lines:
+            self.lines[self.head] = line
+            self.head = (self.head + 1) % self.max_lines
+            self.first += 1
+        else:
+            self.lines.append(line)
+
+
+    def __len__(self):
+        return len(self.lines)
+
+
+    def __getitem__(self, idx):
+        if idx < 0:
+            idx += len(self.lines)
+        if idx < 0 or idx >= len(self.lines):
+            raise IndexError(idx)
+        return self.lines[(self.head + idx) % len(self.lines)]
+
+
+    def clear(self):
+        self.first += len(self.lines)
+        self.lines = []
+        self.head = 0
+
+
+class VirtualLog(ScrollView):
+
+    DEFAULT_CSS = """
+    VirtualLog {
+        height: 1fr;
+    }
+    """
+
+    def __init__(self, max_lines=10000, auto_scroll=True, cache_size=1024, name=None, id=None, classes=None):
+        """
+          Args:
+            max_lines (int): Lines kept, older ones are dropped. None keeps everything.
+            auto_scroll (bool): Follow new output while scrolled to the end.
+            cache_size (int): Rendered rows kept.
+        """
+        super().__init__(name=name, id=id, classes=classes)
+        self.buffer = LineBuffer(max_lines)
+        self.auto_scroll = auto_scroll
+        self.max_width = 0
+        self.cache_size = cache_size
+        # absolute line number -> Strip, oldest first.
+        self._strips = OrderedDict()
+        self._sync_pending = False
+
+
+    @property
+    def line_count(self):
+        return len(self.buffer)
+
+
+    def write(self, content):
+        """Append a str (split on newlines) or rich Text."""
+        if isinstance(content, Text):
+            lines = content.split(allow_blank=True)
+        else:
+            lines = str(content).expandtabs().splitlines() or ['']
+        for line in lines:
+            self.buffer.append(line)
+            width = line.cell_len if isinstance(line, Text) else cell_len(line)
+            if width > self.max_width:
+                self.max_width = width
+
+        if not self._sync_pending and self.is_mounted:
+            self._sync_pending = True
+            self.call_later(self._sync)
+        return self
+
+
+    def clear(self):
+        self.buffer.clear()
+        self.max_width = 0
+        self._strips.clear()
+        self._sync()
+        return self
+
+
+    def on_mount(self):
+        super().on_mount()
+        self._sync()
+
+
+    def _sync(self):
+        self._sync_pending = False
+        follow = self.auto_scroll and self.is_vertical_scroll_end
+        self.virtual_size = Size(self.max_width, len(self.buffer))
+        # Rows that fell off the ring.
+        while self._strips and next(iter(self._strips)) < self.buffer.first:
+            self._strips.popitem(last=False)
+        if follow:
+            self.scroll_end(animate=False)
+        self.refresh()
+
+
+    def notify_style_update(self):
+        super().notify_style_update()
+        self._strips.clear()
+
+
+    def _strip(self, index):
+        number = self.buffer.first + index
+        strip = self._strips.get(number)
+        if strip is None:
+            line = self.buffer[index]
+            text = line.copy() if isinstance(line, Text) else Text(line, no_wrap=True, end='')
+            text.stylize_before(self.rich_style)
+            strip = Strip(text.render(self.app.console), text.cell_len)
+            self._strips[number] = strip
+            while len(self._strips) > self.cache_size:
+                self._strips.popitem(last=False)
+        else:
+            self._strips.move_to_end(number)
+        return strip
+
+
+    def render_line(self, y):
+        scroll_x, scroll_y = self.scroll_offset
+        index = scroll_y + y
+        width = self.size.width
+        if index >= len(self.buffer):
+            return Strip.blank(width, self.rich_style)
+        return self._strip(index).crop_extend(scroll_x, scroll_x + width, self.rich_style)
+
+
+class VirtualCode(ScrollView):
+
+    DEFAULT_CSS = """
+    VirtualCode {
+        height: 1fr;
+    }
+    """
+
+    class LineClicked(Message):
+
+        def __init__(self, code, index, meta):
+            super().__init__()
+            self.code = code
+            self.index = index
+            self.meta = meta
+
+
+    def __init__(self, line_numbers=True, name=None, id=None, classes=None):
+        super().__init__(name=name, id=id, classes=classes)
+        self.line_numbers = line_numbers
+        self.code_lines = []
+        self.line_meta = []
+        self.current_line = None
+        self.max_width = 0
+
+
+    def load_lines(self, lines, meta=None):
+        """Show lines (str), meta is a parallel list handed back in LineClicked."""
+        self.code_lines = [line.rstrip('\n').expandtabs() for line in lines]
+        self.line_meta = list(meta) if meta is not None else [None] * len(self.code_lines)
+        self.current_line = None
+        self.max_width = max((cell_len(line) for line in self.code_lines), default=0)
+        self.virtual_size = Size(self._gutter_width() + self.max_width, len(self.code_lines))
+        self.scroll_home(animate=False)
+        self.refresh()
+        return self
+
+
+    def load_file(self, fpath):
+        with open(fpath, "r") as f:
+            lines = f.readlines()
+        return self.load_lines(lines, [{'content': line, 'index': idx} for idx, line in enumerate(lines)])
+
+
+    def set_current(self, index, scroll=True):
+        """Highlight line index (None for none), only those rows are redrawn."""
+        old, self.current_line = self.current_line, index
+        for row in (old, index):
+            if row is not None:
+                self._refresh_row(row)
+        if scroll and index is not None:
+            self.scroll_to_region(Region(0, index, 1, 1), animate=False)
+
+
+    def _refresh_row(self, index):
+        y = index - self.scroll_offset.y
+        if 0 <= y < self.size.height:
+            self.refresh(Region(0, y, self.size.width, 1))
+
+
+    def _gutter_width(self):
+        return len(str(len(self.code_lines))) + 1 if self.line_numbers else 0
+
+
+    def render_line(self, y):
+        scroll_x, scroll_y = self.scroll_offset
+        index = scroll_y + y
+        width = self.size.width
+        style = self.rich_style
+        if index >= len(self.code_lines):
+            return Strip.blank(width, style)
+
+        text = Text(no_wrap=True, end='')
+        if self.line_numbers:
+            text.append(f'{index + 1:>{self._gutter_width() - 1}} ', Style(dim=True))
+        text.append(self.code_lines[index])
+        text.stylize_before(style)
+        if index == self.current_line:
+            text.stylize(Style(reverse=True))
+        strip = Strip(text.render(self.app.console), text.cell_len)
+        return strip.crop_extend(scroll_x, scroll_x + width, style)
+
+
+    def on_click(self, event: Click) -> None:
+        offset = event.get_content_offset(self)
+        if offset is None:
+            return
+        index = offset.y + self.scroll_offset.y
+        if index < len(self.code_lines):
+            event.stop()
+            self.post_message(VirtualCode.LineClicked(self, index, self.line_meta[index]))
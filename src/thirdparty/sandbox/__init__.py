@@ -15,7 +15,12 @@ import os
 import importlib
 import sys
 import struct
+import json
+import time
 from multiprocessing.managers import BaseManager
+from thirdparty.sandbox.engine import SandboxEngine, CapturedOutput, StreamOutput
+from thirdparty.sandbox.shm import StatePublisher
+from thirdparty.sandbox.reload import HotReloader
 
 # HOST = "127.0.0.1"
 # PORT = 9999
@@ -29,6 +34,10 @@ class DictManager(BaseManager):
     pass
 
 '''
+    Note: Every proxy access is a pickled socket round trip. For reading
+    debugger state from other processes use the shared memory snapshots in
+    shm.py (start_sandbox(shm_state=...)) instead.
+
     import asyncio
     from thirdparty.sandbox import start_dict_server
 
@@ -477,8 +486,10 @@ def other():
 
 
 
-async def handle_repl_client(reader: asyncio.StreamReader, writer: asyncio.StreamWriter, namespace):
+async def handle_repl_client(reader: asyncio.StreamReader, writer: asyncio.StreamWriter, namespace, engine=None):
     try:
+        # Note: See engine.py, each client's output is its own and code runs off the event loop.
+        engine = engine or SandboxEngine(namespace)
         console = code.InteractiveConsole(namespace)
         addr = writer.get_extra_info("peername") or "unix-client"
         print(f"Client connected: {addr}")
@@ -494,9 +505,8 @@ async def handle_repl_client(reader: asyncio.StreamReader, writer: asyncio.Strea
             print(line_bytes)
             line = line_bytes.decode()
             
-            output = io.StringIO()
-            with contextlib.redirect_stdout(output), contextlib.redirect_stderr(output):
-                more = console.push(line)
+            output = CapturedOutput()
+            more = await engine.call(console.push, line, output=output)
 
             captured = output.getvalue().replace('\n', '\r\n')
             print(captured.encode())
@@ -559,8 +569,10 @@ async def handle_repl_client(reader: asyncio.StreamReader, writer: asyncio.Strea
 '''
 async def start_repl_server(socket_path: str=None, host: str=None, port: int=None, namespace={}):
     try:
+        engine = SandboxEngine(namespace)
+
         async def handle_repl_client_wrapper(reader, writer):
-            await handle_repl_client(reader, writer, namespace)
+            await handle_repl_client(reader, writer, namespace, engine)
 
         server = None
         if socket_path:
@@ -587,20 +599,13 @@ async def start_repl_server(socket_path: str=None, host: str=None, port: int=Non
         __sandbox__.hot_reload_module(mymodule)
         asyncio.run(__sandbox__.handle_hot_reload())
 '''
-async def handle_hot_reload(module_refs = MODULE_REFS):
-    module_mtimes = {}
+async def handle_hot_reload(module_refs = MODULE_REFS, namespace=None, roots=()):
+    # Note: See reload.py, watches with inotify (or polls) and reloads dependents too.
+    reloader = HotReloader(module_refs, namespace=namespace)
+    for root in roots:
+        reloader.track(root)
     try:
-        while True:
-            await asyncio.sleep(1)
-            for mod in module_refs:
-                if mod not in module_mtimes:
-                    module_mtimes[mod] = os.path.getmtime(mod.__file__)
-
-                cur_mtime = os.path.getmtime(mod.__file__)
-                if cur_mtime != module_mtimes[mod]:
-                    importlib.reload(mod)
-                    print("Module reloaded!")
-                    module_mtimes[mod] = cur_mtime
+        await reloader.run()
     except asyncio.CancelledError:
         print("Hot reload loop stopped")
 
@@ -610,47 +615,117 @@ def hot_reload_module(module_ref):
         MODULE_REFS.append(module_ref)
 
 
-async def handle_exec_client(reader: asyncio.StreamReader, writer: asyncio.StreamWriter, namespace):
+'''
+Exec protocol. Every frame is [u8 kind][u32 big endian length][payload].
+
+    client -> server
+      EXEC_SOURCE   utf-8 source to compile (cached by sha256) and run.
+      EXEC_HASH     sha256 hex digest of a source sent before. Runs the
+                    cached code, or gets a status with "missing" set so the
+                    client sends EXEC_SOURCE instead.
+      (a zero length frame closes the session)
+
+    server -> client
+      FRAME_OUTPUT  utf-8 output, streamed while the script runs.
+      FRAME_STATUS  json {"ok", "error", "elapsed", "cached", "missing"},
+                    always last for each request.
+
+Scripts with a top level await run on the debugger loop, so they can await
+debugger calls directly. See engine.py.
+'''
+EXEC_SOURCE = 1
+EXEC_HASH = 2
+FRAME_OUTPUT = 1
+FRAME_STATUS = 2
+
+
+def write_frame(writer, kind, payload):
+    writer.write(struct.pack(">BI", kind, len(payload)) + payload)
+
+
+async def read_frame(reader):
+    """Returns: (kind, payload bytes), (None, None) at end of session."""
+    try:
+        kind, length = struct.unpack(">BI", await reader.readexactly(5))
+    except asyncio.exceptions.IncompleteReadError:
+        return None, None
+    if length == 0:
+        return None, None
+    return kind, await reader.readexactly(length)
+
+
+async def handle_exec_client(reader: asyncio.StreamReader, writer: asyncio.StreamWriter, namespace, engine=None):
+    engine = engine or SandboxEngine(namespace)
     addr = writer.get_extra_info("peername") or "unix-client"
     print(f"Exec client connected: {addr}")
 
+    async def pump(queue):
+        # Output frames while the script runs, whatever queued up per frame.
+        while True:
+            chunks = [await queue.get()]
+            while not queue.empty():
+                chunks.append(queue.get_nowait())
+            done = chunks[-1] is None
+            data = ''.join(chunk for chunk in chunks if chunk is not None)
+            if data:
+                write_frame(writer, FRAME_OUTPUT, data.encode())
+                await writer.drain()
+            if done:
+                return
+
     try:
         while True:
-            # Note: first 4 bytes are the length.
-            resp = await reader.readexactly(4)
-            res = struct.unpack(">I", resp)
-            data_length = res[0]
-            if data_length == 0:
+            kind, payload = await read_frame(reader)
+            if kind is None:
                 break
 
-            data = await reader.readexactly(data_length)
-            exec_data = data.decode()
+            status = {'ok': False, 'error': None, 'elapsed': 0.0, 'cached': False, 'missing': False}
+            started = time.perf_counter()
             try:
-                output = io.StringIO()
-                with contextlib.redirect_stdout(output), contextlib.redirect_stderr(output):
-                    exec(exec_data, globals=namespace)
-
-                captured = output.getvalue().encode()
-                if captured:
-                    packet = struct.pack(">I", len(captured)) + captured
-                    print(packet)
-                    writer.write(packet)
-
-            except Exception as e:
-                msg = f"EXEC ERROR: {e}\n".encode()
-                packet = struct.pack(">I", len(msg)) + msg
-                print(packet)
-                writer.write(packet)
-            
-            finally:
-                await writer.drain()
+                if kind == EXEC_HASH:
+                    digest = payload.decode()
+                    status['cached'] = engine.has(digest)
+                    status['missing'] = not status['cached']
+                elif kind == EXEC_SOURCE:
+                    source = payload.decode()
+                    status['cached'] = engine.has(SandboxEngine.digest(source))
+                    digest = engine.compile(source, '<exec>')
+                else:
+                    status['error'] = f"Unknown request kind {kind}"
+                    digest = None
+            except SyntaxError as e:
+                status['error'] = f"SyntaxError: {e}"
+                digest = None
+
+            if digest and not status['missing']:
+                queue = asyncio.Queue()
+                sender = asyncio.create_task(pump(queue))
+                try:
+                    _, error = await engine.run_digest(digest, StreamOutput(asyncio.get_running_loop(), queue))
+                    status['ok'] = error is None
+                    status['error'] = f"EXEC ERROR: {error}" if error else None
+                except KeyError:
+                    # Evicted from the code cache since has(), the client resends the source.
+                    status['cached'] = False
+                    status['missing'] = True
+                finally:
+                    queue.put_nowait(None)
+                    await sender
+
+            status['elapsed'] = time.perf_counter() - started
+            write_frame(writer, FRAME_STATUS, json.dumps(status).encode())
+            await writer.drain()
 
-    except asyncio.exceptions.IncompleteReadError:
-        print(f"Nothing left to read on socket: {addr}")
+    except (ConnectionResetError, BrokenPipeError):
+        print(f"Connection lost: {addr}")
 
     finally:
         writer.close()
-        await writer.wait_closed()
+        try:
+            await writer.wait_closed()
+        except (ConnectionResetError, BrokenPipeError):
+            # Note: exec_file(wait_timeout=0) hangs up without waiting for the status.
+            pass
         print(f"Client disconnected: {addr}")
 
 
@@ -667,8 +742,10 @@ async def handle_exec_client(reader: asyncio.StreamReader, writer: asyncio.Strea
 '''
 async def start_exec_server(socket_path: str=None, host: str=None, port: int=None, namespace={}):
     try:
+        engine = SandboxEngine(namespace)
+
         async def handle_exec_client_wrapper(reader, writer):
-            await handle_exec_client(reader, writer, namespace)
+            await handle_exec_client(reader, writer, namespace, engine)
 
         server = None
         if socket_path:
@@ -716,9 +793,18 @@ async def exec_file(
         port: int=None,
         fpath: str=None,
         wait_timeout: int=0,
-        # TODO: Consider some kind of conditional instead of wait_timeout.
         ):
+    """Run a file on the exec server, streaming its output here.
+
+      Only the file's hash goes over the wire when the server already has
+      it compiled.
 
+      Args:
+        wait_timeout: Seconds to wait for the script to finish. 0 sends it and
+                      returns right away, negative waits with no limit.
+
+      Returns: Status dict (see the exec protocol) or None.
+    """
     reader = None
     writer = None
     if socket_path:
@@ -732,50 +818,60 @@ async def exec_file(
         try:
             reader, writer = await asyncio.open_connection(host, port)
             print(f"Connected to exec server at {host}:{port}")
-        except FileNotFoundError:
+        except (FileNotFoundError, ConnectionRefusedError):
             print(f"Unable to connect to: {host}:{port}")
             return
 
-
-    async def read_from_server():
+    async def read_until_status():
         while True:
-            data = await reader.read(1024)
-            if not data:
+            kind, payload = await read_frame(reader)
+            if kind is None:
                 print("Server closed connection")
-                break
-            sys.stdout.write(data.decode())
-            sys.stdout.flush()
-
-    async def do_wait_timeout():
-        if wait_timeout > 0:
-            await asyncio.sleep(wait_timeout)
-            exit(0)
-        elif wait_timeout == 0:
-            exit(0)
-        else:
-            while True:
-                await asyncio.sleep(0xFFFF)
+                return None
+            if kind == FRAME_OUTPUT:
+                sys.stdout.write(payload.decode())
+                sys.stdout.flush()
+            elif kind == FRAME_STATUS:
+                return json.loads(payload.decode())
 
-    try:    
+    async def request():
+        write_frame(writer, EXEC_HASH, SandboxEngine.digest(file_data).encode())
+        await writer.drain()
+        status = await read_until_status()
+        if status and status['missing']:
+            write_frame(writer, EXEC_SOURCE, file_data.encode())
+            await writer.drain()
+            status = await read_until_status()
+        return status
+
+    try:
         with open(fpath, "r") as f:
-            # Read the code
             file_data = f.read()
-            
-            # Write the packet
-            # Note: first 4 bytes are the length.
-            packet = struct.pack(">I", len(file_data)) + file_data.encode()
-            writer.write(packet)
+
+        if wait_timeout == 0:
+            # Don't wait for anything, not even a cache check.
+            write_frame(writer, EXEC_SOURCE, file_data.encode())
+            writer.write(struct.pack(">BI", 0, 0))
             await writer.drain()
+            return None
 
-            # Wait for a response or timeout.
-            await asyncio.gather(read_from_server(), do_wait_timeout())
+        status = await asyncio.wait_for(request(), timeout=wait_timeout if wait_timeout > 0 else None)
+        if status and status['error']:
+            print(status['error'])
+
+        # End the session.
+        writer.write(struct.pack(">BI", 0, 0))
+        await writer.drain()
+        return status
+
+    except asyncio.TimeoutError:
+        print(f"\nNo result within {wait_timeout}s")
 
     except ConnectionResetError:
         print("\nClient disconnected")
-        pass
 
-    except SystemExit:
-        print("\nClient disconnected")
+    finally:
+        writer.close()
 
 
 '''
@@ -795,6 +891,8 @@ async def exec_file(
             repl_socket_path="/tmp/repl.sock", repl_namespace=globals(),
             exec_socket_path="/tmp/exec.sock", exec_namespace=globals(),
             dict_socket_path="/tmp/dict.sock", dict_shared_dict=shared_dict,
+            # Or, read-only snapshots for other processes. See shm.py
+            # shm_state=dbg.state, shm_name="jdwp-state",
         )
         sandbox_task = asyncio.create_task(sandbox_coro)
         await asyncio.gather(sandbox_task)
@@ -816,15 +914,19 @@ async def start_sandbox(
         dict_port: int=None,
         dict_authkey: str=b'secret',
         dict_shared_dict: dict={},
+        shm_state=None,
+        shm_name: str='jdwp-state',
+        shm_interval: float=1.0,
     ):
-    
+
+    tasks = []
     if repl_socket_path or repl_host:
         repl_server_coro = start_repl_server(
             socket_path=repl_socket_path,
             host=repl_host,
             port=repl_port,
             namespace=repl_namespace)
-        repl_server_task = asyncio.create_task(repl_server_coro)
+        tasks.append(asyncio.create_task(repl_server_coro))
 
     if exec_socket_path or exec_host:
         exec_server_coro = start_exec_server(
@@ -832,7 +934,7 @@ async def start_sandbox(
             host=exec_host,
             port=exec_port,
             namespace=exec_namespace)
-        exec_server_task = asyncio.create_task(exec_server_coro)
+        tasks.append(asyncio.create_task(exec_server_coro))
 
     if dict_socket_path or dict_host:
         dict_server_coro = start_dict_server(
@@ -841,11 +943,17 @@ async def start_sandbox(
             port=dict_port,
             authkey=dict_authkey,
             shared_dict=dict_shared_dict)
-        dict_server_task = asyncio.create_task(dict_server_coro)
+        tasks.append(asyncio.create_task(dict_server_coro))
 
-    hot_reload_task = asyncio.create_task(handle_hot_reload())
-    
-    await asyncio.gather(repl_server_task, exec_server_task, hot_reload_task)
+    if shm_state is not None:
+        publisher = StatePublisher(shm_state, shm_name, shm_interval)
+        tasks.append(asyncio.create_task(publisher.run()))
+
+    # Rebinds what the sandbox namespace (e.g. dbg) refers to after a reload.
+    hot_reload_namespace = repl_namespace if repl_socket_path or repl_host else exec_namespace
+    tasks.append(asyncio.create_task(handle_hot_reload(namespace=hot_reload_namespace)))
+
+    await asyncio.gather(*tasks)
          
 
 # if __name__ == "__main__":
@@ -0,0 +1,281 @@
+'''
+Copyright (c) 2025 Vincent Agriesti
+
+This file is part of the thirdparty JDWP project.
+Licensed under the MIT License. See the LICENSE file in the project root
+for full license text.
+'''
+
+import ast
+import asyncio
+import contextvars
+import hashlib
+import inspect
+import io
+import sys
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+'''
+Execution engine for the sandbox REPL and exec servers.
+
+contextlib.redirect_stdout() swaps the process wide sys.stdout, so with two
+clients connected (or a debugger event handler printing meanwhile) output
+lands in whichever socket redirected last. And exec() on the event loop
+stalls JDWP event processing for as long as the code runs.
+
+Instead:
+
+  - sys.stdout/sys.stderr are replaced once by a router that writes to the
+    stream in the current_output context variable, or to the real stream
+    when it isn't set. Every run sets it to its own CapturedOutput, so
+    output follows the code that produced it. Everything else (event
+    handlers, the debugger) keeps printing to the console.
+  - Code without a top level await runs on a thread pool, with the run's
+    context copied in. Blocking code that needs the debugger can call
+    sync(coro), which runs the coroutine on the debugger loop and waits.
+    Note: That thread has no running loop, so exec scripts that call
+    asyncio.get_running_loop() or asyncio.create_task() without a top
+    level await now fail. Use sync() (or add an await) instead.
+  - Code with a top level await is compiled with PyCF_ALLOW_TOP_LEVEL_AWAIT
+    and awaited on the debugger loop, in its own task.
+
+    engine = SandboxEngine(globals())
+    output, error = await engine.run("x = await dbg.frame(thread)\nprint(x)")
+
+Compiled code is cached by content hash (compile()/run_digest()), so pushing
+the same script again skips the compile, and over the exec protocol the
+source isn't even re-sent.
+
+Note: Tasks created by client code inherit its context, so they keep
+      writing into that client's (by then finished) output.
+'''
+
+
+current_output = contextvars.ContextVar('current_output', default=None)
+current_engine = contextvars.ContextVar('current_engine', default=None)
+
+
+class _OutputRouter(io.TextIOBase):
+    """Stands in for sys.stdout/sys.stderr, see current_output."""
+
+    def __init__(self, stream):
+        self.stream = stream
+
+
+    def _target(self):
+        return current_output.get() or self.stream
+
+
+    def write(self, data):
+        return self._target().write(data)
+
+
+    def flush(self):
+        self._target().flush()
+
+
+    def writable(self):
+        return True
+
+
+    # Note: io.TextIOBase defines these itself, so __getattr__ never sees them.
+    @property
+    def encoding(self):
+        return self.stream.encoding
+
+
+    @property
+    def errors(self):
+        return self.stream.errors
+
+
+    def isatty(self):
+        return self.stream.isatty()
+
+
+    def fileno(self):
+        return self.stream.fileno()
+
+
+    def __getattr__(self, name):
+        # Anything else of the real stream (buffer, mode, ...).
+        return getattr(self.stream, name)
+
+
+def install_output_router():
+    """Route sys.stdout/sys.stderr through current_output. Idempotent."""
+    if not isinstance(sys.stdout, _OutputRouter):
+        sys.stdout = _OutputRouter(sys.stdout)
+    if not isinstance(sys.stderr, _OutputRouter):
+        sys.stderr = _OutputRouter(sys.stderr)
+
+
+class CapturedOutput(io.TextIOBase):
+    """Output of one run, optionally echoed to the real stdout as it's written."""
+
+    def __init__(self, echo=False):
+        self.buffer = io.StringIO()
+        self.echo = sys.__stdout__ if echo else None
+
+
+    def write(self, data):
+        if self.echo:
+            self.echo.write(data)
+            self.echo.flush()
+        return self.buffer.write(data)
+
+
+    def writable(self):
+        return True
+
+
+    def getvalue(self):
+        return self.buffer.getvalue()
+
+
+def sync(coro, timeout=None):
+    """From blocking sandbox code: run coro on the debugger loop and wait for it."""
+    engine = current_engine.get()
+    if engine is None:
+        raise RuntimeError("sync() called outside of a sandbox run")
+    return asyncio.run_coroutine_threadsafe(coro, engine.loop).result(timeout)
+
+
+class StreamOutput(io.TextIOBase):
+    """Hands every write to an asyncio.Queue on loop, from any thread."""
+
+    def __init__(self, loop, queue):
+        self.loop = loop
+        self.queue = queue
+
+
+    def write(self, data):
+        if data:
+            self.loop.call_soon_threadsafe(self.queue.put_nowait, data)
+        return len(data)
+
+
+    def writable(self):
+        return True
+
+
+class SandboxEngine():
+
+    def __init__(self, namespace, workers=4, echo=False, cache_size=64):
+        """
+          Args:
+            namespace (dict): Globals the code runs in (shared by all clients).
+            workers (int): Blocking runs that can go at once.
+            echo (bool): Also write client output to the server's console.
+            cache_size (int): Compiled sources kept, by content hash.
+        """
+        self.namespace = namespace
+        self.echo = echo
+        self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='sandbox')
+        self.loop = None
+        # sha256 hex digest -> (code object, is expression, is awaitable), oldest first.
+        self.code_cache = OrderedDict()
+        self.cache_size = cache_size
+        install_output_router()
+
+
+    @staticmethod
+    def digest(source):
+        return hashlib.sha256(source.encode()).hexdigest()
+
+
+    def compile(self, source, filename='<sandbox>'):
+        """Compile source (or find it already compiled). Raises SyntaxError.
+
+          Returns: Content digest, for run_digest().
+        """
+        digest = SandboxEngine.digest(source)
+        if digest in self.code_cache:
+            self.code_cache.move_to_end(digest)
+            return digest
+
+        tree = ast.parse(source, filename, mode='exec')
+        is_expr = len(tree.body) == 1 and isinstance(tree.body[0], ast.Expr)
+        mode = 'eval' if is_expr else 'exec'
+        code = compile(source, filename, mode, flags=ast.PyCF_ALLOW_TOP_LEVEL_AWAIT)
+        self.code_cache[digest] = (code, is_expr, bool(code.co_flags & inspect.CO_COROUTINE))
+        while len(self.code_cache) > self.cache_size:
+            self.code_cache.popitem(last=False)
+        return digest
+
+
+    def has(self, digest):
+        return digest in self.code_cache
+
+
+    async def run(self, source, output=None, filename='<sandbox>'):
+        """Run source with its output captured for the caller alone.
+
+          Args:
+            output: Stream to print into, default a new CapturedOutput.
+
+          Returns: (output str, exception or None). The str is only the
+                   output when it was captured here.
+        """
+        try:
+            digest = self.compile(source, filename)
+        except SyntaxError as e:
+            return f"SyntaxError: {e}\n", e
+        return await self.run_digest(digest, output)
+
+
+    async def run_digest(self, digest, output=None):
+        """Run previously compiled code, see compile(). Raises KeyError if it's not cached.
+
+          Returns: (output str, exception or None), like run().
+        """
+        code, is_expr, awaitable = self.code_cache[digest]
+        self.code_cache.move_to_end(digest)
+        output = output if output is not None else CapturedOutput(self.echo)
+
+        def blocking():
+            ret = eval(code, self.namespace)
+            if is_expr and ret is not None:
+                print(ret)
+
+        async def awaiting():
+            ret = await eval(code, self.namespace)
+            if is_expr and ret is not None:
+                print(ret)
+
+        error = None
+        try:
+            if awaitable:
+                await self._in_context(output, awaiting)
+            else:
+                await self.call(blocking, output=output)
+        except Exception as e:
+            error = e
+        return output.getvalue() if isinstance(output, CapturedOutput) else '', error
+
+
+    async def call(self, func, *args, output=None):
+        """Run a blocking callable on the pool, printing into output (default: a new CapturedOutput).
+
+          Returns: func's return value. Raises whatever func raises.
+        """
+        self.loop = asyncio.get_running_loop()
+        output = output if output is not None else CapturedOutput(self.echo)
+        context = contextvars.copy_context()
+        context.run(current_output.set, output)
+        context.run(current_engine.set, self)
+        return await self.loop.run_in_executor(self.executor, context.run, func, *args)
+
+
+    async def _in_context(self, output, coro_func):
+        self.loop = asyncio.get_running_loop()
+        context = contextvars.copy_context()
+        context.run(current_output.set, output)
+        context.run(current_engine.set, self)
+        # A task of its own, created in (so copying) the run's context.
+        return await context.run(self.loop.create_task, coro_func())
+
+
+    def close(self):
+        self.executor.shutdown(wait=False)
@@ -0,0 +1,466 @@
+'''
+Copyright (c) 2025 Vincent Agriesti
+
+This file is part of the thirdparty JDWP project.
+Licensed under the MIT License. See the LICENSE file in the project root
+for full license text.
+'''
+
+import os
+import sys
+import time
+import types
+import struct
+import asyncio
+import ctypes
+import ctypes.util
+import importlib
+import traceback
+from collections import deque
+from weakref import WeakValueDictionary
+
+'''
+Hot reload of the debugger's own modules without losing the attach.
+
+handle_hot_reload() used to poll getmtime() of each registered module once a
+second and importlib.reload() just that module. Anything that had imported
+from it (`from ...state import ClassInfo`) kept the old class, and the live
+Debugger/ClassInfo objects kept running old code.
+
+HotReloader:
+
+  - Watches the directories of every loaded module under `packages` (plus the
+    registered ones) with inotify, so a save is seen right away. Off Linux,
+    or if inotify can't be set up, it polls mtimes every poll_interval.
+  - Debounces: editors write, rename and chmod in a burst, the reload
+    happens once things have been quiet for `debounce` seconds.
+  - Reloads the changed modules and everything under `packages` that
+    (transitively) imports from them, dependencies first.
+  - Rebinds live objects: walks from the roots (track()ed objects and the
+    sandbox namespace) through the instances of our own classes and plain
+    containers, setting __class__ of every instance of a reloaded class to
+    its new version. DebuggerState is what holds the long lived data
+    (class table, handles, deferred breakpoints, ...), and it's rebound in
+    place rather than rebuilt, so nothing fetched from the VM is lost.
+    Names in the namespace bound to old classes/functions are updated too.
+
+    reloader = HotReloader(['thirdparty.debug'], namespace=globals())
+    reloader.track(dbg)
+    asyncio.create_task(reloader.run())
+
+Note: Event handlers registered with Jdwp are closures over the old code,
+      they are not replaced. Re-register them if they changed.
+Note: A class whose __slots__ changed can't be rebound (layout differs),
+      those instances keep the old class and are reported.
+'''
+
+
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_Q_OVERFLOW = 0x00004000
+_inotify_event = struct.Struct('iIII')
+
+# Values the rebind walk never needs to look into.
+_ATOMIC = (str, bytes, bytearray, int, float, bool, complex, type(None), memoryview, types.FunctionType,
+    types.BuiltinFunctionType, types.MethodType, types.ModuleType, type)
+
+
+class _Inotify():
+    """Minimal ctypes inotify, directories only. Raises OSError if unavailable."""
+
+    def __init__(self):
+        if not sys.platform.startswith('linux'):
+            raise OSError('inotify is Linux only')
+        self.libc = ctypes.CDLL(ctypes.util.find_library('c') or 'libc.so.6', use_errno=True)
+        self.fd = self.libc.inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC)
+        if self.fd < 0:
+            raise OSError(ctypes.get_errno(), 'inotify_init1 failed')
+        self.dirs_by_wd = {}
+        # Directories inotify_add_watch() failed on, not retried.
+        self.failed = set()
+
+
+    def watch(self, directory):
+        if directory in self.failed or directory in self.dirs_by_wd.values():
+            return
+        wd = self.libc.inotify_add_watch(self.fd, os.fsencode(directory), IN_CLOSE_WRITE | IN_MOVED_TO | IN_CREATE)
+        if wd < 0:
+            print(f"ERROR: Failed to watch {directory}: {os.strerror(ctypes.get_errno())}")
+            self.failed.add(directory)
+            return
+        self.dirs_by_wd[wd] = directory
+
+
+    def read(self):
+        """Paths touched since the last read, None if events were dropped."""
+        paths = set()
+        try:
+            data = os.read(self.fd, 64 * 1024)
+        except BlockingIOError:
+            return paths
+        offset = 0
+        while offset + _inotify_event.size <= len(data):
+            wd, mask, _, length = _inotify_event.unpack_from(data, offset)
+            offset += _inotify_event.size
+            name = data[offset:offset + length].rstrip(b'\0')
+            offset += length
+            if mask & IN_Q_OVERFLOW:
+                return None
+            if wd in self.dirs_by_wd and name:
+                paths.add(os.path.join(self.dirs_by_wd[wd], os.fsdecode(name)))
+        return paths
+
+
+    def close(self):
+        os.close(self.fd)
+
+
+def module_dependencies(module, candidates):
+    """Names in candidates that module imports from, going by what its globals refer to."""
+    deps = set()
+    for value in list(vars(module).values()):
+        if isinstance(value, types.ModuleType):
+            name = value.__name__
+        else:
+            name = getattr(value, '__module__', None) if isinstance(value, (type, types.FunctionType)) else None
+        if name in candidates and name != module.__name__:
+            deps.add(name)
+    return deps
+
+
+def reload_order(changed, modules):
+    """changed and every module that depends on them, dependencies first.
+
+      Args:
+        changed (set): Module names that changed on disk.
+        modules (dict): name -> module, the candidates for reloading.
+    """
+    deps = {name: module_dependencies(module, modules) for name, module in modules.items()}
+    dependents = {name: set() for name in modules}
+    for name, uses in deps.items():
+        for dep in uses:
+            dependents[dep].add(name)
+
+    todo = set()
+    queue = deque(name for name in changed if name in modules)
+    while queue:
+        name = queue.popleft()
+        if name not in todo:
+            todo.add(name)
+            queue.extend(dependents[name])
+
+    # Kahn's, restricted to todo. Import cycles go last in name order.
+    pending = {name: len(deps[name] & todo) for name in todo}
+    ready = sorted(name for name, count in pending.items() if not count)
+    order = []
+    while ready:
+        name = ready.pop(0)
+        order.append(name)
+        for user in sorted(dependents[name] & todo):
+            pending[user] -= 1
+            if pending[user] == 0:
+                ready.append(user)
+    order.extend(sorted(todo - set(order)))
+    return order
+
+
+def _module_classes(module):
+    """qualname -> class for every class defined in module, nested ones included."""
+    classes = {}
+    stack = [value for value in vars(module).values()
+        if isinstance(value, type) and value.__module__ == module.__name__]
+    while stack:
+        cls = stack.pop()
+        if cls.__qualname__ in classes:
+            continue
+        classes[cls.__qualname__] = cls
+        stack.extend(value for value in vars(cls).values()
+            if isinstance(value, type) and value.__module__ == module.__name__)
+    return classes
+
+
+class HotReloader():
+
+    def __init__(self, modules=(), packages=None, namespace=None, debounce=0.2, poll_interval=1.0,
+            exclude=('thirdparty.sandbox',)):
+        """
+          Args:
+            modules: Modules (or names) to always watch.
+            packages (tuple): Name prefixes of modules that may be reloaded,
+                              default the package each of modules is in.
+            namespace (dict): Sandbox globals to rebind, also a rebind root.
+            debounce (float): Quiet seconds before a reload.
+            poll_interval (float): Seconds between mtime checks without inotify,
+                                   and between looking for new modules to watch with it.
+            exclude (tuple): Name prefixes never reloaded, unless listed in
+                             modules. The sandbox itself is running the
+                             servers (and this reloader).
+        """
+        self.modules = modules
+        self.packages = tuple(packages) if packages else None
+        self.exclude = tuple(exclude)
+        self.namespace = namespace
+        self.debounce = debounce
+        self.poll_interval = poll_interval
+        self.roots = []
+        self.inotify = None
+        self.mtimes = {}
+        self.pending = set()
+        self._timer = None
+        self.reloads = 0
+
+
+    def track(self, obj):
+        """Rebind obj (and what it references) on every reload, e.g. a Debugger."""
+        if not any(root is obj for root in self.roots):
+            self.roots.append(obj)
+
+
+    def _module_names(self):
+        names = []
+        for module in self.modules:
+            names.append(module if isinstance(module, str) else module.__name__)
+        return names
+
+
+    def _default_packages(self, names):
+        packages = set()
+        for name in names:
+            # Note: A registered package covers its own submodules, a plain module its siblings.
+            if hasattr(sys.modules.get(name), '__path__'):
+                packages.add(name)
+            else:
+                packages.add(name.rpartition('.')[0] or name)
+        return tuple(packages)
+
+
+    def candidates(self):
+        """name -> module for everything loaded that may be reloaded."""
+        names = self._module_names()
+        packages = self.packages or self._default_packages(names)
+        modules = {}
+        for name, module in list(sys.modules.items()):
+            if module is None or not getattr(module, '__file__', None):
+                continue
+            # Modules given explicitly are always candidates, exclude or not.
+            if name in names:
+                modules[name] = module
+                continue
+            if any(name == pkg or name.startswith(pkg + '.') for pkg in self.exclude):
+                continue
+            if any(name == pkg or name.startswith(pkg + '.') for pkg in packages):
+                modules[name] = module
+        return modules
+
+
+    def _files(self):
+        """Source path -> module name of every candidate."""
+        files = {}
+        for name, module in self.candidates().items():
+            path = module.__file__
+            if path.endswith('.pyc'):
+                continue
+            files[os.path.realpath(path)] = name
+        return files
+
+
+    def _refresh_watches(self):
+        files = self._files()
+        for path in files:
+            if path not in self.mtimes:
+                try:
+                    self.mtimes[path] = os.path.getmtime(path)
+                except OSError:
+                    continue
+            if self.inotify:
+                self.inotify.watch(os.path.dirname(path))
+        return files
+
+
+    def _changed_paths(self, paths):
+        """Of paths, the known sources whose mtime really changed."""
+        changed = set()
+        for path in paths:
+            path = os.path.realpath(path)
+            if path not in self.mtimes:
+                continue
+            try:
+                mtime = os.path.getmtime(path)
+            except OSError:
+                # Mid rename, the IN_MOVED_TO will follow.
+                continue
+            if mtime != self.mtimes[path]:
+                self.mtimes[path] = mtime
+                changed.add(path)
+        return changed
+
+
+    def _on_paths(self, paths):
+        self.pending |= self._changed_paths(paths)
+        if not self.pending:
+            return
+        # Debounce, restart the quiet period on every event.
+        if self._timer:
+            self._timer.cancel()
+        self._timer = asyncio.get_running_loop().call_later(self.debounce, self._flush)
+
+
+    def _on_inotify(self):
+        paths = self.inotify.read()
+        self._on_paths(self.mtimes.keys() if paths is None else paths)
+
+
+    def _flush(self):
+        self._timer = None
+        files = self._files()
+        changed = {files[path] for path in self.pending if path in files}
+        self.pending = set()
+        if changed:
+            self.reload(changed)
+        self._refresh_watches()
+
+
+    def reload(self, changed):
+        """Reload changed (module names) and their dependents, then rebind.
+
+          Returns: List of reloaded module names, None on failure.
+        """
+        modules = self.candidates()
+        order = reload_order(set(changed), modules)
+        old_classes = {name: _module_classes(modules[name]) for name in order}
+
+        started = time.perf_counter()
+        reloaded = []
+        for name in order:
+            try:
+                importlib.reload(modules[name])
+                reloaded.append(name)
+            except Exception as e:
+                print(f"ERROR: Failed to reload {name}: {e}")
+                traceback.print_exc()
+                # Note: What already reloaded stays reloaded, still rebind to it.
+                break
+
+        class_map = {}
+        for name in reloaded:
+            new_classes = _module_classes(modules[name])
+            for qualname, old in old_classes[name].items():
+                new = new_classes.get(qualname)
+                if new is not None and new is not old:
+                    class_map[old] = new
+
+        rebound, failed = self.rebind(class_map, modules, reloaded)
+        self.reloads += 1
+        elapsed = (time.perf_counter() - started) * 1000
+        if reloaded:
+            print(f"Reloaded {', '.join(reloaded)} in {elapsed:.0f}ms, rebound {rebound} objects")
+        if failed:
+            print(f"ERROR: Layout changed, kept the old class for: {', '.join(sorted(failed))}")
+        return reloaded if len(reloaded) == len(order) else None
+
+
+    def rebind(self, class_map, modules=None, reloaded=()):
+        """Point every reachable instance of an old class in class_map at its new class.
+
+          Returns: (objects rebound, set of class names that couldn't be)
+        """
+        rebound = 0
+        failed = set()
+        if not class_map:
+            return rebound, failed
+
+        if self.namespace is not None:
+            self._rebind_namespace(self.namespace, class_map, modules or {}, set(reloaded))
+
+        seen = set()
+        stack = list(self.roots)
+        if self.namespace is not None:
+            stack.extend(self.namespace.values())
+        while stack:
+            obj = stack.pop()
+            if isinstance(obj, _ATOMIC) or id(obj) in seen:
+                continue
+            seen.add(id(obj))
+
+            if isinstance(obj, (list, tuple, set, frozenset, deque)):
+                stack.extend(obj)
+                continue
+            if isinstance(obj, dict):
+                stack.extend(obj.values())
+                continue
+            if isinstance(obj, WeakValueDictionary):
+                stack.extend(obj.values())
+                continue
+
+            cls = type(obj)
+            module = getattr(cls, '__module__', '') or ''
+            if cls not in class_map and (modules is None or module not in modules):
+                # Not ours, don't go poking around in it.
+                continue
+
+            new = class_map.get(cls)
+            if new is not None:
+                try:
+                    obj.__class__ = new
+                    rebound += 1
+                except TypeError:
+                    failed.add(cls.__qualname__)
+
+            if hasattr(obj, '__dict__'):
+                stack.extend(vars(obj).values())
+            for klass in cls.__mro__:
+                for slot in getattr(klass, '__slots__', ()):
+                    value = getattr(obj, slot, None)
+                    if value is not None:
+                        stack.append(value)
+        return rebound, failed
+
+
+    def _rebind_namespace(self, namespace, class_map, modules, reloaded):
+        for key, value in list(namespace.items()):
+            if isinstance(value, type) and value in class_map:
+                namespace[key] = class_map[value]
+            elif isinstance(value, types.FunctionType) and value.__module__ in reloaded:
+                new = getattr(modules.get(value.__module__), value.__name__, None)
+                if isinstance(new, types.FunctionType):
+                    namespace[key] = new
+
+
+    async def run(self):
+        """Watch and reload until cancelled."""
+        try:
+            self.inotify = _Inotify()
+        except OSError as e:
+            print(f"Hot reload polling every {self.poll_interval}s ({e})")
+            self.inotify = None
+        self._refresh_watches()
+
+        loop = asyncio.get_running_loop()
+        try:
+            if self.inotify:
+                loop.add_reader(self.inotify.fd, self._on_inotify)
+                while True:
+                    # Note: Picks up modules registered with hot_reload_module()
+                    #       (or imported) since the last refresh.
+                    await asyncio.sleep(self.poll_interval)
+                    self._refresh_watches()
+            else:
+                while True:
+                    await asyncio.sleep(self.poll_interval)
+                    self._on_paths(self._refresh_watches().keys())
+        finally:
+            if self._timer:
+                self._timer.cancel()
+            if self.inotify:
+                loop.remove_reader(self.inotify.fd)
+                self.inotify.close()
+                self.inotify = None
+
+
+    def __repr__(self):
+        try:
+            mode = 'inotify' if self.inotify else 'polling'
+            return f'HotReloader({mode}, {len(self.mtimes)} files, {len(self.roots)} roots, {self.reloads} reloads)'
+        except Exception as e:
+            return f"HotReloader(ERROR: {e})"
@@ -22,6 +22,7 @@ import json
 import io
 import contextlib
 import traceback
+from thirdparty.sandbox.engine import SandboxEngine
 
 
 identifier_re = re.compile(r'^[A-Za-z_][A-Za-z0-9_]*$')
@@ -384,7 +385,8 @@ class Repl():
 
 
     @staticmethod
-    async def _handle_repl_client(reader: asyncio.StreamReader, writer: asyncio.StreamWriter, namespace):
+    async def _handle_repl_client(reader: asyncio.StreamReader, writer: asyncio.StreamWriter, namespace, engine=None):
+        engine = engine or SandboxEngine(namespace, echo=True)
         try:
             addr = writer.get_extra_info("peername") or "unix-client"
             print(f"Client connected: {addr}")
@@ -400,38 +402,13 @@ class Repl():
                 final_buffer = json.loads(final_buffer_json.decode())
                 final_src = '\n'.join([*final_buffer, ''])
 
-                import sys
-                import io
-                import contextlib
-                class Tee(io.TextIOBase):
-                    def __init__(self, *streams):
-                        self.streams = streams
-                    def write(self, data):
-                        for s in self.streams:
-                            s.write(data)
-                            s.flush()
-                        return len(data)
-                    def flush(self):
-                        for s in self.streams:
-                            s.flush()
-
-                output = io.StringIO()
-                tee_out = Tee(sys.stdout, output)
-                tee_err = Tee(sys.stderr, output)
-
-                with contextlib.redirect_stdout(tee_out), contextlib.redirect_stderr(tee_err):
-                    try:
-                        if len(final_src) > 0:
-                            if len(final_buffer) == 1:
-                                await async_run_single_line(final_buffer[0], namespace)
-                            else:
-                                exec(final_src, namespace, namespace)
-                    except EOFError:
-                        raise
-                    except Exception as e:
-                        print(f"Exception: {e} Line:{traceback.format_exc()}")
-                    
-                captured = output.getvalue().replace('\n', '\r\n')
+                # Own output per client, echoed to the server console like before.
+                output, error = await engine.run(final_src)
+                if error:
+                    trace = ''.join(traceback.format_exception(type(error), error, error.__traceback__))
+                    output += f"Exception: {error} Line:{trace}"
+
+                captured = output.replace('\n', '\r\n')
                 print(captured.encode())
                 resp = json.dumps([len(captured), captured])
                 #print(resp.encode())
@@ -452,8 +429,10 @@ class Repl():
 
     async def start_repl_server(self, socket_path: str=None, host: str=None, port: int=None):
         try:
+            engine = SandboxEngine(self.namespace, echo=True)
+
             async def handle_repl_client_wrapper(reader, writer):
-                await Repl._handle_repl_client(reader, writer, self.namespace)
+                await Repl._handle_repl_client(reader, writer, self.namespace, engine)
 
             server = None
             if socket_path:
@@ -0,0 +1,470 @@
+'''
+Copyright (c) 2025 Vincent Agriesti
+
+This file is part of the thirdparty JDWP project.
+Licensed under the MIT License. See the LICENSE file in the project root
+for full license text.
+'''
+
+import sys
+import time
+import struct
+import asyncio
+from array import array
+from itertools import accumulate
+from multiprocessing import shared_memory, resource_tracker
+
+'''
+Read-only DebuggerState snapshots in shared memory.
+
+start_dict_server() hands out a BaseManager proxy, every __getitem__ is a
+pickled round trip over a socket, so walking 60k classes from another
+process takes seconds. Instead StatePublisher periodically (only when
+something changed) writes the class, thread and recent event tables into a
+fresh shared memory segment, column by column, and StateReader maps it.
+Columns are memoryviews straight into the segment, nothing is copied or
+unpickled on the reading side and any number of local processes can read.
+
+Segments:
+
+  <name>             index, points at the current snapshot. Tiny and
+                     rewritten in place under a sequence lock.
+  <name>-<gen>       one snapshot, never written again once published.
+                     The publisher unlinks all but the last `keep`, a reader
+                     that already mapped one keeps it until it closes it.
+
+Snapshot layout (little endian):
+
+    header  '4sIQdQQII'  magic 'JDSD', layout version, generation, time,
+                         suspend_epoch, events_seen, column count, pad
+    column  '32s1s7xIQQ' name ('table.column'), format, rows, offset, nbytes
+    data    each column 8 byte aligned. Formats are array typecodes, plus
+            'S' for strings: u32 offsets[rows + 1] then the utf-8 bytes.
+
+Tables:
+
+    classes  type_id Q, tag B, status B, signature S (empty once unloaded)
+    threads  thread_id Q, alive B, frames I, event_kind B (last stop event, 0 if none)
+    events   seq Q, time d, kind B, request_id i, thread Q, class_id Q, method_id Q, index q
+             (DebuggerState.recent_events, oldest first)
+
+Publisher side (in the debugger process):
+
+    publisher = StatePublisher(dbg.state, 'jdwp-state')
+    asyncio.create_task(publisher.run())
+
+or start_sandbox(..., shm_state=dbg.state). Reader side (any process):
+
+    from thirdparty.sandbox.shm import StateReader
+
+    with StateReader('jdwp-state') as reader, reader.snapshot() as snap:
+        classes = snap['classes']
+        for row in range(len(classes)):
+            print(hex(classes['type_id'][row]), classes.string('signature', row))
+
+Note: Only changes in table sizes, events, or the suspend epoch trigger a
+      publish. In place status changes wait for the next one (or publish(force=True)).
+      Class signatures are encoded once, a publish only encodes the rows
+      added since the last one (all of them again after a class unload).
+'''
+
+
+SNAPSHOT_MAGIC = b'JDSD'
+INDEX_MAGIC = b'JDSI'
+LAYOUT_VERSION = 1
+
+_index = struct.Struct('<4sIQQd64s')
+_header = struct.Struct('<4sIQdQQII')
+_column = struct.Struct('<32s1s7xIQQ')
+
+
+# Segments a StatePublisher in this process created (and the tracker should keep).
+_published = set()
+
+
+def _attach(name):
+    """Map an existing segment without handing it to this process's resource tracker."""
+    if sys.version_info >= (3, 13):
+        return shared_memory.SharedMemory(name=name, track=False)
+    shm = shared_memory.SharedMemory(name=name)
+    # Note: Before 3.13 the tracker unlinks anything attached when the reader exits.
+    if shm._name not in _published:
+        resource_tracker.unregister(shm._name, 'shared_memory')
+    return shm
+
+
+def _create(name, size):
+    shm = shared_memory.SharedMemory(name=name, create=True, size=size)
+    _published.add(shm._name)
+    return shm
+
+
+def _unlink(shm):
+    shm.close()
+    shm.unlink()
+    _published.discard(shm._name)
+
+
+def _align(offset):
+    return (offset + 7) & ~7
+
+
+class _StringColumn():
+    """'S' column bytes for a list of str (or None) that only grows.
+
+    Rows already encoded are kept, an update() only encodes the new ones.
+    reset() when an existing row changes.
+    """
+
+    def __init__(self):
+        self.reset()
+
+
+    def reset(self):
+        self.rows = 0
+        self.offsets = array('I', [0])
+        self.blob = bytearray()
+
+
+    def update(self, values, rows):
+        encoded = [value.encode() if value else b'' for value in values[self.rows:rows]]
+        end = self.offsets[-1]
+        self.offsets.extend(end + size for size in accumulate(len(value) for value in encoded))
+        self.blob += b''.join(encoded)
+        self.rows = rows
+        return self.offsets.tobytes() + self.blob
+
+
+class StatePublisher():
+
+    def __init__(self, state, name='jdwp-state', interval=1.0, keep=2):
+        """
+          Args:
+            state (DebuggerState): What to publish.
+            name (str): Index segment name, readers open this.
+            interval (float): Seconds between checks for changes in run().
+            keep (int): Snapshots left linked, so a reader that just read
+                        the index still finds the one it points at.
+        """
+        self.state = state
+        self.name = name
+        self.interval = interval
+        self.keep = max(keep, 1)
+        self.generation = 0
+        self.segments = []
+        self._token = None
+        self._seq = 0
+
+        # Class signatures are encoded incrementally, 60k of them every
+        # interval would stall the loop while stepping.
+        self._signatures = _StringColumn()
+        self._removed_classes = 0
+
+        try:
+            # Left behind by a publisher that didn't get to close().
+            shared_memory.SharedMemory(name=name).unlink()
+        except FileNotFoundError:
+            pass
+        self.index = _create(name, _index.size)
+        self._write_index('')
+
+
+    def _change_token(self):
+        state = self.state
+        return (len(state.classes.type_ids), len(state.classes), len(state.threads_by_id),
+            len(state.dead_threads), state.events_seen, state.suspend_epoch)
+
+
+    def columns(self):
+        """(name, format, rows, bytes-like) for every published column."""
+        table = self.state.classes
+        class_rows = len(table.type_ids)
+
+        # Note: Rows only change in place (signature -> None) when a class is
+        #       removed, anything else is an append.
+        removed = class_rows - len(table)
+        if removed != self._removed_classes or class_rows < self._signatures.rows:
+            self._signatures.reset()
+            self._removed_classes = removed
+
+        threads = [(thread, 1) for thread in self.state.threads_by_id.values()]
+        threads += [(thread, 0) for thread in self.state.dead_threads]
+
+        events = list(self.state.recent_events)
+        seqs, times, kinds, requests, event_threads, class_ids, method_ids, indexes = \
+            zip(*events) if events else ((),) * 8
+
+        return [
+            ('classes.type_id', 'Q', class_rows, memoryview(table.type_ids).cast('B')),
+            ('classes.tag', 'B', class_rows, bytes(table.tags)),
+            ('classes.status', 'B', class_rows, bytes(table.status)),
+            ('classes.signature', 'S', class_rows, self._signatures.update(table.signatures, class_rows)),
+
+            ('threads.thread_id', 'Q', len(threads), array('Q', [int(thread.threadID) for thread, _ in threads])),
+            ('threads.alive', 'B', len(threads), bytes(alive for _, alive in threads)),
+            ('threads.frames', 'I', len(threads), array('I', [len(thread._frames) for thread, _ in threads])),
+            ('threads.event_kind', 'B', len(threads),
+                bytes(int(thread._event.eventKind or 0) if thread._event else 0 for thread, _ in threads)),
+
+            ('events.seq', 'Q', len(events), array('Q', seqs)),
+            ('events.time', 'd', len(events), array('d', times)),
+            ('events.kind', 'B', len(events), bytes(kinds)),
+            ('events.request_id', 'i', len(events), array('i', requests)),
+            ('events.thread', 'Q', len(events), array('Q', event_threads)),
+            ('events.class_id', 'Q', len(events), array('Q', class_ids)),
+            ('events.method_id', 'Q', len(events), array('Q', method_ids)),
+            ('events.index', 'q', len(events), array('q', indexes)),
+        ]
+
+
+    def publish(self, force=False):
+        """Write a new snapshot if anything changed (or force).
+
+          Returns: The current generation.
+        """
+        token = self._change_token()
+        if not force and token == self._token and self.generation:
+            return self.generation
+
+        columns = self.columns()
+        offset = _align(_header.size + _column.size * len(columns))
+        entries = []
+        for column_name, fmt, rows, data in columns:
+            nbytes = memoryview(data).nbytes
+            entries.append((column_name, fmt, rows, offset, nbytes, data))
+            offset = _align(offset + nbytes)
+
+        generation = self.generation + 1
+        shm = _create(f'{self.name}-{generation}', max(offset, 1))
+        buf = shm.buf
+        _header.pack_into(buf, 0, SNAPSHOT_MAGIC, LAYOUT_VERSION, generation, time.time(),
+            self.state.suspend_epoch, self.state.events_seen, len(entries), 0)
+        for idx, (column_name, fmt, rows, offset, nbytes, data) in enumerate(entries):
+            _column.pack_into(buf, _header.size + idx * _column.size, column_name.encode(), fmt.encode(), rows, offset, nbytes)
+            buf[offset:offset + nbytes] = memoryview(data).cast('B')
+        del buf
+
+        self.generation = generation
+        self._token = token
+        self.segments.append(shm)
+        self._write_index(shm.name)
+
+        while len(self.segments) > self.keep:
+            _unlink(self.segments.pop(0))
+        return generation
+
+
+    def _write_index(self, segment_name):
+        # Sequence lock, odd while the index is being rewritten.
+        buf = self.index.buf
+        self._seq += 1
+        struct.pack_into('<Q', buf, 8, self._seq)
+        _index.pack_into(buf, 0, INDEX_MAGIC, LAYOUT_VERSION, self._seq, self.generation,
+            time.time(), segment_name.lstrip('/').encode())
+        self._seq += 1
+        struct.pack_into('<Q', buf, 8, self._seq)
+
+
+    async def run(self):
+        """Publish changes every interval until cancelled."""
+        try:
+            while True:
+                self.publish()
+                await asyncio.sleep(self.interval)
+        finally:
+            self.close()
+
+
+    def close(self):
+        for shm in self.segments:
+            _unlink(shm)
+        self.segments = []
+        if self.index is not None:
+            _unlink(self.index)
+            self.index = None
+
+
+    def __repr__(self):
+        try:
+            return f'StatePublisher({self.name} generation {self.generation}, {len(self.segments)} segments)'
+        except Exception as e:
+            return f"StatePublisher(ERROR: {e})"
+
+
+class SnapshotTable():
+
+    def __init__(self, name):
+        self.name = name
+        self.rows = 0
+        # column -> memoryview cast to the column's format
+        self.columns = {}
+        # column -> (offsets memoryview, utf-8 blob memoryview)
+        self.string_columns = {}
+
+
+    def __len__(self):
+        return self.rows
+
+
+    def __getitem__(self, column):
+        return self.columns[column]
+
+
+    def __contains__(self, column):
+        return column in self.columns or column in self.string_columns
+
+
+    def string(self, column, row):
+        offsets, blob = self.string_columns[column]
+        return str(blob[offsets[row]:offsets[row + 1]], 'utf-8')
+
+
+    def strings(self, column):
+        """Decode a whole string column into a list (this one copies)."""
+        offsets, blob = self.string_columns[column]
+        data = blob.tobytes()
+        return [data[offsets[row]:offsets[row + 1]].decode() for row in range(self.rows)]
+
+
+    def row(self, row):
+        values = {column: view[row] for column, view in self.columns.items()}
+        for column in self.string_columns:
+            values[column] = self.string(column, row)
+        return values
+
+
+    def release(self):
+        for view in self.columns.values():
+            view.release()
+        for offsets, blob in self.string_columns.values():
+            offsets.release()
+            blob.release()
+        self.columns = {}
+        self.string_columns = {}
+
+
+    def __repr__(self):
+        try:
+            return f'SnapshotTable({self.name}, {self.rows} rows, columns {[*self.columns, *self.string_columns]})'
+        except Exception as e:
+            return f"SnapshotTable(ERROR: {e})"
+
+
+class Snapshot():
+    """One published generation, mapped read-only. Close (or use as a context manager) when done."""
+
+    def __init__(self, shm):
+        self.shm = shm
+        buf = shm.buf
+        magic, version, self.generation, self.time, self.suspend_epoch, self.events_seen, count, _ = \
+            _header.unpack_from(buf, 0)
+        if magic != SNAPSHOT_MAGIC or version != LAYOUT_VERSION:
+            raise ValueError(f'Not a version {LAYOUT_VERSION} state snapshot ({magic} version {version})')
+
+        self.tables = {}
+        for idx in range(count):
+            name, fmt, rows, offset, nbytes = _column.unpack_from(buf, _header.size + idx * _column.size)
+            table_name, column = name.rstrip(b'\0').decode().split('.', 1)
+            table = self.tables.setdefault(table_name, SnapshotTable(table_name))
+            table.rows = rows
+            view = buf[offset:offset + nbytes]
+            fmt = fmt.decode()
+            if fmt == 'S':
+                split = (rows + 1) * 4
+                table.string_columns[column] = (view[:split].cast('I'), view[split:])
+                view.release()
+            else:
+                table.columns[column] = view.cast(fmt)
+                view.release()
+
+
+    def __getitem__(self, table):
+        return self.tables[table]
+
+
+    def close(self):
+        for table in self.tables.values():
+            table.release()
+        self.tables = {}
+        try:
+            self.shm.close()
+        except BufferError:
+            # Note: Views handed out (e.g. slices of a column) still point in. The mapping goes with them.
+            print("ERROR: Snapshot closed while column views are still held.")
+
+
+    def __enter__(self):
+        return self
+
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+    def __repr__(self):
+        try:
+            tables = ', '.join(f'{name} {len(table)}' for name, table in self.tables.items())
+            return f'Snapshot(generation {self.generation}, epoch {self.suspend_epoch}: {tables})'
+        except Exception as e:
+            return f"Snapshot(ERROR: {e})"
+
+
+class StateReader():
+
+    def __init__(self, name='jdwp-state'):
+        self.name = name
+        self.index = _attach(name)
+
+
+    def current(self):
+        """(generation, snapshot segment name) from the index, '' before the first publish."""
+        buf = self.index.buf
+        while True:
+            seq, = struct.unpack_from('<Q', buf, 8)
+            if seq & 1:
+                time.sleep(0)
+                continue
+            magic, version, _, generation, _, segment_name = _index.unpack_from(buf, 0)
+            if struct.unpack_from('<Q', buf, 8)[0] == seq:
+                break
+        if magic != INDEX_MAGIC or version != LAYOUT_VERSION:
+            raise ValueError(f'Not a version {LAYOUT_VERSION} state index ({magic} version {version})')
+        return generation, segment_name.rstrip(b'\0').decode()
+
+
+    def snapshot(self, retries=10):
+        """Map the latest snapshot.
+
+          Returns: Snapshot, or None if nothing was published yet.
+        """
+        for _ in range(retries):
+            generation, segment_name = self.current()
+            if not segment_name:
+                return None
+            try:
+                return Snapshot(_attach(segment_name))
+            except FileNotFoundError:
+                # Unlinked between reading the index and opening it, a newer one is up.
+                continue
+        print(f"ERROR: Failed to map a snapshot of {self.name}")
+        return None
+
+
+    def poll(self, generation=0):
+        """Like snapshot(), but None unless there's something newer than generation."""
+        current, _ = self.current()
+        if current <= generation:
+            return None
+        return self.snapshot()
+
+
+    def close(self):
+        self.index.close()
+
+
+    def __enter__(self):
+        return self
+
+
+    def __exit__(self, *exc):
+        self.close()
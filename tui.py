@@ -9,9 +9,15 @@ from textual.containers import Horizontal, VerticalScroll, Vertical
 from textual.binding import Binding
 from rich.text import Text
 import shlex
+import asyncio
+
+from thirdparty.debug.dalvik import Debugger
 
 from thirdparty.jdwp.tui.cmdinput import CmdInput
 from thirdparty.jdwp.tui.adb import AdbCommand
+from thirdparty.jdwp.tui.symbols import SymbolCommand
+from thirdparty.jdwp.tui.virtual import VirtualLog, VirtualCode
+from thirdparty.jdwp.tui.panels import PanelModel, PanelRefresher, PanelView, ThreadsPanel, FramePanel, WatchPanel
 
 
 class MyCmdInput(CmdInput):
@@ -21,6 +27,8 @@ class MyCmdInput(CmdInput):
 
         # Register adb as a command
         self.adb_command = AdbCommand(self)
+        self.symbol_command = SymbolCommand(self)
+        self.tasks = set()
 
 
     def get_prompt(self):
@@ -29,8 +37,22 @@ class MyCmdInput(CmdInput):
 
 
     def cmd_log(self, out):
-        self.cmd_scroll.mount(Static(out), before=self)
-        self.cmd_scroll.scroll_end(animate=False)
+        self.cmd_log_view.write(out)
+
+
+    def run_task(self, coro, done=None):
+        """Run coro on the app's loop, its errors (or done, if given) go to the command log."""
+        async def runner():
+            try:
+                await coro
+                if done:
+                    self.cmd_log(done)
+            except Exception as e:
+                self.cmd_log(f"ERROR: {e}")
+        task = asyncio.get_running_loop().create_task(runner())
+        # Note: Keep a reference so the task doesn't get garbage collected.
+        self.tasks.add(task)
+        task.add_done_callback(self.tasks.discard)
 
 
     def process_cmd(self, cmd):
@@ -42,31 +64,42 @@ class MyCmdInput(CmdInput):
             return
 
         if args[0] == 'clear':
-            self.cmd_scroll.remove_children(Static)
-            self.cmd_scroll.mount(self)
+            self.cmd_log_view.clear()
             return
 
         # Deal with application specific command.
         if args[0] == 'adb':
-            self.cmd_scroll.mount(Static(self.adb_command.handle(args)), before=self)
+            self.cmd_log(self.adb_command.handle(args))
             return
-        
-        self.cmd_scroll.mount(Static("Command not recognized."), before=self)
 
+        if args[0] == 'find':
+            self.cmd_log(self.symbol_command.handle(args))
+            return
 
-    def on_mount(self) -> None:
-        # Fetch the reference to this once.
-        self.cmd_scroll = self.app.query_one("#cmd_scroll")
-
+        if args[0] == 'resume':
+            if self.app.dbg is None or not self.app.dbg.jdwp:
+                self.cmd_log("No debugger attached.")
+            else:
+                self.run_task(self.app.dbg.resume_vm(), done="VM resumed.")
+            return
 
-class CodeLine(Static):
+        if args[0] in ('watch', 'unwatch'):
+            expr = cmd.strip()[len(args[0]):].strip()
+            if not expr:
+                self.cmd_log(f"Usage: {args[0]} <expr>")
+            elif args[0] == 'watch':
+                self.app.panel_model.add_watch(expr)
+            else:
+                self.app.panel_model.remove_watch(expr)
+            return
+        
+        self.cmd_log("Command not recognized.")
 
-    def on_click(self, event: Click) -> None:
-        event.stop()
-        event.prevent_default()
 
-        watch = self.app.query_one("#watch_scroll")
-        watch.mount(Static(f"{self.meta}"))
+    def on_mount(self) -> None:
+        super().on_mount()
+        # Fetch the reference to this once.
+        self.cmd_log_view = self.app.query_one("#cmd_log")
 
 
 class MyApp(App):
@@ -96,12 +129,21 @@ class MyApp(App):
             border: solid blue;
         }
 
+        #frame_panel, #watch_panel {
+            border-left: solid blue;
+        }
+
         #cmd_frame {
           background: black;
           height: 1fr;
           border: solid blue;
         }
 
+        #cmd_log {
+          background: black;
+          color: white;
+        }
+
         #cmd_input {
           background: black;
           border: none;
@@ -117,9 +159,23 @@ class MyApp(App):
     ]
 
 
-    def __init__(self, **kwargs):
+    def __init__(self, dbg=None, log_lines=10000, panel_fps=20, **kwargs):
+        """
+          Args:
+            dbg (Debugger): Already started debugger, if any. Otherwise
+                            `adb debug <package>` attaches one, see attach_debugger().
+        """
         super().__init__(**kwargs)
 
+        # Debugger backing commands like `find` and the panels, if any.
+        self.dbg = dbg
+
+        # Lines kept by the command log (None for everything).
+        self.log_lines = log_lines
+
+        # Most thread/frame/watch panel redraws per second, see tui/panels.py
+        self.panel_fps = panel_fps
+
 
     def compose(self) -> ComposeResult:
 
@@ -128,46 +184,72 @@ class MyApp(App):
             yield Static("Key Bindings Here", id="keybinding_header")
             with Vertical(id="code_frame"):
                 yield Static("Code View", id="code_title")
-                yield VerticalScroll(id="code_scroll")
-                #yield Static(''.join(code_lines), id="code_content")
+                # Note: Line API views, only the visible rows are rendered. See tui/virtual.py
+                yield VirtualCode(id="code_view")
             with Vertical(id="watch_frame"):
-                yield Static("Watch View", id="watch_title")
-                with VerticalScroll(id="watch_scroll"):
-                    yield Static("JSON or Python Print Content Here", id="watch_content")
+                yield Static("Threads | Frame | Watches", id="watch_title")
+                with Horizontal():
+                    yield ThreadsPanel(id="threads_panel")
+                    yield FramePanel(id="frame_panel")
+                    yield WatchPanel(id="watch_panel")
             with Vertical(id="cmd_frame"):
                 yield Static("Command View", id="cmd_title")
-                with VerticalScroll(id="cmd_scroll"):
-                    yield MyCmdInput(id="cmd_input", soft_wrap=True)
+                yield VirtualLog(max_lines=self.log_lines, id="cmd_log")
+                yield MyCmdInput(id="cmd_input", soft_wrap=True)
         yield Footer()
 
 
     def on_mount(self) -> None:
 
         # Grab references to all of these once.
-        self.code_scroll = self.query_one("#code_scroll")
-        self.watch_scroll = self.query_one("#watch_scroll")
-        self.cmd_scroll = self.query_one("#cmd_scroll")
+        self.code_view = self.query_one("#code_view")
+        self.threads_panel = self.query_one("#threads_panel")
+        self.frame_panel = self.query_one("#frame_panel")
+        self.watch_panel = self.query_one("#watch_panel")
         self.cmd_input = self.query_one("#cmd_input")
 
-        # Application specific, but this is where we "list objects."
-        self.load_file('/etc/passwd')
-        self.code_scroll.mount_all(self.code_lines)
+        # Panels (and the code view) follow the debugger's cached state.
+        self.panel_model = PanelModel(self.dbg)
+        self.panel_refresher = PanelRefresher(
+            self.panel_model,
+            [self.threads_panel, self.frame_panel, self.watch_panel],
+            code=self.code_view,
+            fps=self.panel_fps).start(self)
+
         self.cmd_input.focus()
 
     
+    async def attach_debugger(self, connection=None, host='127.0.0.1', port=8700):
+        """Start a Debugger (on an already handshaken connection, e.g. from `adb debug`)
+        and point the panels and commands at it.
+
+          Returns: Debugger or None if one is already attached.
+        """
+        if self.dbg is not None and self.dbg.jdwp is not None and self.dbg.jdwp.started:
+            self.watch_log("ERROR: A debugger is already attached.")
+            return None
+        dbg = self.dbg or Debugger()
+        await dbg.start(host, port, connection=connection)
+        self.dbg = dbg
+        self.panel_model.attach(dbg)
+        return dbg
+
+
     def load_file(self, fpath):
-        self.code_content = {}
-        self.code_lines = []
-        with open(fpath, "r") as f:
-            idx = 0
-            for line in f.readlines():
-                self.code_content[idx] = {
-                    'content': line,
-                    'index': idx,
-                }
-                code_line = CodeLine(line)
-                code_line.meta = self.code_content[idx]
-                self.code_lines.append(code_line)
+        self.code_view.load_file(fpath)
+
+
+    def on_virtual_code_line_clicked(self, message: VirtualCode.LineClicked) -> None:
+        self.watch_log(message.code.code_lines[message.index])
+
+
+    def on_panel_view_row_clicked(self, message: PanelView.RowClicked) -> None:
+        if message.panel is self.threads_panel and message.row < len(self.threads_panel.thread_ids):
+            self.panel_model.select_thread(self.threads_panel.thread_ids[message.row])
+        elif message.panel is self.frame_panel:
+            thread = self.panel_model.thread()
+            if thread is not None and message.row < len(thread.frames()):
+                self.panel_model.select_frame(message.row)
         
     
     def action_focus_cmd_input(self) -> None:
@@ -175,10 +257,11 @@ class MyApp(App):
 
 
     def watch_log(self, out):
-        self.watch_scroll.mount(Static(out))
-        self.watch_scroll.scroll_end(animate=False)
+        # Note: The watch pane is live panels now, one off output goes to the command log.
+        self.cmd_input.cmd_log(out)
 
 
 
 if __name__ == "__main__":
+    # Note: No debugger yet, `adb debug <package>` launches the app and attaches one.
     MyApp().run()
\ No newline at end of file